@@ -0,0 +1,252 @@
+#!/usr/bin/env python2
+"""
+Benchmarks of the operators of `morphlib.operator`.
+
+Times every operator with every predefined structural element and a few
+squares, on synthetic images of several sizes, with and without NumPy, and
+writes the results as JSON:
+
+    benchmarks/benchmark.py --sizes 64,256,1024,4096,8192 -o results.json
+    benchmarks/benchmark.py --compare results.json -o new.json
+
+Each case runs in a fresh process, so that its peak RSS is its own. The
+synthetic images are generated once (from a fixed seed) into a temporary
+directory and memory-mapped by the cases. With `--compare` the cases found
+in both runs are listed with their speed ratio, and the exit status is 1 if
+any got slower than the tolerance.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from morphlib import vectorized
+from morphlib.image import GrayscaleImage
+from morphlib.operator import AreaClosing, AreaOpening, BlackTopHat, \
+        CloseHoles, Closing, ClosingByReconstruction, Dilation, Erosion, \
+        GeodesicDilation, Gradient, Opening, OpeningByReconstruction, \
+        RankFilter, ReconstructionByDilation, \
+        SquaredStructuralElementBuilder, StructuralElement, Watershed, \
+        WhiteTopHat
+
+# Factories returning the operator to time and its input, for a structural
+# element and a synthetic image. Operators that take no structural element
+# are run once per image size.
+OPERATORS = {
+    'Erosion': lambda se, image: (Erosion(se), image),
+    'Dilation': lambda se, image: (Dilation(se), image),
+    'Opening': lambda se, image: (Opening(se), image),
+    'Closing': lambda se, image: (Closing(se), image),
+    'GeodesicDilation': lambda se, image: (
+        GeodesicDilation(se, image), Erosion(se)(image)),
+    'ReconstructionByDilation': lambda se, image: (
+        ReconstructionByDilation(se, image), Erosion(se)(image)),
+    'AreaOpening': lambda se, image: (AreaOpening(se, 100), image),
+    'AreaClosing': lambda se, image: (AreaClosing(se, 100), image),
+    'CloseHoles': lambda se, image: (CloseHoles(), image),
+    'Median': lambda se, image: (RankFilter(se, 50), image),
+    'Gradient': lambda se, image: (Gradient(se), image),
+    'WhiteTopHat': lambda se, image: (WhiteTopHat(se), image),
+    'BlackTopHat': lambda se, image: (BlackTopHat(se), image),
+    'OpeningByReconstruction': lambda se, image: (
+        OpeningByReconstruction(se), image),
+    'ClosingByReconstruction': lambda se, image: (
+        ClosingByReconstruction(se), image),
+    'Watershed': lambda se, image: (
+        Watershed(Erosion(se)(image)), Gradient(se)(image)),
+}
+WITHOUT_ELEMENT = set(['CloseHoles'])
+
+SQUARE_SIZES = (3, 7, 15, 31)
+SIZES = (64, 256, 1024)
+BACKENDS = ('numpy', 'python')
+
+
+def elements():
+    """
+    Return the benchmarked structural elements by name.
+    """
+    res = dict((name, StructuralElement.predefined(name))
+               for name in StructuralElement.PREDEFINED)
+    for size in SQUARE_SIZES:
+        res['square%d' % size] = \
+                SquaredStructuralElementBuilder(size).get_struct_elem()
+    return res
+
+
+def synthetic_image(size, seed=0):
+    """
+    Return a `size` x `size` image of random flat blobs on a noisy
+    background, the same for a given seed.
+    """
+    rnd = random.Random(seed)
+    # A random tile, repeated with a shift on every row so that the image
+    # is not periodic along the rows.
+    tile = 257
+    levels = bytearray(rnd.choice((0, 60, 120, 180, 240))
+                       for _ in xrange(tile * tile))
+    data = bytearray()
+    for i in xrange(size):
+        row = levels[(i % tile) * tile:(i % tile + 1) * tile]
+        row = row[(i * 31) % tile:] + row[:(i * 31) % tile]
+        data += (row * (size // tile + 1))[:size]
+    return GrayscaleImage(width=size, height=size, data=data)
+
+
+def run_case(case):
+    """
+    Time one case in the current process. Returns its result record.
+    """
+    path, operator_name, element_name, size, backend, repeat = case
+    vectorized.ENABLED = backend == 'numpy'
+    image = GrayscaleImage.load(path)
+    image.getbuffer()
+    se = elements()[element_name] if element_name else None
+    operator, data = OPERATORS[operator_name](se, image)
+    best = None
+    for _ in xrange(repeat):
+        start = time.time()
+        operator(data)
+        seconds = time.time() - start
+        best = seconds if best is None else min(best, seconds)
+    return {
+        'operator': operator_name,
+        'element': element_name,
+        'size': size,
+        'backend': backend,
+        'seconds': best,
+        'mpixels_per_s': size * size / best / 1e6 if best else None,
+        # Kilobytes on Linux.
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def cases(paths, operators, element_names, backends, repeat):
+    for size in sorted(paths):
+        for backend in backends:
+            for operator_name in operators:
+                names = [None] if operator_name in WITHOUT_ELEMENT \
+                        else element_names
+                for element_name in names:
+                    yield (paths[size], operator_name, element_name, size,
+                           backend, repeat)
+
+
+def environment():
+    """
+    Return a description of the machine and code being benchmarked.
+    """
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': vectorized.numpy.__version__ if vectorized.numpy else None,
+        'machine': platform.machine(),
+        'cpus': multiprocessing.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(old, new, tolerance, out):
+    """
+    Write the speed ratio of the cases found in both runs to `out`. Returns
+    the number of cases more than `tolerance` slower in `new`.
+    """
+    key = lambda r: (r['operator'], r['element'], r['size'], r['backend'])
+    before = dict((key(r), r['seconds']) for r in old['results'])
+    slower = 0
+    for r in new['results']:
+        if key(r) not in before:
+            continue
+        ratio = r['seconds'] / before[key(r)] if before[key(r)] else 1.0
+        flag = ''
+        if ratio > 1 + tolerance:
+            slower += 1
+            flag = ' SLOWER'
+        out.write('%-26s %-10s %5d %-6s %8.3fs -> %8.3fs x%.2f%s\n' % (
+            r['operator'], r['element'] or '-', r['size'], r['backend'],
+            before[key(r)], r['seconds'], ratio, flag))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                        help='comma separated image sizes (default: %(default)s)')
+    parser.add_argument('--operators', default=','.join(sorted(OPERATORS)))
+    parser.add_argument('--elements', default=','.join(sorted(elements())))
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per case, the fastest is kept')
+    parser.add_argument('-o', '--output', help='JSON file (default: stdout)')
+    parser.add_argument('--compare', help='JSON file of an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='slowdown reported as a regression')
+    args = parser.parse_args(argv)
+
+    operators = args.operators.split(',')
+    element_names = args.elements.split(',')
+    backends = args.backends.split(',')
+    for name in operators:
+        if name not in OPERATORS:
+            parser.error('Unknown operator: %s' % name)
+    for name in element_names:
+        if name not in elements():
+            parser.error('Unknown structural element: %s' % name)
+    if 'numpy' in backends and vectorized.numpy is None:
+        sys.stderr.write('NumPy missing, skipping the numpy backend\n')
+        backends.remove('numpy')
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = {}
+        for size in map(int, args.sizes.split(',')):
+            paths[size] = os.path.join(directory, '%d.raw' % size)
+            synthetic_image(size).save(paths[size])
+        # One process per case, one case at a time.
+        pool = multiprocessing.Pool(1, maxtasksperchild=1)
+        try:
+            results = []
+            for result in pool.imap(run_case, cases(
+                    paths, operators, element_names, backends, args.repeat)):
+                sys.stderr.write('%(operator)s %(element)s %(size)d '
+                                 '%(backend)s %(seconds).4fs\n' % result)
+                results.append(result)
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        shutil.rmtree(directory)
+
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        sys.stdout.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        return 1 if compare(old, report, args.tolerance, sys.stderr) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
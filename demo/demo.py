@@ -10,6 +10,7 @@ import PIL
 
 sys.path.append(os.path.abspath(
     os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from morphlib.cache import CachedOperator, ResultCache
 from morphlib.image import GrayscaleImage
 from morphlib.operator import Dilation, CloseHoles, Closing, Opening, ReconstructionByDilation, StructuralElement
 
@@ -17,6 +18,8 @@ class Main(object):
     def initialize(self):
         self.mask_image = self.image = None
         self.images = []
+        # Results are recomputed on every refresh, for the same images.
+        self.cache = ResultCache()
         self.root = Tkinter.Tk()
         self.menu = Tkinter.Menu(self.root)
         self.menu.add_command(label="Load Image...",
@@ -76,24 +79,24 @@ class Main(object):
 
     def dilated(self, i):
         dilate = Dilation(StructuralElement.predefined('rhombus'))
-        return self.image_to_tk(dilate(i))
+        return self.image_to_tk(CachedOperator(dilate, self.cache)(i))
 
     def opening(self, i):
         opening = Opening(StructuralElement.predefined('rhombus'))
-        return self.image_to_tk(opening(i))
+        return self.image_to_tk(CachedOperator(opening, self.cache)(i))
 
     def closing(self, i):
         closing = Closing(StructuralElement.predefined('rhombus'))
-        return self.image_to_tk(closing(i))
+        return self.image_to_tk(CachedOperator(closing, self.cache)(i))
 
     def reconstruct_by_dilation(self, i, mask):
         dilate = ReconstructionByDilation(StructuralElement.predefined('rhombus'),
                                           mask=mask)
-        return self.image_to_tk(dilate(i))
+        return self.image_to_tk(CachedOperator(dilate, self.cache)(i))
 
     def close_holes(self, i):
         close_holes = CloseHoles()
-        return self.image_to_tk(close_holes(i))
+        return self.image_to_tk(CachedOperator(close_holes, self.cache)(i))
 
     def refresh_images(self):
         self.images = []
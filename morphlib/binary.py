@@ -0,0 +1,259 @@
+"""
+Erosion, dilation and reconstruction of `BinaryImage`s.
+
+A `BinaryImage` keeps each row in the bits of one integer, so shifting that
+integer by `j` moves all the pixels of the row by `j` columns at once. A
+dilation is then, for every offset (i, j) of the structural element, the OR
+of each row shifted by `j` into the row `i` below it; pixels moved across
+the left or right edge of the image are masked out. The erosion is computed
+by duality, as the complement of the dilation of the complement, which
+gives the same result as the grayscale operators on 0/255 images:
+neighbours outside the image are ignored.
+
+Elements whose ones fill a rectangle are run as a horizontal then a
+vertical dilation by a segment, each one in a logarithmic number of shifts.
+
+The reconstruction propagates whole rows through a queue, see
+`reconstruct`.
+"""
+from collections import deque
+
+from morphlib.image import BinaryImage
+
+
+def supports(*images):
+    """
+    Return True if all given images are `BinaryImage`s.
+    """
+    return all(isinstance(i, BinaryImage) for i in images)
+
+
+def erode(structuralElement, image, res):
+    """
+    Erode `image` by `structuralElement` saving the result in `res`.
+    """
+    full = image.full_row
+    res.rows = [full & ~row for row in dilate_rows(
+        [full & ~row for row in image.rows], image.width, structuralElement)]
+    return res
+
+
+def dilate(structuralElement, image, res):
+    """
+    Dilate `image` by `structuralElement` saving the result in `res`.
+    """
+    res.rows = dilate_rows(image.rows, image.width, structuralElement)
+    return res
+
+
+def reconstruct(structuralElement, marker, mask):
+    """
+    Return the reconstruction by dilation of the `BinaryImage` `marker`
+    under `mask` (all set if None) and a dict of statistics as
+    `ReconstructionByDilation.reconstruct`, the queue holding rows.
+
+    Every row is first closed along itself (see `_RowFill`). The rows are
+    then propagated from a FIFO queue: the offsets of the element to other
+    rows carry a row into the rows they reach, which are closed again and
+    queued if they gained pixels. A row only gains whole runs of the mask,
+    so it is queued at most once per run of its mask row, and each visit is
+    a handful of operations on its integer.
+    """
+    width, height = marker.width, marker.height
+    limit = [marker.full_row] * height if mask is None else mask.rows
+    fill = _RowFill(structuralElement, width, limit)
+    rows = [fill(row & limit[k], k) for k, row in enumerate(marker.rows)]
+    # The column offsets of each offset to another row.
+    columns = {}
+    for i, j in structuralElement.ones_offsets:
+        if i:
+            columns.setdefault(i, []).append(j)
+    columns = columns.items()
+
+    queued = [bool(row) for row in rows]
+    queue = deque(k for k in xrange(height) if rows[k])
+    pushes = queue_max = len(queue)
+    while queue:
+        k = queue.popleft()
+        queued[k] = False
+        row = rows[k]
+        for i, js in columns:
+            t = k + i
+            if not 0 <= t < height:
+                continue
+            grown = 0
+            for j in js:
+                grown |= _move_row(row, j)
+            grown &= limit[t]
+            if grown & ~rows[t]:
+                rows[t] = fill(rows[t] | grown, t)
+                if not queued[t]:
+                    queued[t] = True
+                    queue.append(t)
+                    pushes += 1
+        queue_max = max(queue_max, len(queue))
+    return BinaryImage(width, height, rows), {
+        'scans': 1,
+        'queue_pushes': pushes,
+        'queue_max': queue_max,
+    }
+
+
+class _RowFill(object):
+    """
+    Closes rows under the offsets of a structural element along the rows,
+    within the rows of a mask.
+
+    When these offsets, with 0, are a range from `-down` to `up`, the pixels
+    reached from a row are the runs of the mask row holding its pixels, the
+    gaps narrower than a step bridged. Going up the columns, this is found by
+    adding the row to the bridged mask row: the carry runs from the lowest
+    pixel of each run to its end. Going down the row is reversed first.
+    Other elements grow the row one step at a time.
+    """
+
+    def __init__(self, structuralElement, width, limit):
+        self.width = width
+        self.limit = limit
+        self.offsets = sorted(set(
+            [0] + [j for i, j in structuralElement.ones_offsets if i == 0]))
+        self.down, self.up = -self.offsets[0], self.offsets[-1]
+        self.contiguous = self.offsets == range(-self.down, self.up + 1)
+        # The bridged mask rows, made on demand.
+        self._up = [None] * len(limit)
+        self._down = [None] * len(limit)
+
+    def __call__(self, row, k):
+        """
+        Return `row`, a subset of mask row `k`, closed.
+        """
+        if not row:
+            return row
+        limit = self.limit[k]
+        if not self.contiguous:
+            while True:
+                grown = 0
+                for j in self.offsets:
+                    grown |= _move_row(row, j)
+                grown &= limit
+                if grown == row:
+                    return row
+                row = grown
+        if self.up:
+            if self._up[k] is None:
+                self._up[k] = _bridge(limit, self.up)
+            row = _fill_up(row, self._up[k]) & limit
+        if self.down:
+            if self._down[k] is None:
+                self._down[k] = _reverse(_bridge(limit, self.down),
+                                         self.width)
+            row |= _reverse(_fill_up(_reverse(row, self.width),
+                                     self._down[k]), self.width) & limit
+        return row
+
+
+def _bridge(row, step):
+    """
+    Return `row` with its gaps of less than `step` pixels filled.
+    """
+    # The gap pixels with a pixel of `row` less than `step` columns away on
+    # both sides; those of wider gaps are left apart from the runs.
+    return row | (_dilate_segment(row, _move_row, _or, 0, step - 1)
+                  & _dilate_segment(row, _move_row, _or, 1 - step, 0))
+
+
+def _fill_up(row, runs):
+    """
+    Return the pixels of `runs` from each pixel of `row`, a subset, up to
+    the end of its run.
+    """
+    carries = (runs + row) ^ runs ^ row
+    return (carries >> 1 | row) & runs
+
+
+def _reverse(row, width):
+    """
+    Return the `width` pixels of `row` in the reverse order.
+    """
+    return int(bin(row)[2:].zfill(width)[::-1], 2)
+
+
+def dilate_rows(rows, width, structuralElement):
+    """
+    Return the rows of the dilation of the binary image of `width` pixels
+    wide `rows`.
+    """
+    full = (1 << width) - 1
+    if structuralElement.is_rectangle:
+        top, bottom, left, right = structuralElement.extent
+        rows = [_dilate_segment(row, _move_row, _or, left, right) & full
+                for row in rows]
+        return _dilate_segment(rows, _move_rows, _or_rows, top, bottom)
+    # The columns offsets of each row offset.
+    columns = {}
+    for i, j in structuralElement.ones_offsets:
+        columns.setdefault(i, []).append(j)
+    height = len(rows)
+    res = [0] * height
+    for i, js in columns.items():
+        for k in xrange(max(0, -i), min(height, height - i)):
+            row = rows[k]
+            if row:
+                for j in js:
+                    res[k + i] |= row << j if j >= 0 else row >> -j
+    return [row & full for row in res]
+
+
+def _move_row(row, k):
+    """
+    Return `row` with its pixels moved by `k` columns, those moved past
+    column 0 dropped.
+    """
+    return row << k if k >= 0 else row >> -k
+
+
+def _move_rows(rows, k):
+    """
+    Return `rows` moved down by `k` rows, those leaving the image dropped.
+    """
+    n = len(rows)
+    k = max(-n, min(n, k))
+    if k >= 0:
+        return [0] * k + rows[:n - k]
+    return rows[-k:] + [0] * -k
+
+
+def _or(row, other):
+    return row | other
+
+
+def _or_rows(rows, other):
+    return [row | other_row for row, other_row in zip(rows, other)]
+
+
+def _dilate_segment(x, move, combine, start, end):
+    """
+    Return `x` (a row or the list of rows) dilated by the offsets from
+    `start` to `end` along the rows, or along the columns, as `move` moves
+    it and `combine` takes the union.
+    """
+    # Moved by the offset nearest to 0 first, then grown away from it on
+    # each side: a pixel dropped at the edge of the image could only have
+    # moved further out.
+    nearest = min(max(0, start), end)
+    x = move(x, nearest)
+    return combine(_grow(x, move, combine, nearest - start, -1),
+                   _grow(x, move, combine, end - nearest, 1))
+
+
+def _grow(x, move, combine, n, direction):
+    """
+    Return the union of `x` moved by 0 to `n` steps in `direction`.
+    """
+    # `x` covers `span` steps; double it until done.
+    span = 1
+    while span <= n:
+        step = min(span, n + 1 - span)
+        x = combine(x, move(x, direction * step))
+        span += step
+    return x
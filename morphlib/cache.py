@@ -0,0 +1,279 @@
+"""
+Content-addressed cache of operator results.
+
+Results are keyed by a hash of the input image (mode, size and pixels) and
+of the operator: its class and parameters, structural elements being reduced
+to the set of their offsets (so the same shape written with a different
+matrix or padding gives the same key) and images (e.g. masks) to their hash.
+
+    cache = ResultCache(max_bytes=256 << 20, directory='/var/cache/morph')
+    opening = CachedOperator(Opening(se), cache)
+    opening(image)  # computed
+    opening(image)  # copied from the cache
+
+The memory tier evicts the least recently used results once they take more
+than `max_bytes`. With a `directory`, results are also written there in the
+raw format of `morphlib.pnm`; they are memory-mapped back on a memory miss,
+so they survive restarts and can be shared between processes. Label images
+are written as their label arrays instead, see `_save_labels`.
+"""
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections import OrderedDict
+
+from morphlib import instrument, pnm
+from morphlib.image import BinaryImage, GrayscaleImage, Image, LabelImage, \
+        RunLengthImage
+from morphlib.operator import MorphologicalOperator, StructuralElement
+
+
+def image_key(image):
+    """
+    Return a hash of the contents of `image`.
+    """
+    h = hashlib.sha1('%s %d %d ' % (image.mode, image.width, image.height))
+    if hasattr(image, 'getbuffer'):
+        buf, stride = image.getbuffer(), image.stride
+        if stride == image.width:
+            h.update(buffer(buf))
+        else:
+            for i in xrange(image.height):
+                h.update(buffer(buf, i * stride, image.width))
+    elif isinstance(image, BinaryImage):
+        h.update(' '.join('%x' % row for row in image.rows))
+    elif isinstance(image, RunLengthImage):
+        h.update(repr(sorted(image.rows.items())))
+    elif isinstance(image, LabelImage):
+        h.update(image.labels.typecode)
+        h.update(buffer(image.labels))
+    else:
+        h.update(repr(image.getdata()))
+    return h.hexdigest()
+
+
+def operator_key(operator):
+    """
+    Return a hash of the class and parameters of `operator`.
+    """
+    return hashlib.sha1(repr(_canonical(operator))).hexdigest()
+
+
+def _canonical(value):
+    """
+    Return a form of `value` made of basic types only, equal for values that
+    behave the same. Raises TypeError for values that cannot be keyed.
+    """
+    if value is None or isinstance(value, (bool, int, long, float, str,
+                                           unicode)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_canonical(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _canonical(v)) for k, v in value.items()))
+    if isinstance(value, StructuralElement):
+        return ('StructuralElement', tuple(sorted(value.ones_offsets)))
+    if isinstance(value, Image):
+        return ('Image', image_key(value))
+    if isinstance(value, type):
+        return '%s.%s' % (value.__module__, value.__name__)
+    if isinstance(value, MorphologicalOperator):
+        # Private attributes hold derived state, `stats` results of runs.
+        params = dict((k, v) for k, v in vars(value).items()
+                      if not k.startswith('_') and k != 'stats')
+        return (_canonical(value.__class__), _canonical(params))
+    raise TypeError('Cannot build a cache key for %r' % (value,))
+
+
+# Header of the label files: the array type code, the width and the height.
+_LABELS_HEADER = struct.Struct('<cII')
+
+
+def _save_labels(path, image):
+    """
+    Write the labels of the `LabelImage` `image` to `path`, little-endian
+    after a `_LABELS_HEADER`.
+    """
+    labels = image.labels
+    if sys.byteorder == 'big':
+        labels = array(labels.typecode, labels)
+        labels.byteswap()
+    with open(path, 'wb') as f:
+        f.write(_LABELS_HEADER.pack(labels.typecode, image.width,
+                                    image.height))
+        labels.tofile(f)
+
+
+def _load_labels(path):
+    """
+    Return the `LabelImage` written to `path` by `_save_labels`.
+    """
+    with open(path, 'rb') as f:
+        typecode, width, height = _LABELS_HEADER.unpack(
+            f.read(_LABELS_HEADER.size))
+        labels = array(typecode)
+        labels.fromfile(f, width * height)
+    if sys.byteorder == 'big':
+        labels.byteswap()
+    return LabelImage(width, height, labels)
+
+
+# Loaders of the images whose files do not record their mode, which is kept
+# in the file name instead.
+_MODE_LOADERS = {
+    BinaryImage.mode: BinaryImage.load,
+    RunLengthImage.mode: RunLengthImage.load,
+    LabelImage.mode: _load_labels,
+}
+
+
+def _image_bytes(image):
+    if hasattr(image, 'getbuffer'):
+        return len(image.getbuffer())
+    if isinstance(image, BinaryImage):
+        return (image.width + 7) // 8 * image.height
+    if isinstance(image, RunLengthImage):
+        # Two 8 byte integers per run, ignoring the Python overhead.
+        return 16 * image.runs()
+    if isinstance(image, LabelImage):
+        return len(image.labels) * image.labels.itemsize
+    return image.width * image.height * image.CHANNELS
+
+
+class ResultCache(object):
+    """
+    An LRU cache of images holding up to `max_bytes` of pixels in memory,
+    backed by files in `directory` if one is given.
+    """
+
+    def __init__(self, max_bytes=64 << 20, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.size = 0
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries or (
+            self.directory is not None and any(
+                os.path.exists(self._path(key, mode))
+                for mode in [None] + list(_MODE_LOADERS)))
+
+    def get(self, key):
+        """
+        Return a copy of the image cached under `key`, or None.
+        """
+        image = self._entries.pop(key, None)
+        if image is None and self.directory is not None:
+            image = self._load(key)
+            if image is not None:
+                self._add(key, image)
+        elif image is not None:
+            self._entries[key] = image
+        if image is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return image.copy()
+
+    def put(self, key, image):
+        """
+        Cache a copy of `image` under `key`.
+        """
+        image = image.copy()
+        if key in self._entries:
+            self.size -= _image_bytes(self._entries.pop(key))
+        self._add(key, image)
+        if self.directory is not None:
+            self._save(key, image)
+
+    def clear(self):
+        """
+        Empty the memory tier.
+        """
+        self._entries.clear()
+        self.size = 0
+
+    def _add(self, key, image):
+        nbytes = _image_bytes(image)
+        if nbytes > self.max_bytes:
+            return
+        self._entries[key] = image
+        self.size += nbytes
+        while self.size > self.max_bytes:
+            old_key, old = self._entries.popitem(last=False)
+            self.size -= _image_bytes(old)
+
+    def _path(self, key, mode=None):
+        # Binary images are saved as grayscale ones, and label images as
+        # plain arrays: their mode is kept in the file name.
+        return os.path.join(self.directory,
+                            key + ('.%s.raw' % mode if mode else '.raw'))
+
+    def _save(self, key, image):
+        # Written under a temporary name first, so that readers never see a
+        # partial file.
+        fd, tmp = tempfile.mkstemp(suffix='.raw', dir=self.directory)
+        os.close(fd)
+        try:
+            if isinstance(image, LabelImage):
+                _save_labels(tmp, image)
+            else:
+                image.save(tmp)
+            os.rename(tmp, self._path(
+                key, image.mode if image.mode in _MODE_LOADERS else None))
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def _load(self, key):
+        for mode, load in _MODE_LOADERS.items():
+            if os.path.exists(self._path(key, mode)):
+                return load(self._path(key, mode))
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            magic = pnm.read_header(f)[0]
+        cls = GrayscaleImage if pnm.CHANNELS[magic] == 1 else Image
+        return cls.load(path)
+
+
+class CachedOperator(MorphologicalOperator):
+    """
+    Looks the results of `operator` up in `cache` before computing them.
+
+    Operators whose parameters cannot be keyed (see `operator_key`) raise a
+    TypeError here.
+    """
+
+    def __init__(self, operator, cache):
+        self.operator = operator
+        self.cache = cache
+        self._key = operator_key(operator)
+
+    @instrument.traced
+    def __call__(self, original):
+        if getattr(original, 'deferred', False):
+            return original.then(self)
+        key = hashlib.sha1(self._key + image_key(original)).hexdigest()
+        res = self.cache.get(key)
+        if res is None:
+            res = self.operator(original)
+            self.cache.put(key, res)
+        return res
+
+    def apply(self, image, res):
+        res.paste(self(image), (0, 0))
+        return res
+
+    def halo(self):
+        return self.operator.halo()
@@ -0,0 +1,218 @@
+"""
+The `morphgeom` command: apply a chain of operators to many images.
+
+    morphgeom opening:circle,close-holes -o out/ scans/ 'extra/*.png'
+
+The pipeline is a comma separated list of stages, each a name followed by
+colon separated arguments:
+
+erosion:SE, dilation:SE, opening:SE, closing:SE, gradient:SE,
+white-tophat:SE, black-tophat:SE, reconstruction-opening:SE,
+reconstruction-closing:SE
+    with SE a predefined structural element (`StructuralElement.PREDEFINED`),
+    `squareN`, `hlineN` or `vlineN`; `octagon` if left out
+area-opening:AREA[:SE], area-closing:AREA[:SE]
+    with SE giving the connectivity, `octagon` if left out
+close-holes[:CONNECTIVITY]
+    with CONNECTIVITY 4 (default) or 8
+
+Inputs are files, directories (all the images in them) or glob patterns.
+Files are processed in parallel by a pool of worker processes, each one
+decoding, processing and encoding one file at a time, so that the three
+steps overlap across files. Every output is reported with its latency,
+followed by the overall throughput.
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from itertools import imap
+
+from morphlib.image import GrayscaleImage
+from morphlib.operator import AreaClosing, AreaOpening, BlackTopHat, \
+        CloseHoles, Closing, ClosingByReconstruction, Dilation, Erosion, \
+        Gradient, LineStructuralElementBuilder, Opening, \
+        OpeningByReconstruction, SquaredStructuralElementBuilder, \
+        StructuralElement, WhiteTopHat
+
+# Extensions of the files picked from input directories.
+IMAGE_EXTENSIONS = ('.bmp', '.gif', '.jpeg', '.jpg', '.pgm', '.png', '.pnm',
+                    '.ppm', '.raw', '.tif', '.tiff')
+
+_SHAPED = {
+    'erosion': Erosion,
+    'dilation': Dilation,
+    'opening': Opening,
+    'closing': Closing,
+    'gradient': Gradient,
+    'white-tophat': WhiteTopHat,
+    'black-tophat': BlackTopHat,
+    'reconstruction-opening': OpeningByReconstruction,
+    'reconstruction-closing': ClosingByReconstruction,
+}
+
+_AREA = {
+    'area-opening': AreaOpening,
+    'area-closing': AreaClosing,
+}
+
+
+def parse_structural_element(spec):
+    """
+    Return the structural element described by `spec`.
+    """
+    if spec in StructuralElement.PREDEFINED:
+        return StructuralElement.predefined(spec)
+    for prefix, build in (
+            ('square', SquaredStructuralElementBuilder),
+            ('hline', LineStructuralElementBuilder),
+            ('vline', lambda n: LineStructuralElementBuilder(n, vertical=True))):
+        size = spec[len(prefix):]
+        if spec.startswith(prefix) and size.isdigit() and int(size) > 0:
+            return build(int(size)).get_struct_elem()
+    raise ValueError('Unknown structural element: %r' % spec)
+
+
+def parse_pipeline(spec):
+    """
+    Return the list of operators described by the pipeline `spec`.
+    """
+    res = []
+    for stage in spec.split(','):
+        parts = stage.strip().split(':')
+        name, args = parts[0], parts[1:]
+        if name in _SHAPED and len(args) <= 1:
+            res.append(_SHAPED[name](
+                parse_structural_element(args[0] if args else 'octagon')))
+        elif name in _AREA and 1 <= len(args) <= 2 and args[0].isdigit():
+            res.append(_AREA[name](
+                parse_structural_element(args[1] if len(args) > 1
+                                         else 'octagon'),
+                int(args[0])))
+        elif name == 'close-holes' and args in ([], ['4'], ['8']):
+            res.append(CloseHoles(*map(int, args)))
+        else:
+            raise ValueError('Invalid pipeline stage: %r' % stage)
+    return res
+
+
+def find_inputs(patterns):
+    """
+    Return the image files given by `patterns` (files, directories or glob
+    patterns), in order and without duplicates.
+    """
+    res = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths = sorted(
+                os.path.join(pattern, name) for name in os.listdir(pattern)
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+        elif os.path.exists(pattern):
+            paths = [pattern]
+        else:
+            paths = sorted(glob.glob(pattern))
+        for path in paths:
+            if os.path.isfile(path) and path not in res:
+                res.append(path)
+    return res
+
+
+def output_path(path, output_dir, format=None):
+    """
+    Return where to write the result for the input file `path`.
+    """
+    name, ext = os.path.splitext(os.path.basename(path))
+    return os.path.join(output_dir, name + ('.' + format if format else ext))
+
+
+def process(job):
+    """
+    Load, process and save one image. Returns (input path, output path,
+    pixels, seconds, error message or None).
+    """
+    spec, path, out = job
+    start = time.time()
+    try:
+        image = GrayscaleImage.load(path)
+        for op in parse_pipeline(spec):
+            image = op(image)
+        image.save(out)
+    except Exception as e:
+        return path, out, 0, time.time() - start, str(e) or repr(e)
+    return path, out, image.width * image.height, time.time() - start, None
+
+
+def run(spec, inputs, output_dir, workers=None, format=None, out=None):
+    """
+    Process all `inputs`, writing one line per file and a summary to `out`
+    (standard output by default). Returns the number of files that failed.
+    """
+    out = out or sys.stdout
+    jobs = [(spec, path, output_path(path, output_dir, format))
+            for path in inputs]
+    if len(set(job[2] for job in jobs)) < len(jobs):
+        raise ValueError('Several inputs have the same output file name')
+    start = time.time()
+    pixels = failed = 0
+    if workers == 1 or len(jobs) <= 1:
+        results = imap(process, jobs)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(process, jobs)
+    try:
+        for path, dst, n, seconds, error in results:
+            if error is None:
+                pixels += n
+                out.write('%s -> %s %.1f ms\n' % (path, dst, seconds * 1000))
+            else:
+                failed += 1
+                out.write('%s FAILED %s\n' % (path, error))
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    elapsed = time.time() - start
+    out.write('%d files, %d failed, %.2f s, %.2f files/s, %.2f Mpixel/s\n' % (
+        len(jobs), failed, elapsed, len(jobs) / elapsed if elapsed else 0,
+        pixels / elapsed / 1e6 if elapsed else 0))
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='morphgeom',
+        description='Apply a pipeline of morphological operators to images.')
+    parser.add_argument('pipeline',
+                        help='stages, e.g. opening:circle,close-holes')
+    parser.add_argument('inputs', nargs='+',
+                        help='image files, directories or glob patterns')
+    parser.add_argument('-o', '--output-dir', required=True,
+                        help='directory for the results')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('-f', '--format',
+                        help='output file extension (default: the input one)')
+    args = parser.parse_args(argv)
+
+    try:
+        parse_pipeline(args.pipeline)
+    except ValueError as e:
+        parser.error(str(e))
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        parser.error('No input images found')
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    try:
+        failed = run(args.pipeline, inputs, args.output_dir, args.workers,
+                     args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
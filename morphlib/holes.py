@@ -0,0 +1,92 @@
+"""
+Hole filling by flooding from the image border.
+
+The holes of an image are the dark regions which cannot be reached from
+the border of the image without climbing: a pixel is raised to the lowest
+level at which some path joins it to the border, the level of a path being
+its brightest pixel. This is the complement of the reconstruction of the
+border of the complemented image, computed here in one pass as a priority
+flood (see R. Barnes et al., Priority-flood: an optimal depression-filling
+and watershed-labeling algorithm, Computers & Geosciences 62, 2014): the
+border pixels seed a queue with one bucket per gray level, and the levels
+are then flooded in increasing order, every pixel being pushed and popped
+exactly once. On 0/255 images this is a breadth-first flood of the
+background.
+
+Connectivity is given by a structural element, as in `morphlib.components`.
+`BinaryImage`s and `RunLengthImage`s are flooded from the background on
+their border by the queue-based reconstructions of `morphlib.binary` and
+`morphlib.runs`, which visit every row, or run, of the background a
+bounded number of times.
+"""
+from morphlib import binary, components, runs
+from morphlib.image import BinaryImage, RunLengthImage
+
+
+def fill(image, res, structuralElement):
+    """
+    Save into `res` the `GrayscaleImage` `image` with its holes filled,
+    pixels being connected to their neighbours under `structuralElement`.
+    """
+    f, frame = components.read(image, structuralElement)
+    # The frame is marked as done, which stops the flood with no bounds
+    # checks.
+    width, height, stride = frame.width, frame.height, frame.stride
+    done = bytearray('\x01') * frame.size
+    first = frame.rows * stride + frame.cols
+    for i in xrange(height):
+        done[first + i * stride:first + i * stride + width] = \
+                bytearray(width)
+    border = set(xrange(first, first + width))
+    border.update(xrange(first + (height - 1) * stride,
+                         first + (height - 1) * stride + width))
+    for i in xrange(height):
+        border.update((first + i * stride, first + i * stride + width - 1))
+
+    buckets = [[] for _ in xrange(256)]
+    for p in border:
+        done[p] = 1
+        buckets[f[p]].append(p)
+    offsets = frame.offsets
+    for level in xrange(256):
+        bucket = buckets[level]
+        while bucket:
+            p = bucket.pop()
+            for o in offsets:
+                q = p + o
+                if not done[q]:
+                    done[q] = 1
+                    if f[q] < level:
+                        f[q] = level
+                    buckets[f[q]].append(q)
+    return components.write(res, f, frame)
+
+
+def fill_binary(image, res, structuralElement):
+    """
+    Save into `res` the `BinaryImage` `image` with its holes filled.
+    """
+    width, height = image.width, image.height
+    # The pixels of the first and last rows and columns.
+    edges = BinaryImage(width, height, [
+        image.full_row if i in (0, height - 1) else 1 | 1 << (width - 1)
+        for i in xrange(height)])
+    # The background reached from the border, flooded row by row.
+    reached, _ = binary.reconstruct(structuralElement, edges, image.invert())
+    res.rows = reached.invert().rows
+    return res
+
+
+def fill_runs(image, res, structuralElement):
+    """
+    Save into `res` the `RunLengthImage` `image` with its holes filled.
+    """
+    width, height = image.width, image.height
+    edges = RunLengthImage(width, height)
+    for i in xrange(height):
+        edges.rows[i] = [(0, width)] if i in (0, height - 1) \
+                else runs.merge([(0, 1), (width - 1, width)])
+    # The background reached from the border, flooded run by run.
+    reached, _ = runs.reconstruct(structuralElement, edges, image.invert())
+    res.rows = reached.invert().rows
+    return res
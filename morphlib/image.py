@@ -1,3 +1,9 @@
+import os
+from array import array
+
+from morphlib import pnm
+
+
 class ImageRow(object):
     """
     RGB Image row
@@ -24,11 +30,74 @@ class ImageRow(object):
         return x
 
 
-class GrayscaleRow(ImageRow):
-    def check_item(self, x):
-        if not isinstance(x, int) or not 0 <= x <= 255:
+class GrayscaleRow(object):
+    """
+    Grayscale image row.
+
+    A view of `width` pixels of a flat pixel buffer starting at `offset`.
+    Writes go straight to the buffer, which rejects values outside 0..255.
+    """
+    __slots__ = ('buf', 'offset', 'width')
+
+    def __init__(self, buf, offset, width):
+        self.buf = buf
+        self.offset = offset
+        self.width = width
+
+    def __setitem__(self, j, x):
+        if not 0 <= j < self.width:
+            j = self._check_index(j)
+        try:
+            self.buf[self.offset + j] = x
+        except ValueError:
             raise TypeError('Invalid grayscale pixel value: %r' % x)
-        return x
+
+    def __getitem__(self, j):
+        if not 0 <= j < self.width:
+            if isinstance(j, slice):
+                return list(self.buf[self.offset:self.offset + self.width][j])
+            j = self._check_index(j)
+        return self.buf[self.offset + j]
+
+    def __len__(self):
+        return self.width
+
+    def __iter__(self):
+        return iter(self.buf[self.offset:self.offset + self.width])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self))
+
+    def _check_index(self, j):
+        if -self.width <= j < 0:
+            return j + self.width
+        raise IndexError('Pixel index out of range: %r' % j)
+
+
+def _pil_tobytes(pil_image):
+    """
+    Return the pixels of a PIL image as a string of bytes.
+    """
+    # PIL before Pillow 2.0 only has tostring/fromstring.
+    if hasattr(pil_image, 'tobytes'):
+        return pil_image.tobytes()
+    return pil_image.tostring()
+
+
+def _pil_frombytes(mode, size, data):
+    """
+    Return a PIL image made of the bytes in the buffer `data`.
+    """
+    import PIL.Image
+    if hasattr(PIL.Image, 'frombytes'):
+        return PIL.Image.frombytes(mode, size, buffer(data))
+    return PIL.Image.fromstring(mode, size, str(data))
 
 
 class Image(object):
@@ -38,6 +107,10 @@ class Image(object):
     PIL_FORMAT='RGB'
     ROW_CLASS=ImageRow
     mode='rgb'
+    CHANNELS=3
+    # Files with these extensions are saved in the native formats (see
+    # `morphlib.pnm`) instead of through PIL.
+    NATIVE_FORMATS={'.ppm': pnm.RGB, '.pnm': pnm.RGB, '.raw': pnm.RAW_RGB}
 
     def __init__(self, width, height, data):
         self.width = width
@@ -45,43 +118,64 @@ class Image(object):
         self._data = data
 
     @classmethod
-    def load(cls, filepath):
+    def load(cls, filepath, convert=True):
         """
         Loads image into memory and returns the Image object representing it.
+
+        Binary PGM/PPM and raw files are memory-mapped instead of decoded
+        (see `morphlib.pnm`), other formats go through PIL. PIL images not
+        in the mode of the class are converted, unless `convert` is False,
+        in which case they are rejected with a ValueError.
         """
+        if pnm.sniff(filepath):
+            magic, width, height, pixels = pnm.map_file(filepath)
+            if pnm.CHANNELS[magic] == cls.CHANNELS:
+                return cls._from_buffer(width, height, pixels)
+            if magic in (pnm.RAW_GRAYSCALE, pnm.RAW_RGB):
+                raise ValueError('%s is not a %s image' % (filepath, cls.mode))
         # PIL used for image import/export only.
         import PIL.Image
-        pil_image=PIL.Image.open(filepath).convert(cls.PIL_FORMAT)
+        pil_image=PIL.Image.open(filepath)
+        if pil_image.mode != cls.PIL_FORMAT:
+            if not convert:
+                raise ValueError('%s is a %s image, not %s' % (
+                    filepath, pil_image.mode, cls.PIL_FORMAT))
+            pil_image = pil_image.convert(cls.PIL_FORMAT)
+        return cls._from_pil(pil_image)
+
+    @classmethod
+    def _from_pil(cls, pil_image):
         width, height = pil_image.size
-        # Get the pixel list
-        pixel_list = list(pil_image.getdata())
-        data = []
-        # The pixel list is flat, so we need to make it into a matrix for more
-        # convinient processing.
-        for i in xrange(0, len(pixel_list), width):
-            data.append(cls.ROW_CLASS(pixel_list[i:i+width]))
-        assert len(data) == height, \
-                'Image data height mismatch: %s instead of %s.' % (len(data), height)
+        return cls._from_buffer(width, height, _pil_tobytes(pil_image))
+
+    @classmethod
+    def _from_buffer(cls, width, height, pixels):
+        values = iter(bytearray(pixels))
+        pixels = zip(values, values, values)
+        data = [cls.ROW_CLASS(pixels[i * width:(i + 1) * width])
+                for i in xrange(height)]
         return cls(width=width, height=height, data=data)
 
+    def _tobytes(self):
+        """
+        Return the pixels as a flat buffer of bytes.
+        """
+        return bytearray(v for px in self.getdata() for v in px)
+
     def save(self, filepath):
         """
         Saves an image to disk.
+
+        Files ending in one of `NATIVE_FORMATS` are written directly, other
+        formats go through PIL.
         """
+        magic = self.NATIVE_FORMATS.get(os.path.splitext(filepath)[1].lower())
+        if magic is not None:
+            pnm.write_file(filepath, magic, self.width, self.height,
+                           self._tobytes())
+            return
         # PIL used for image import/export only.
-        import PIL.Image
-        i = PIL.Image.new(self.PIL_FORMAT, (self.width, self.height))
-
-        assert len(self._data) == self.height, 'Wrong height'
-        assert len(self._data[0]) == self.width, 'Wrong width'
-
-        data = self.getdata()
-
-        assert self._data[0][0] == data[0]
-        assert self._data[0][1] == data[1]
-        assert self._data[1][0] == data[self.width]
-
-        i.putdata(data, scale=1.0, offset=0.0)
+        i = _pil_frombytes(self.PIL_FORMAT, self.size, self._tobytes())
         i.save(filepath)
 
     def copy(self):
@@ -123,6 +217,9 @@ class Image(object):
                     return False
         return True
 
+    def __ne__(self, other):
+        return not self == other
+
     def __getitem__(self, i):
         """
         Return a mutable row of pixels
@@ -151,20 +248,251 @@ class Image(object):
         return row
 
 
+# Lookup table for `bytearray.translate` mapping each value to 255 - value.
+INVERT_TABLE = ''.join(chr(255 - v) for v in xrange(256))
+
+
 class GrayscaleImage(Image):
+    """
+    A grayscale image abstraction.
+
+    Pixels live in one contiguous `bytearray` (one byte per pixel), row `i`
+    starting at offset `i * stride`. Rows are exposed as lightweight views on
+    that buffer, so `image[i][j]` keeps working, while whole-image operations
+    (copy, invert, getdata, ...) are single buffer copies.
+
+    Images loaded from PGM and raw files keep the pixels in the mapped file
+    until `materialize` copies them into their own buffer, which any pixel
+    access does first. Loading and saving such an image, or copying it, never
+    goes through that extra copy.
+    """
     # XXX: Should have an abstract class and not have Grayscale inherit Image
     # (which is actually RGBImage)
     PIL_FORMAT='L'
     ROW_CLASS=GrayscaleRow
     mode='grayscale'
+    CHANNELS=1
+    NATIVE_FORMATS={'.pgm': pnm.GRAYSCALE, '.pnm': pnm.GRAYSCALE,
+                    '.raw': pnm.RAW_GRAYSCALE}
+
+    def __init__(self, width, height, data):
+        self.width = width
+        self.height = height
+        self.stride = width
+        self._buf = self._make_buffer(data)
+        self._make_rows()
+
+    @classmethod
+    def _from_pil(cls, pil_image):
+        width, height = pil_image.size
+        return cls(width=width, height=height,
+                   data=bytearray(_pil_tobytes(pil_image)))
+
+    @classmethod
+    def _from_buffer(cls, width, height, pixels):
+        image = cls.__new__(cls)
+        image.width = width
+        image.height = height
+        image.stride = width
+        # The pixels stay in the (mapped) `pixels` until `materialize`.
+        image._source = pixels
+        image._buf = image._rows = None
+        return image
+
+    def materialize(self):
+        """
+        Copy the pixels of an image loaded from a file into a buffer of its
+        own, if not done yet, and return the image.
+
+        This is one copy of the whole image, made by the first pixel access
+        (`getbuffer`, `image[i]`, ...): the engines read and write the
+        pixels as ints, which the mapped file does not provide.
+        """
+        if self._buf is None:
+            self._buf = bytearray(self._source)
+            self._source = None
+            self._make_rows()
+        return self
+
+    def _tobytes(self):
+        return self._source if self._buf is None else self._buf
+
+    def __getstate__(self):
+        self.materialize()
+        state = self.__dict__.copy()
+        # Row views are rebuilt on unpickling.
+        del state['_rows']
+        state.pop('_source', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._make_rows()
+
+    def _make_buffer(self, data):
+        """
+        Turn `data` into the flat pixel buffer of the image.
+
+        `data` is either a flat buffer (bytearray, str, array('B'), ...) of
+        `width * height` pixels or a sequence of rows. A bytearray is used as
+        is, anything else is copied.
+        """
+        if isinstance(data, (bytearray, str, buffer, array)):
+            buf = data if isinstance(data, bytearray) else bytearray(data)
+            if len(buf) != self.width * self.height:
+                raise ValueError(
+                    "Image buffer should have %s pixels. Got %s instead" % (
+                        self.width * self.height, len(buf)))
+            return buf
+        buf = bytearray()
+        for row in data:
+            buf.extend(self._check_row(row))
+        if len(buf) != self.width * self.height:
+            raise ValueError(
+                "Image data height mismatch: %s instead of %s." % (
+                    len(buf) / (self.width or 1), self.height))
+        return buf
+
+    def _make_rows(self):
+        self._rows = [self.ROW_CLASS(self._buf, i * self.stride, self.width)
+                      for i in xrange(self.height)]
+
+    def getbuffer(self):
+        """
+        Return the underlying flat pixel buffer (not a copy).
+        """
+        if self._buf is None:
+            self.materialize()
+        return self._buf
+
+    def copy(self):
+        """
+        Return a copy of the image.
+        """
+        return self.__class__(
+            width=self.width,
+            height=self.height,
+            data=bytearray(self._tobytes()),
+        )
+
+    def getdata(self):
+        """
+        Return a copy of the image data.
+        """
+        return list(self.getbuffer())
+
+    def __eq__(self, other):
+        if isinstance(other, GrayscaleImage):
+            return self.size == other.size \
+                    and self._tobytes() == other._tobytes()
+        return super(GrayscaleImage, self).__eq__(other)
+
+    def __getitem__(self, i):
+        """
+        Return a mutable view of a row of pixels
+        """
+        if self._rows is None:
+            self.materialize()
+        return self._rows[i]
+
+    def __setitem__(self, i, row):
+        """
+        Set a row of pixels
+        """
+        offset = self[i].offset
+        self._buf[offset:offset + self.width] = self._check_row(row)
+
+    def append(self, i, row):
+        """
+        Append a row of pixels
+        """
+        self.getbuffer().extend(self._check_row(row))
+        self.height += 1
+        self._rows.append(
+            self.ROW_CLASS(self._buf, (self.height - 1) * self.stride, self.width))
+
+    def _check_row(self, row):
+        try:
+            row = bytearray(row)
+        except (TypeError, ValueError):
+            raise TypeError('Invalid grayscale pixel values in row: %r' % (row,))
+        if len(row) != self.width:
+            raise ValueError(
+                "All rows in image should have lenght %s. Got %s instead" % (
+                    self.width, len(row)
+                ))
+        return row
 
     def invert(self):
         return GrayscaleImage(
             width=self.width,
             height=self.height,
-            data=[map(lambda px: 255-px, r) for r in self._data]
+            data=self.getbuffer().translate(INVERT_TABLE),
         )
 
+    def pad(self, top, bottom, left, right, value=0, replicate=False):
+        """
+        Return a copy of the image surrounded by a frame of `value` pixels.
+        If `replicate` is True the frame repeats the nearest edge pixels
+        instead.
+        """
+        res = self.__class__(
+            width=self.width + left + right,
+            height=self.height + top + bottom,
+            data=bytearray(chr(value)) * (
+                (self.width + left + right) * (self.height + top + bottom)),
+        )
+        res.paste(self, (left, top))
+        if replicate and self.width and self.height:
+            buf, stride = res.getbuffer(), res.stride
+            for i in xrange(top, top + self.height):
+                offset = i * stride
+                buf[offset:offset + left] = \
+                        buf[offset + left:offset + left + 1] * left
+                buf[offset + left + self.width:offset + res.width] = \
+                        buf[offset + left + self.width - 1:
+                            offset + left + self.width] * right
+            first = buf[top * stride:top * stride + res.width]
+            last = buf[(top + self.height - 1) * stride:
+                       (top + self.height - 1) * stride + res.width]
+            for i in xrange(top):
+                buf[i * stride:i * stride + res.width] = first
+            for i in xrange(top + self.height, res.height):
+                buf[i * stride:i * stride + res.width] = last
+        return res
+
+    def crop(self, box):
+        """
+        Return the (left, upper, right, lower) rectangle of the image as a new
+        image.
+        """
+        left, upper, right, lower = box
+        assert 0 <= left <= right <= self.width, "Invalid crop box"
+        assert 0 <= upper <= lower <= self.height, "Invalid crop box"
+        buf = self.getbuffer()
+        data = bytearray()
+        for i in xrange(upper, lower):
+            offset = i * self.stride
+            data += buf[offset + left:offset + right]
+        return self.__class__(width=right - left, height=lower - upper,
+                              data=data)
+
+    def paste(self, image, box):
+        """
+        Copy `image` into this image with its top left corner at `box`, a
+        (left, upper) tuple.
+        """
+        left, upper = box
+        assert 0 <= left and left + image.width <= self.width, \
+                "Pasted image does not fit"
+        assert 0 <= upper and upper + image.height <= self.height, \
+                "Pasted image does not fit"
+        buf, src = self.getbuffer(), image.getbuffer()
+        for i in xrange(image.height):
+            offset = (upper + i) * self.stride + left
+            buf[offset:offset + image.width] = \
+                    src[i * image.stride:i * image.stride + image.width]
+
     def border(self, pixels=1):
         """
         Return the border of the image, which is a new image with BLACK inside.
@@ -173,7 +501,564 @@ class GrayscaleImage(Image):
         assert 0 < pixels < self.height, "Invalid border size"
 
         res = self.copy()
+        inside = bytearray(self.width - 2 * pixels)
         for i in xrange(pixels, res.height - pixels):
-            for j in xrange(pixels, res.width - pixels):
-                res[i][j] = 0
+            offset = i * res.stride + pixels
+            res._buf[offset:offset + len(inside)] = inside
+        return res
+
+
+class _RowView(object):
+    """
+    Row of a `BinaryImage`, `RunLengthImage` or `LabelImage`.
+
+    A view of row `i` of the image. Subclasses read and write a pixel, whose
+    index is checked, with `_get` and `_set`; values are checked by
+    `_check_value`, which by default only lets 0 and 1 through.
+    """
+    __slots__ = ('image', 'i')
+
+    def __init__(self, image, i):
+        self.image = image
+        self.i = i
+
+    def __getitem__(self, j):
+        if isinstance(j, slice):
+            return list(self)[j]
+        if not 0 <= j < self.image.width:
+            j = self._check_index(j)
+        return self._get(j)
+
+    def __setitem__(self, j, x):
+        if not 0 <= j < self.image.width:
+            j = self._check_index(j)
+        self._set(j, self._check_value(x))
+
+    def __len__(self):
+        return self.image.width
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self))
+
+    def _check_index(self, j):
+        if -self.image.width <= j < 0:
+            return j + self.image.width
+        raise IndexError('Pixel index out of range: %r' % j)
+
+    def _check_value(self, x):
+        if x not in (0, 1):
+            raise TypeError('Invalid binary pixel value: %r' % (x,))
+        return x
+
+
+class BinaryRow(_RowView):
+    """
+    Binary image row.
+
+    A view of row `i` of a `BinaryImage`, with pixels 0 or 1.
+    """
+    __slots__ = ()
+
+    def _get(self, j):
+        return (self.image.rows[self.i] >> j) & 1
+
+    def _set(self, j, x):
+        if x:
+            self.image.rows[self.i] |= 1 << j
+        else:
+            self.image.rows[self.i] &= ~(1 << j)
+
+    def __iter__(self):
+        row = self.image.rows[self.i]
+        return iter([(row >> j) & 1 for j in xrange(self.image.width)])
+
+
+# Lookup tables between grayscale bytes and the '0'/'1' digits of a binary
+# image, for `bytearray.translate`.
+_BINARY_DIGITS = {}
+
+
+def _binary_digits(threshold):
+    if threshold not in _BINARY_DIGITS:
+        _BINARY_DIGITS[threshold] = ''.join(
+            '1' if v >= threshold else '0' for v in xrange(256))
+    return _BINARY_DIGITS[threshold]
+
+_GRAYSCALE_DIGITS = ''.join(
+    {'0': '\x00', '1': '\xff'}.get(chr(v), '\x00') for v in xrange(256))
+
+
+class _ViewImage(Image):
+    """
+    Base of the images whose rows are views (see `_RowView`) made on demand.
+    """
+
+    def __getitem__(self, i):
+        """
+        Return a mutable view of a row of pixels
+        """
+        if not 0 <= i < self.height:
+            if not -self.height <= i < 0:
+                raise IndexError('Row index out of range: %r' % i)
+            i += self.height
+        return self.ROW_CLASS(self, i)
+
+    def __setitem__(self, i, row):
+        """
+        Set a row of pixels
+        """
+        row = self._check_row(row)
+        view = self[i]
+        for j, x in enumerate(row):
+            view[j] = x
+
+
+class _MaskImage(_ViewImage):
+    """
+    Base of the images of 0 and 1 pixels (`BinaryImage`, `RunLengthImage`),
+    which convert from and to grayscale with `from_grayscale` and
+    `to_grayscale`.
+    """
+    PIL_FORMAT='L'
+    CHANNELS=1
+    NATIVE_FORMATS=GrayscaleImage.NATIVE_FORMATS
+
+    @classmethod
+    def load(cls, filepath, threshold=128, convert=True):
+        """
+        Load the image at `filepath`, pixels at least `threshold` being set.
+        """
+        return cls.from_grayscale(
+            GrayscaleImage.load(filepath, convert=convert), threshold)
+
+    def save(self, filepath):
+        """
+        Save the image as a grayscale image of 0 and 255 pixels.
+        """
+        self.to_grayscale().save(filepath)
+
+    def getdata(self):
+        """
+        Return a copy of the image data.
+        """
+        return [px for i in xrange(self.height) for px in self[i]]
+
+
+class BinaryImage(_MaskImage):
+    """
+    A binary image abstraction.
+
+    Each row is packed in the bits of one Python integer, pixel (i, j) being
+    bit `j` of `rows[i]`, so row operations (shifts, and, or, ...) run 30
+    pixels per machine operation or better, while reading or setting a
+    pixel only touches the integer of its row. Pixels are 0 or 1;
+    `image[i][j]` works as for the other images.
+    """
+    ROW_CLASS=BinaryRow
+    mode='binary'
+
+    def __init__(self, width, height, rows=None):
+        self.width = width
+        self.height = height
+        if rows is None:
+            self.rows = [0] * height
+        else:
+            full = self.full_row
+            self.rows = [row & full for row in rows]
+            if len(self.rows) != height:
+                raise ValueError(
+                    "Image should have %s rows. Got %s instead" % (
+                        height, len(self.rows)))
+
+    @property
+    def full_row(self):
+        """
+        The bits of a row with all its pixels set.
+        """
+        return (1 << self.width) - 1
+
+    @classmethod
+    def from_grayscale(cls, image, threshold=128):
+        """
+        Return the binary image of the pixels of `image` at least
+        `threshold`.
+        """
+        width = image.width
+        digits = str(image.crop((0, 0, width, image.height)).getbuffer()
+                     .translate(_binary_digits(threshold)))
+        return cls(width, image.height,
+                   [int(digits[k:k + width][::-1] or '0', 2)
+                    for k in xrange(0, width * image.height, width)])
+
+    def to_grayscale(self):
+        """
+        Return the image as a `GrayscaleImage` of 0 and 255 pixels.
+        """
+        width = self.width
+        digits = ''.join(bin(row)[2:][::-1].ljust(width, '0')
+                         for row in self.rows)
+        return GrayscaleImage(width=width, height=self.height,
+                              data=bytearray(digits).translate(
+                                  _GRAYSCALE_DIGITS))
+
+    def copy(self):
+        """
+        Return a copy of the image.
+        """
+        return self.__class__(self.width, self.height, self.rows)
+
+    def count(self):
+        """
+        Return the number of set pixels.
+        """
+        return sum(bin(row).count('1') for row in self.rows)
+
+    def __eq__(self, other):
+        if isinstance(other, BinaryImage):
+            return self.size == other.size and self.rows == other.rows
+        return super(BinaryImage, self).__eq__(other)
+
+    def invert(self):
+        return self.__class__(self.width, self.height,
+                              [~row for row in self.rows])
+
+    def border(self, pixels=1):
+        """
+        Return the border of the image, which is a new image with no pixel
+        set inside.
+        """
+        assert 0 < pixels < self.width, "Invalid border size"
+        assert 0 < pixels < self.height, "Invalid border size"
+        res = self.copy()
+        inside = ((1 << (self.width - 2 * pixels)) - 1) << pixels
+        for i in xrange(pixels, self.height - pixels):
+            res.rows[i] &= ~inside
+        return res
+
+
+class RunLengthRow(_RowView):
+    """
+    Run-length encoded image row.
+
+    A view of row `i` of a `RunLengthImage`, with pixels 0 or 1.
+    """
+    __slots__ = ()
+
+    def _get(self, j):
+        for start, end in self.image.rows.get(self.i, ()):
+            if j < end:
+                return 1 if start <= j else 0
+        return 0
+
+    def _set(self, j, x):
+        if self._get(j) == x:
+            return
+        pixels = list(self)
+        pixels[j] = x
+        self.image.set_runs(self.i, find_runs(pixels, 1))
+
+    def __iter__(self):
+        pixels = [0] * self.image.width
+        for start, end in self.image.rows.get(self.i, ()):
+            pixels[start:end] = [1] * (end - start)
+        return iter(pixels)
+
+
+def find_runs(pixels, threshold=128):
+    """
+    Return the (start, end) runs of consecutive `pixels` (a sequence of ints)
+    at least `threshold`.
+    """
+    digits = str(bytearray(pixels).translate(_binary_digits(threshold)))
+    res = []
+    end = 0
+    while True:
+        start = digits.find('1', end)
+        if start < 0:
+            return res
+        end = digits.find('0', start)
+        if end < 0:
+            end = len(digits)
+        res.append((start, end))
+
+
+def complement_runs(runs, width):
+    """
+    Return the runs of the pixels of a row of `width` pixels not in `runs`.
+    """
+    res = []
+    j = 0
+    for start, end in runs:
+        if start > j:
+            res.append((j, start))
+        j = end
+    if j < width:
+        res.append((j, width))
+    return res
+
+
+class RunLengthImage(_MaskImage):
+    """
+    A run-length encoded binary image abstraction.
+
+    Each row is a sorted list of the (start, end) runs of its set pixels,
+    `end` excluded; only the rows with set pixels are kept, in the `rows`
+    dict. The memory and the time taken by the operators grow with the
+    number of runs, not of pixels, so mostly empty masks are cheap.
+    Pixels are 0 or 1; `image[i][j]` works as for the other images.
+    """
+    ROW_CLASS=RunLengthRow
+    mode='rle'
+
+    def __init__(self, width, height, rows=None):
+        self.width = width
+        self.height = height
+        self.rows = {}
+        for i, runs in (rows or {}).items():
+            self.set_runs(i, runs)
+
+    def set_runs(self, i, runs):
+        """
+        Set the runs of row `i`, sorted and not touching each other.
+        """
+        if not 0 <= i < self.height:
+            raise IndexError('Row index out of range: %r' % i)
+        runs = [(start, end) for start, end in runs if start < end]
+        if runs:
+            assert 0 <= runs[0][0] and runs[-1][1] <= self.width, \
+                    "Runs do not fit in the row"
+            self.rows[i] = runs
+        else:
+            self.rows.pop(i, None)
+
+    @classmethod
+    def from_grayscale(cls, image, threshold=128):
+        """
+        Return the run-length encoded image of the pixels of `image` at
+        least `threshold`.
+        """
+        res = cls(image.width, image.height)
+        buf, stride = image.getbuffer(), image.stride
+        for i in xrange(image.height):
+            runs = find_runs(buf[i * stride:i * stride + image.width],
+                             threshold)
+            if runs:
+                res.rows[i] = runs
+        return res
+
+    def to_grayscale(self):
+        """
+        Return the image as a `GrayscaleImage` of 0 and 255 pixels.
+        """
+        width = self.width
+        data = bytearray(width * self.height)
+        for i, runs in self.rows.iteritems():
+            for start, end in runs:
+                data[i * width + start:i * width + end] = \
+                        '\xff' * (end - start)
+        return GrayscaleImage(width=width, height=self.height, data=data)
+
+    def copy(self):
+        """
+        Return a copy of the image.
+        """
+        res = self.__class__(self.width, self.height)
+        res.rows = dict((i, list(runs)) for i, runs in self.rows.iteritems())
+        return res
+
+    def count(self):
+        """
+        Return the number of set pixels.
+        """
+        return sum(end - start for runs in self.rows.itervalues()
+                   for start, end in runs)
+
+    def runs(self):
+        """
+        Return the number of runs.
+        """
+        return sum(len(runs) for runs in self.rows.itervalues())
+
+    def __eq__(self, other):
+        if isinstance(other, RunLengthImage):
+            return self.size == other.size and self.rows == other.rows
+        return super(RunLengthImage, self).__eq__(other)
+
+    def __setitem__(self, i, row):
+        """
+        Set a row of pixels
+        """
+        row = self._check_row(row)
+        if any(x not in (0, 1) for x in row):
+            raise TypeError('Invalid binary pixel values: %r' % (row,))
+        self.set_runs(self[i].i, find_runs(row, 1))
+
+    def invert(self):
+        res = self.__class__(self.width, self.height)
+        for i in xrange(self.height):
+            runs = complement_runs(self.rows.get(i, ()), self.width)
+            if runs:
+                res.rows[i] = runs
+        return res
+
+    def border(self, pixels=1):
+        """
+        Return the border of the image, which is a new image with no pixel
+        set inside.
+        """
+        assert 0 < pixels < self.width, "Invalid border size"
+        assert 0 < pixels < self.height, "Invalid border size"
+        res = self.copy()
+        edges = [(0, pixels), (self.width - pixels, self.width)]
+        for i in xrange(pixels, self.height - pixels):
+            if i in res.rows:
+                res.set_runs(i, [
+                    (max(start, a), min(end, b))
+                    for start, end in res.rows[i] for a, b in edges])
         return res
+
+
+# Array type codes from the smallest, with the largest label they hold.
+# Labels stop at the largest signed 32-bit integer, which the framed label
+# buffers of `morphlib.watershed` hold.
+_LABEL_TYPES = (('B', 0xff), ('H', 0xffff), ('I', 0x7fffffff))
+
+
+def _label_type(top):
+    """
+    Return the code of the smallest array type holding the labels up to
+    `top`.
+    """
+    for code, limit in _LABEL_TYPES:
+        if top <= limit:
+            return code
+    raise ValueError('Label too large: %r' % (top,))
+
+
+class LabelRow(_RowView):
+    """
+    Label image row.
+
+    A view of row `i` of a `LabelImage`. Writing a label too large for the
+    array of the image widens the array.
+    """
+    __slots__ = ()
+
+    def _get(self, j):
+        return self.image.labels[self.i * self.image.width + j]
+
+    def _set(self, j, x):
+        image = self.image
+        if x > dict(_LABEL_TYPES)[image.labels.typecode]:
+            image.labels = array(_label_type(x), image.labels)
+        image.labels[self.i * image.width + j] = x
+
+    def __iter__(self):
+        width = self.image.width
+        return iter(self.image.labels[self.i * width:(self.i + 1) * width])
+
+    def _check_value(self, x):
+        if not isinstance(x, (int, long)) or x < 0:
+            raise TypeError('Invalid label: %r' % (x,))
+        return x
+
+
+class LabelImage(_ViewImage):
+    """
+    An image of integer labels, such as the regions of a segmentation.
+
+    Labels live in one flat `array` of the smallest unsigned type holding
+    them (one, two or four bytes per pixel), row `i` starting at offset
+    `i * width`. 0 means no label, and labels go up to 2**31 - 1.
+    `image[i][j]` works as for the other images.
+    """
+    ROW_CLASS=LabelRow
+    mode='labels'
+    CHANNELS=1
+
+    def __init__(self, width, height, labels=None):
+        self.width = width
+        self.height = height
+        if labels is None:
+            labels = array('B', '\0' * (width * height))
+        else:
+            labels = self.compact(labels)
+        if len(labels) != width * height:
+            raise ValueError(
+                "Label image should have %s pixels. Got %s instead" % (
+                    width * height, len(labels)))
+        self.labels = labels
+
+    @staticmethod
+    def compact(labels):
+        """
+        Return the sequence of non-negative ints `labels` as an array of the
+        smallest type holding them.
+        """
+        code = _label_type(max(labels) if len(labels) else 0)
+        return labels if getattr(labels, 'typecode', None) == code \
+                else array(code, labels)
+
+    @classmethod
+    def from_grayscale(cls, image):
+        """
+        Return the labels given by the pixel values of `image`.
+        """
+        data = image.crop((0, 0, image.width, image.height)).getbuffer()
+        return cls(image.width, image.height, array('B', str(data)))
+
+    @classmethod
+    def load(cls, filepath, convert=True):
+        """
+        Load the grayscale image at `filepath`, whose pixel values are the
+        labels.
+        """
+        return cls.from_grayscale(
+            GrayscaleImage.load(filepath, convert=convert))
+
+    def label_count(self):
+        """
+        Return the largest label.
+        """
+        return max(self.labels) if len(self.labels) else 0
+
+    def to_grayscale(self):
+        """
+        Return the labels modulo 256 as a `GrayscaleImage`.
+        """
+        if self.labels.typecode == 'B':
+            data = bytearray(self.labels.tostring())
+        else:
+            data = bytearray(l & 0xff for l in self.labels)
+        return GrayscaleImage(width=self.width, height=self.height, data=data)
+
+    def save(self, filepath):
+        """
+        Save the labels modulo 256 as a grayscale image.
+        """
+        self.to_grayscale().save(filepath)
+
+    def copy(self):
+        """
+        Return a copy of the image.
+        """
+        return self.__class__(self.width, self.height, array(
+            self.labels.typecode, self.labels))
+
+    def getdata(self):
+        """
+        Return a copy of the image data.
+        """
+        return list(self.labels)
+
+    def __eq__(self, other):
+        if isinstance(other, LabelImage):
+            return self.size == other.size and self.labels == other.labels
+        return super(LabelImage, self).__eq__(other)
+
@@ -0,0 +1,170 @@
+"""
+Structural elements compiled for a given image shape.
+
+A `Kernel` is built once per structural element, image shape and border mode
+(see `StructuralElement.compile`). It holds the offsets of the neighbours
+both as (row, column) deltas and as linear offsets into the flat pixel buffer
+of a `GrayscaleImage`, and the interior region of the image where every
+neighbour is inside the image. Interior rows are reduced with no bounds
+checks at all, as elementwise min/max of shifted slices of the buffer; only
+the border band goes pixel by pixel through the border mode:
+
+CLIP
+    neighbours outside the image are ignored
+REPLICATE
+    neighbours outside the image read the nearest edge pixel
+CONSTANT
+    neighbours outside the image read a constant value
+"""
+
+CLIP = 'clip'
+REPLICATE = 'replicate'
+CONSTANT = 'constant'
+
+BORDER_MODES = (CLIP, REPLICATE, CONSTANT)
+
+
+class Kernel(object):
+    """
+    A structural element compiled for images of a given shape.
+    """
+
+    def __init__(self, structuralElement, width, height, stride=None,
+                 border=CLIP, value=0):
+        if border not in BORDER_MODES:
+            raise ValueError('Unknown border mode: %r' % (border,))
+        if stride is None:
+            stride = width
+        self.width = width
+        self.height = height
+        self.stride = stride
+        self.border = border
+        self.value = value
+        # The neighbours of pixel `p` are `p - o` for every offset `o` of the
+        # structural element.
+        self.deltas = sorted((-i, -j) for i, j in structuralElement.ones_offsets)
+        self.linear = [i * stride + j for i, j in self.deltas]
+        # Interior rows are [top, height - bottom), interior columns
+        # [left, width - right).
+        self.top = max([0] + [-i for i, j in self.deltas])
+        self.bottom = max([0] + [i for i, j in self.deltas])
+        self.left = max([0] + [-j for i, j in self.deltas])
+        self.right = max([0] + [j for i, j in self.deltas])
+
+    def neighbourhood(self, i, j):
+        """
+        Return the positions of the neighbours of pixel (i, j) inside the
+        image, replicated edge pixels included.
+        """
+        res = []
+        for di, dj in self.deltas:
+            ni, nj = i + di, j + dj
+            if 0 <= ni < self.height and 0 <= nj < self.width:
+                res.append((ni, nj))
+            elif self.border == REPLICATE:
+                res.append((min(max(ni, 0), self.height - 1),
+                            min(max(nj, 0), self.width - 1)))
+        return res
+
+    def values(self, image, i, j):
+        """
+        Return the values of the neighbours of pixel (i, j) of `image`.
+        """
+        res = [image[p][q] for p, q in self.neighbourhood(i, j)]
+        if self.border == CONSTANT and len(res) < len(self.deltas):
+            res.append(self.value)
+        return res
+
+    def erode(self, image, res):
+        """
+        Erode the `GrayscaleImage` `image` saving the result in `res`.
+        """
+        return self._reduce(min, 255, image, res)
+
+    def dilate(self, image, res):
+        """
+        Dilate the `GrayscaleImage` `image` saving the result in `res`.
+        """
+        return self._reduce(max, 0, image, res)
+
+    def gradient(self, image, res):
+        """
+        Save into `res` the maximum minus the minimum of every neighbourhood
+        of the `GrayscaleImage` `image`, both found in the same walk.
+        """
+        return self._walk(_gradient_rows, _gradient, 0, image, res)
+
+    def _reduce(self, reduce, empty, image, res):
+        """
+        Save into `res` the `reduce` of every neighbourhood of `image`.
+        Neighbourhoods left empty by the border mode read as `empty`.
+        """
+        return self._walk(lambda rows: _reduce_rows(reduce, rows), reduce,
+                          empty, image, res)
+
+    def _walk(self, combine_rows, combine, empty, image, res):
+        """
+        Save into `res` the `combine` of the values of every neighbourhood
+        of `image`. Interior rows go through `combine_rows`, which combines
+        the rows of neighbours of all the pixels at once. Neighbourhoods
+        left empty by the border mode read as `empty`.
+        """
+        src = image.getbuffer()
+        out = bytearray(len(src))
+        width, height, stride = self.width, self.height, self.stride
+        n = width - self.left - self.right
+
+        if n > 0 and self.linear:
+            for i in xrange(self.top, height - self.bottom):
+                start = i * stride + self.left
+                out[start:start + n] = combine_rows(
+                    [src[start + o:start + o + n] for o in self.linear])
+        else:
+            n = 0
+
+        for i, j in self._border_band(n):
+            values = [src[p * stride + q] for p, q in self.neighbourhood(i, j)]
+            if self.border == CONSTANT and len(values) < len(self.deltas):
+                values.append(self.value)
+            out[i * stride + j] = combine(values) if values else empty
+
+        dst, res_stride = res.getbuffer(), res.stride
+        for i in xrange(height):
+            dst[i * res_stride:i * res_stride + width] = \
+                    out[i * stride:i * stride + width]
+        return res
+
+    def _border_band(self, n):
+        """
+        Iterate over the pixels left out of the `n` pixels wide interior.
+        """
+        if n <= 0:
+            rows = xrange(self.height)
+        else:
+            rows = range(min(self.top, self.height)) + \
+                    range(max(self.top, self.height - self.bottom), self.height)
+        for i in rows:
+            for j in xrange(self.width):
+                yield i, j
+        if n <= 0:
+            return
+        edges = range(self.left) + range(self.width - self.right, self.width)
+        for i in xrange(self.top, self.height - self.bottom):
+            for j in edges:
+                yield i, j
+
+
+def _reduce_rows(reduce, rows):
+    if len(rows) == 1:
+        return rows[0]
+    return bytearray(map(reduce, *rows))
+
+
+def _gradient_rows(rows):
+    if len(rows) == 1:
+        return bytearray(len(rows[0]))
+    return bytearray(map(int.__sub__, map(max, *rows), map(min, *rows)))
+
+
+def _gradient(values):
+    return max(values) - min(values)
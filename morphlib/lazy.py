@@ -0,0 +1,143 @@
+"""
+Lazy evaluation of operators, with common subexpression elimination.
+
+Applying an operator to a lazy node returns another node instead of an
+image, so whole graphs of operators can be described before running any:
+
+    image = lazy.source(GrayscaleImage.load('scan.png'))
+    opened = Opening(se)(image)
+    closed = Closing(se)(image)
+    eroded = Erosion(se)(image)
+    opened, closed, eroded = lazy.compute(opened, closed, eroded)
+
+Composed operators are split into their stages, so above the erosion of
+`image` (the first stage of the opening) is computed once for both `opened`
+and `eroded`. Nodes are equal when they apply equal operators (see
+`morphlib.cache.operator_key`) to equal nodes. Intermediate images are
+dropped as soon as the last node using them has been computed.
+"""
+from morphlib.cache import operator_key
+
+
+def source(image):
+    """
+    Return a lazy node for `image`.
+    """
+    return Source(image)
+
+
+def compute(*nodes):
+    """
+    Compute `nodes` together, each distinct subexpression once. Returns the
+    list of the resulting images.
+    """
+    # Deduplicate the graph, giving each distinct node a representative.
+    canonical = {}
+    representative = {}
+    inputs_of = {}
+
+    def visit(node):
+        if node in representative:
+            return representative[node]
+        inputs = tuple(visit(i) for i in node.inputs)
+        key = (node.key(), tuple(id(i) for i in inputs))
+        rep = canonical.setdefault(key, node)
+        representative[node] = rep
+        inputs_of.setdefault(rep, inputs)
+        return rep
+
+    outputs = [visit(node) for node in nodes]
+
+    # Schedule in dependency order, counting the consumers of every node.
+    order, consumers, seen = [], {}, set()
+
+    def schedule(node):
+        if node in seen:
+            return
+        seen.add(node)
+        for i in inputs_of[node]:
+            consumers[i] = consumers.get(i, 0) + 1
+            schedule(i)
+        order.append(node)
+
+    for node in outputs:
+        schedule(node)
+
+    results = {}
+    for node in order:
+        results[node] = node.evaluate(
+            [results[i] for i in inputs_of[node]])
+        for i in inputs_of[node]:
+            consumers[i] -= 1
+            if not consumers[i] and i not in outputs:
+                del results[i]
+    return [results[node] for node in outputs]
+
+
+class Node(object):
+    """
+    A deferred image.
+    """
+    # Checked by the operators to return nodes when called on one.
+    deferred = True
+    inputs = ()
+
+    def then(self, operator):
+        """
+        Return the node of `operator` applied to this node.
+        """
+        operations = getattr(operator, 'operations', None)
+        if operations is not None and not getattr(operator, 'fuse', False):
+            node = self
+            for op in operations():
+                node = node.then(op)
+            return node
+        return Apply(operator, self)
+
+    def compute(self):
+        """
+        Return the image of the node.
+        """
+        return compute(self)[0]
+
+    def key(self):
+        raise NotImplementedError()
+
+    def evaluate(self, inputs):
+        raise NotImplementedError()
+
+
+class Source(Node):
+    """
+    A node for an existing image.
+    """
+
+    def __init__(self, image):
+        self.image = image
+
+    def key(self):
+        return ('source', id(self.image))
+
+    def evaluate(self, inputs):
+        return self.image
+
+
+class Apply(Node):
+    """
+    A node for `operator` applied to the node `input`.
+    """
+
+    def __init__(self, operator, input):
+        self.operator = operator
+        self.inputs = (input,)
+        try:
+            self._key = ('apply', operator_key(operator))
+        except TypeError:
+            # Never merged with other nodes.
+            self._key = ('apply', id(operator))
+
+    def key(self):
+        return self._key
+
+    def evaluate(self, inputs):
+        return self.operator(inputs[0])
@@ -0,0 +1,100 @@
+"""
+Erosion and dilation by rectangles with the van Herk/Gil-Werman algorithm.
+
+A rectangle (which includes horizontal and vertical lines) is the Minkowski
+sum of a horizontal and a vertical line, so it is processed as two 1-D
+passes. Each pass computes the minimum over sliding windows of `k` values
+with about three comparisons per pixel, whatever `k` is: the sequence is
+cut into blocks of `k` values, prefix and suffix minima are computed inside
+every block, and each window, which spans at most two blocks, is the minimum
+of one suffix and one prefix. Maxima are computed as minima of the inverted
+image.
+
+This is the pure Python engine working on the flat pixel buffer of a
+`GrayscaleImage`. `morphlib.vectorized` has the NumPy counterpart.
+"""
+from morphlib.image import INVERT_TABLE
+
+
+def supports(*images):
+    """
+    Return True if the engine can process all given images.
+    """
+    return all(hasattr(i, 'getbuffer') for i in images)
+
+
+def erode(structuralElement, image, res):
+    """
+    Erode `image` by the rectangle `structuralElement` saving the result in
+    `res`.
+    """
+    return _apply(structuralElement, image, res, invert=False)
+
+
+def dilate(structuralElement, image, res):
+    """
+    Dilate `image` by the rectangle `structuralElement` saving the result in
+    `res`.
+    """
+    return _apply(structuralElement, image, res, invert=True)
+
+
+def running_min(seq, shift, k):
+    """
+    Return a bytearray whose value at `x` is the minimum of
+    `seq[x - shift:x - shift + k]`, values outside `seq` reading as 255.
+    """
+    n = len(seq)
+    if k == 1 and shift == 0:
+        return bytearray(seq)
+    # The window of `x` is q[x:x + k], q[t] being seq[t - shift].
+    length = n + k - 1
+    length += -length % k
+    q = bytearray('\xff') * length
+    lo, hi = max(0, shift), min(length, shift + n)
+    if lo < hi:
+        q[lo:hi] = seq[lo - shift:hi - shift]
+
+    prefix = bytearray(q)
+    suffix = q
+    for b in xrange(0, length, k):
+        acc = prefix[b]
+        for t in xrange(b + 1, b + k):
+            v = prefix[t]
+            if v < acc:
+                acc = v
+            else:
+                prefix[t] = acc
+        acc = suffix[b + k - 1]
+        for t in xrange(b + k - 2, b - 1, -1):
+            v = suffix[t]
+            if v < acc:
+                acc = v
+            else:
+                suffix[t] = acc
+    return bytearray(map(min, suffix[:n], prefix[k - 1:k - 1 + n]))
+
+
+def _apply(structuralElement, image, res, invert):
+    top, bottom, left, right = structuralElement.extent
+    width, height = image.width, image.height
+    src, stride = image.getbuffer(), image.stride
+
+    # Horizontal pass into a scratch buffer. The neighbours of `p` are
+    # `p - o`, so the window of column `x` starts at `x - right`.
+    tmp = bytearray(width * height)
+    for i in xrange(height):
+        row = src[i * stride:i * stride + width]
+        if invert:
+            row = row.translate(INVERT_TABLE)
+        tmp[i * width:(i + 1) * width] = running_min(
+            row, right, right - left + 1)
+
+    # Vertical pass, one column at a time.
+    out, res_stride = res.getbuffer(), res.stride
+    for j in xrange(width):
+        column = running_min(tmp[j::width], bottom, bottom - top + 1)
+        if invert:
+            column = column.translate(INVERT_TABLE)
+        out[j:j + (height - 1) * res_stride + 1:res_stride] = column
+    return res
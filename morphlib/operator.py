@@ -1,9 +1,38 @@
 """
 A module containing morphological operators.
 """
+from collections import deque
+
+from morphlib import binary, components, holes, instrument, kernel, lines, \
+        rank, runs, vectorized, watershed
+from morphlib.image import INVERT_TABLE, GrayscaleImage, LabelImage
+
 
 class MorphologicalOperator(object):
+    # Border mode and value for operators working with a structural element,
+    # see `morphlib.kernel`.
+    border = kernel.CLIP
+    border_value = 0
+    # Modes of the images the operator works on.
+    modes = ('grayscale',)
+
+    def __init__(self, structuralElement, exact=True, border=kernel.CLIP,
+                 border_value=0):
+        """
+        Set up an operator working with `structuralElement`. `exact` is
+        passed on to `StructuralElement.decompose`, `border` and
+        `border_value` give how pixels outside the image are read.
+        """
+        self.structuralElement = structuralElement
+        self.exact = exact
+        self.border = _check_border(border)
+        self.border_value = border_value
+
+    @instrument.traced
     def __call__(self, image):
+        # Lazy nodes, see `morphlib.lazy`.
+        if getattr(image, 'deferred', False):
+            return image.then(self)
         res = image.copy()
         self._check_image(image)
         return self.apply(image, res)
@@ -20,24 +49,74 @@ class MorphologicalOperator(object):
                 res[i][j] = self.compute_pixel((i,j), image)
         return res
 
+    def counters(self, image):
+        """
+        Return the work done by the last run on `image`, by name (see
+        `morphlib.instrument`).
+        """
+        return {'pixels': image.width * image.height}
+
     def _check_image(self, image):
-        if image.mode != 'grayscale':
-            raise TypeError('%s only works on grayscale images' % self.__class__)
+        if image.mode not in self.modes:
+            raise TypeError('%s only works on %s images' % (
+                self.__class__, ' and '.join(self.modes)))
+
+    def halo(self):
+        """
+        Return how many pixels of context (top, bottom, left, right) the
+        operator needs around a pixel to compute it, or None if the context
+        is not bounded.
+        """
+        return None
+
+    def _kernel(self, image):
+        """
+        Return the structural element compiled for `image`.
+        """
+        return self.structuralElement.compile(
+            image.width, image.height, getattr(image, 'stride', None),
+            self.border, self.border_value)
 
 class ComposedMorphologicalOperator(MorphologicalOperator):
 
     operationsList = []
+    # Passed on to the operations, see `StructuralElement.decompose`.
+    exact = True
+    modes = ('grayscale', 'binary', 'rle')
 
+    @instrument.traced
     def __call__(self, original):
+        if getattr(original, 'deferred', False):
+            return original.then(self)
         self._check_image(original)
         res = original.copy()
         self.apply(original, res)
         return res
 
+    def operations(self):
+        """
+        Return the operators to apply one after the other.
+        """
+        return [operation(self.structuralElement, exact=self.exact,
+                          border=self.border, border_value=self.border_value)
+                for operation in self.operationsList]
+
+    def halo(self):
+        return _sum_halos(op.halo() for op in self.operations())
+
+    def counters(self, image):
+        return _sum_counters(op.counters(image) for op in self.operations())
+
     def apply(self, original, res):
-        for operation in self.operationsList:
-            op = operation(self.structuralElement)
-            op.apply(original, res)
+        # Stages alternate between `res` and a single spare buffer, starting
+        # with whichever makes the last stage write into `res`.
+        ops = self.operations()
+        spare = original.copy() if len(ops) > 1 else None
+        src = original
+        for k, op in enumerate(ops):
+            dst = res if (len(ops) - k) % 2 == 1 else spare
+            instrument.apply_stage(op, src, dst)
+            src = dst
         return res
 
 
@@ -45,24 +124,152 @@ class Erosion(MorphologicalOperator):
     """
     The erosion operator.
     """
-    def __init__(self, structuralElement):
-        self.structuralElement = structuralElement
+    modes = ('grayscale', 'binary', 'rle')
+
+    def apply(self, image, res):
+        se = self.structuralElement
+        for engine in (binary, runs):
+            if engine.supports(image, res):
+                if self.border != kernel.CLIP:
+                    return _apply_as_grayscale(self, image, res)
+                return engine.erode(se, image, res)
+        if not lines.supports(image, res):
+            return super(Erosion, self).apply(image, res)
+        parts = se.decompose(self.exact)
+        if len(parts) > 1 or (self.border != kernel.CLIP and (
+                vectorized.supports(image, res) or se.is_rectangle)):
+            return _apply_padded([Erosion(p) for p in parts], 255,
+                                 self.border, self.border_value, image, res)
+        if vectorized.supports(image, res):
+            return vectorized.erode(se, image, res)
+        if se.is_rectangle:
+            return lines.erode(se, image, res)
+        return self._kernel(image).erode(image, res)
+
+    def halo(self):
+        return self.structuralElement.reach
+
+    def counters(self, image):
+        pixels = image.width * image.height
+        return {'pixels': pixels,
+                'lookups': pixels * len(self.structuralElement.ones_offsets)}
 
     def compute_pixel(self, px, original):
-        neighbourhood = self.structuralElement.get_neighbourhood(original, px)
-        return min(original[p][q] for p,q in neighbourhood)
+        return min(self._kernel(original).values(original, *px) or [255])
 
 
 class Dilation(MorphologicalOperator):
     """
     The dilation operator.
     """
-    def __init__(self, structuralElement):
-        self.structuralElement = structuralElement
+    modes = ('grayscale', 'binary', 'rle')
+
+    def apply(self, image, res):
+        se = self.structuralElement
+        for engine in (binary, runs):
+            if engine.supports(image, res):
+                if self.border != kernel.CLIP:
+                    return _apply_as_grayscale(self, image, res)
+                return engine.dilate(se, image, res)
+        if not lines.supports(image, res):
+            return super(Dilation, self).apply(image, res)
+        parts = se.decompose(self.exact)
+        if len(parts) > 1 or (self.border != kernel.CLIP and (
+                vectorized.supports(image, res) or se.is_rectangle)):
+            return _apply_padded([Dilation(p) for p in parts], 0,
+                                 self.border, self.border_value, image, res)
+        if vectorized.supports(image, res):
+            return vectorized.dilate(se, image, res)
+        if se.is_rectangle:
+            return lines.dilate(se, image, res)
+        return self._kernel(image).dilate(image, res)
+
+    def halo(self):
+        return self.structuralElement.reach
+
+    def counters(self, image):
+        pixels = image.width * image.height
+        return {'pixels': pixels,
+                'lookups': pixels * len(self.structuralElement.ones_offsets)}
 
     def compute_pixel(self, px, original):
-        neighbourhood = self.structuralElement.get_neighbourhood(original, px)
-        return max(original[p][q] for p,q in neighbourhood)
+        return max(self._kernel(original).values(original, *px) or [0])
+
+
+def _sum_halos(halos):
+    """
+    Return the halo of operators applied one after the other.
+    """
+    res = (0, 0, 0, 0)
+    for halo in halos:
+        if halo is None:
+            return None
+        res = tuple(a + b for a, b in zip(res, halo))
+    return res
+
+
+def _apply_as_grayscale(operator, image, res):
+    """
+    Apply `operator` to the `BinaryImage` or `RunLengthImage` `image`
+    through grayscale images of 0 and 255 pixels, saving the result in
+    `res`.
+    """
+    gray = image.to_grayscale()
+    return _set_pixels(
+        res, res.from_grayscale(operator.apply(gray, gray.copy())))
+
+
+def _set_pixels(res, image):
+    """
+    Copy the pixels of `image` into `res`, an image of the same type.
+    """
+    if binary.supports(res) or runs.supports(res):
+        res.rows = image.rows
+    else:
+        res.paste(image, (0, 0))
+    return res
+
+
+def _sum_counters(counters):
+    """
+    Return the counters of operators applied one after the other.
+    """
+    res = {}
+    for c in counters:
+        for name, value in c.items():
+            res[name] = res.get(name, 0) + value
+    return res
+
+
+def _check_border(border):
+    if border not in kernel.BORDER_MODES:
+        raise ValueError('Unknown border mode: %r' % (border,))
+    return border
+
+
+def _apply_padded(operators, identity, border, border_value, image, res):
+    """
+    Apply `operators` one after the other to `image` saving the result in
+    `res`.
+
+    The image is first padded by the reach of all the operators according to
+    `border` (with `identity`, which changes nothing, for `kernel.CLIP`), and
+    the operators then run on the padded image in `kernel.CLIP` mode. This
+    implements the border modes for the engines that only clip, and makes
+    chains of the parts of a decomposed structural element exact: the
+    intermediate results near the border are not truncated.
+    """
+    top, bottom, left, right = _sum_halos(op.halo() for op in operators)
+    current = image.pad(top, bottom, left, right,
+                        identity if border == kernel.CLIP else border_value,
+                        replicate=border == kernel.REPLICATE)
+    other = current.copy()
+    for op in operators:
+        op.apply(current, other)
+        current, other = other, current
+    res.paste(current.crop(
+        (left, top, left + image.width, top + image.height)), (0, 0))
+    return res
 
 
 class GeodesicDilation(Dilation):
@@ -71,11 +278,15 @@ class GeodesicDilation(Dilation):
     """
     def __init__(self, structuralElement, mask):
         super(GeodesicDilation, self).__init__(structuralElement)
-        if mask is not None and mask.mode != 'grayscale':
-            raise TypeError('%s only works with grayscale mask' % self.__class__)
+        if mask is not None and mask.mode not in self.modes:
+            raise TypeError('%s only works with %s mask' % (
+                self.__class__, ' and '.join(self.modes)))
         self.mask = mask
 
+    @instrument.traced
     def __call__(self, original):
+        if getattr(original, 'deferred', False):
+            return original.then(self)
         if self.mask is not None \
            and (original.width > self.mask.width \
                 or original.height > self.mask.height):
@@ -83,6 +294,41 @@ class GeodesicDilation(Dilation):
                 self.mask.size, original.size))
         return super(GeodesicDilation, self).__call__(original)
 
+    def halo(self):
+        # The mask would have to be cut along with the image.
+        return None
+
+    def apply(self, image, res):
+        if self.mask is None:
+            return super(GeodesicDilation, self).apply(image, res)
+        if binary.supports(image, res, self.mask):
+            if self.mask.size != res.size:
+                raise ValueError('Binary mask %r and image %r differ in size'
+                                 % (self.mask.size, res.size))
+            super(GeodesicDilation, self).apply(image, res)
+            res.rows = [row & limit for row, limit
+                        in zip(res.rows, self.mask.rows)]
+            return res
+        if runs.supports(image, res, self.mask):
+            if self.mask.size != res.size:
+                raise ValueError('Mask %r and image %r differ in size'
+                                 % (self.mask.size, res.size))
+            super(GeodesicDilation, self).apply(image, res)
+            res.rows = runs.intersect_rows(res.rows, self.mask.rows)
+            return res
+        if not lines.supports(image, res, self.mask):
+            # The per-pixel loop applies the mask in `compute_pixel`.
+            return MorphologicalOperator.apply(self, image, res)
+        super(GeodesicDilation, self).apply(image, res)
+        if vectorized.supports(res, self.mask):
+            return vectorized.clip(res, self.mask)
+        buf, mask = res.getbuffer(), self.mask.getbuffer()
+        for i in xrange(res.height):
+            o, mo = i * res.stride, i * self.mask.stride
+            buf[o:o + res.width] = bytearray(
+                map(min, buf[o:o + res.width], mask[mo:mo + res.width]))
+        return res
+
     def compute_pixel(self, px, original):
         i, j = px
         gd = super(GeodesicDilation, self).compute_pixel(px, original)
@@ -92,116 +338,477 @@ class GeodesicDilation(Dilation):
 
 
 class ReconstructionByDilation(GeodesicDilation):
-    # Mainly for debugging.
-    ITERATIONS_LIMIT = 100
+    """
+    Reconstruction by dilation of a marker image under the mask.
 
-    def __call__(self, original):
-        it = 0
-        result = original.copy()
+    Uses the hybrid algorithm of L. Vincent (Morphological grayscale
+    reconstruction in image analysis, IEEE TIP 2(2), 1993): a raster and an
+    anti-raster scan, the latter seeding a FIFO queue with the pixels that can
+    still propagate their value, then a breadth-first propagation that only
+    touches pixels which can still change. The result is exact, with no cap
+    on the number of iterations.
+    """
 
-        changed = True
-        while changed:
-            if it == self.ITERATIONS_LIMIT:
-                print '%s: hit iteration limit (%d)' % (self.__class__, it)
-                break
-            it += 1
-            changed = False
-
-            for order_name, order in (('raster', lambda x: x),
-                                      ('antiraster', reversed)):
-                for i in order(xrange(result.height)):
-                    for j in order(xrange(result.width)):
-                        old = result[i][j]
-                        result[i][j] = self.compute_pixel(
-                            (i,j), result, order_name)
-                        if old != result[i][j]:
-                            changed = True
-
-        if not changed:
-            print '%s: Stability reached.' % self.__class__
-        print '%s: took %s iterations.' % (self.__class__, it)
+    @instrument.traced
+    def __call__(self, original):
+        if getattr(original, 'deferred', False):
+            return original.then(self)
+        result, self.stats = self.reconstruct(original)
         return result
 
-    def compute_pixel(self, px, image, order_name):
-        offsets = self.structuralElement.offsets[order_name]
-        pi, pj = px
-        region = ((pi+i, pj+j) for i,j in offsets \
-                  if pi+i<image.height and pj+j<image.width)
-        if not region:
-            return 0
-        return min(max(image[i][j] for i,j in region), self.mask[pi][pj])
+    def apply(self, image, res):
+        # Pipelines and composed operators run their stages through `apply`.
+        result, self.stats = self.reconstruct(image)
+        return _set_pixels(res, result)
+
+    def counters(self, image):
+        res = {'pixels': image.width * image.height}
+        if getattr(self, 'stats', None):
+            res['iterations'] = self.stats['scans']
+            res['queue_pushes'] = self.stats['queue_pushes']
+        return res
+
+    def reconstruct(self, marker):
+        """
+        Return the reconstruction of `marker` under the mask, and a dict of
+        statistics: the number of full image scans (`scans`), of pixels put
+        in the queue (`queue_pushes`) and the largest queue size
+        (`queue_max`). For `BinaryImage`s the queue holds rows instead of
+        pixels, and for `RunLengthImage`s runs.
+        """
+        se = self.structuralElement
+        if binary.supports(marker) and (
+                self.mask is None or binary.supports(self.mask)):
+            return binary.reconstruct(se, marker, self.mask)
+        if runs.supports(marker) and (
+                self.mask is None or runs.supports(self.mask)):
+            return runs.reconstruct(se, marker, self.mask)
+        width, height = marker.width, marker.height
+        # Work on flat buffers framed by zeros in both marker and mask: a
+        # zero mask pixel can never change, so no bounds checks are needed.
+        pr, pc = _frame_size(se)
+        J = _framed(marker, width, height, pr, pc)
+        if self.mask is None:
+            I = bytearray(len(J))
+            stride = width + 2 * pc
+            for i in xrange(height):
+                o = (i + pr) * stride + pc
+                I[o:o + width] = '\xff' * width
+        else:
+            I = _framed(self.mask, width, height, pr, pc)
+        stats = _reconstruct_framed(se, J, I, width, height)
+        result = marker.copy()
+        _unframe(J, width, height, pr, pc, result)
+        return result, stats
+
+
+def _frame_size(structuralElement):
+    """
+    Return the rows and columns of zeros framing the buffers of
+    `_reconstruct_framed`.
+    """
+    offsets = structuralElement.ones_offsets
+    return (max([0] + [abs(i) for i, j in offsets]),
+            max([0] + [abs(j) for i, j in offsets]))
+
+
+def _framed(image, width, height, pr, pc):
+    """
+    Return the top left `width` x `height` pixels of `image` in a flat
+    buffer framed by `pr` rows and `pc` columns of zeros.
+    """
+    if hasattr(image, 'pad') and image.size == (width, height):
+        return image.pad(pr, pr, pc, pc).getbuffer()
+    stride = width + 2 * pc
+    res = bytearray(stride * (height + 2 * pr))
+    for i in xrange(height):
+        o = (i + pr) * stride + pc
+        res[o:o + width] = bytearray(image[i][:width])
+    return res
+
+
+def _unframe(J, width, height, pr, pc, res, table=None):
+    """
+    Copy the image in the framed buffer `J` into `res`, translated by
+    `table` if given.
+    """
+    stride = width + 2 * pc
+    for i in xrange(height):
+        o = (i + pr) * stride + pc
+        if hasattr(res, 'getbuffer'):
+            res[i] = J[o:o + width].translate(table) if table \
+                    else J[o:o + width]
+        else:
+            for j in xrange(width):
+                res[i][j] = J[o + j]
+    return res
+
+
+def _clear_frame(J, width, height, pr, pc):
+    """
+    Zero the frame of the framed buffer `J`.
+    """
+    stride = width + 2 * pc
+    J[:pr * stride] = bytearray(pr * stride)
+    J[(pr + height) * stride:] = bytearray(pr * stride)
+    for i in xrange(pr, pr + height):
+        J[i * stride:i * stride + pc] = bytearray(pc)
+        J[i * stride + pc + width:(i + 1) * stride] = bytearray(pc)
+
+
+def _reconstruct_framed(structuralElement, J, I, width, height):
+    """
+    Reconstruct by dilation, in place, the marker `J` under the mask `I`,
+    both `width` x `height` images in flat buffers framed by zeros (see
+    `_frame_size`). Returns the statistics of
+    `ReconstructionByDilation.reconstruct`.
+
+    Uses the hybrid algorithm of L. Vincent: a raster and an anti-raster
+    scan, the latter seeding a FIFO queue, then a breadth-first propagation.
+    """
+    se = structuralElement
+    pr, pc = _frame_size(se)
+    stride = width + 2 * pc
+
+    # The value of `p` is computed from `p + o`, so it spreads to the
+    # dependents `p - o`.
+    raster = [i * stride + j for i, j in se.offsets['raster']]
+    antiraster = [i * stride + j for i, j in se.offsets['antiraster']]
+    dependents = [-(i * stride + j) for i, j in se.ones_offsets
+                  if (i, j) != (0, 0)]
+
+    for i in xrange(pr, pr + height):
+        for p in xrange(i * stride + pc, i * stride + pc + width):
+            v = 0
+            for o in raster:
+                if J[p + o] > v:
+                    v = J[p + o]
+            m = I[p]
+            J[p] = v if v < m else m
+
+    queue = deque()
+    for i in xrange(pr + height - 1, pr - 1, -1):
+        for p in xrange(i * stride + pc + width - 1, i * stride + pc - 1, -1):
+            v = 0
+            for o in antiraster:
+                if J[p + o] > v:
+                    v = J[p + o]
+            m = I[p]
+            v = J[p] = v if v < m else m
+            for o in dependents:
+                q = p + o
+                if J[q] < v and J[q] < I[q]:
+                    queue.append(p)
+                    break
+
+    pushes = queue_max = len(queue)
+    while queue:
+        p = queue.popleft()
+        v = J[p]
+        for o in dependents:
+            q = p + o
+            jq = J[q]
+            if jq < v:
+                m = I[q]
+                if jq != m:
+                    J[q] = v if v < m else m
+                    queue.append(q)
+                    pushes += 1
+        if len(queue) > queue_max:
+            queue_max = len(queue)
+
+    return {
+        'scans': 2,
+        'queue_pushes': pushes,
+        'queue_max': queue_max,
+    }
+
+
+# The structural elements giving the 4- and 8-connectivity.
+CONNECTIVITY_ELEMENTS = {4: 'rhombus', 8: 'octagon'}
+# The connectivity of the operators taking one (reconstructions, hole
+# filling, watershed) when none is given.
+DEFAULT_CONNECTIVITY = 4
+
+
+def _connectivity_element(connectivity):
+    if connectivity not in CONNECTIVITY_ELEMENTS:
+        raise ValueError('Connectivity must be 4 or 8, got %r'
+                         % (connectivity,))
+    return StructuralElement.predefined(CONNECTIVITY_ELEMENTS[connectivity])
 
 
 class OpeningByReconstruction(MorphologicalOperator):
     """
-    TBD
+    Opening by reconstruction operator.
+    The image is eroded by the structural element, then reconstructed by
+    dilation under the original image: the bright objects the element does
+    not fit in are removed, and those it fits in keep their exact shape,
+    unlike with the plain opening. `connectivity` (4, the default, or 8) is
+    the one of the reconstruction, which runs until it converges.
+
+    The erosion is written straight into the framed buffer that the
+    reconstruction then updates in place. `from_marker` starts from an
+    erosion computed before, so that `sweep` erodes the marker for each
+    element size from the one before.
     """
-    pass
+    modes = ('grayscale', 'binary', 'rle')
+    # Closing by reconstruction is the opening of the inverted image.
+    inverted = False
+
+    def __init__(self, structuralElement, connectivity=DEFAULT_CONNECTIVITY,
+                 exact=True):
+        self.structuralElement = structuralElement
+        self.connectivity = connectivity
+        self.reconstructionElement = _connectivity_element(connectivity)
+        self.exact = exact
+        self.stats = None
+
+    def marker(self, image):
+        """
+        Return the erosion (dilation for the closing) of `image` by the
+        structural element, which the reconstruction starts from.
+        """
+        cls = Dilation if self.inverted else Erosion
+        return cls(self.structuralElement, self.exact)(image)
+
+    def from_marker(self, image, marker):
+        """
+        Return the reconstruction of `marker`, an erosion (dilation for the
+        closing) of `image` by any element, under `image`. `marker` is left
+        untouched.
+        """
+        self._check_image(image)
+        res = image.copy()
+        if not lines.supports(image, marker, res):
+            return self._reconstruct_generic(image, marker, res)
+        pr, pc = _frame_size(self.reconstructionElement)
+        I = self._framed_mask(image)
+        if self.inverted:
+            J = marker.pad(pr, pr, pc, pc, 255).getbuffer().translate(
+                INVERT_TABLE)
+        else:
+            J = marker.pad(pr, pr, pc, pc).getbuffer()
+        return self._reconstruct(J, I, res)
+
+    def sweep(self, image, steps):
+        """
+        Yield the results for the structural element and its dilations by
+        itself, `steps` of growing size, each marker being eroded from the
+        one before.
+        """
+        marker = image
+        for _ in xrange(steps):
+            marker = self.marker(marker)
+            yield self.from_marker(image, marker)
+
+    def apply(self, image, res):
+        if not lines.supports(image, res):
+            return self._reconstruct_generic(image, self.marker(image), res)
+        pr, pc = _frame_size(self.reconstructionElement)
+        # The framed mask, framed by 255 for now so that the erosion ignores
+        # the frame.
+        framed = image.pad(pr, pr, pc, pc, 0 if self.inverted else 255)
+        I = framed.getbuffer()
+        if self.inverted:
+            I[:] = I.translate(INVERT_TABLE)
+        marker = GrayscaleImage(width=framed.width, height=framed.height,
+                                data=bytearray(len(I)))
+        Erosion(self.structuralElement, self.exact).apply(framed, marker)
+        J = marker.getbuffer()
+        _clear_frame(I, image.width, image.height, pr, pc)
+        _clear_frame(J, image.width, image.height, pr, pc)
+        return self._reconstruct(J, I, res)
+
+    def halo(self):
+        return None
+
+    def counters(self, image):
+        res = {'pixels': image.width * image.height}
+        if self.stats:
+            res['iterations'] = self.stats['scans']
+            res['queue_pushes'] = self.stats['queue_pushes']
+        return res
+
+    def _framed_mask(self, image):
+        pr, pc = _frame_size(self.reconstructionElement)
+        if self.inverted:
+            return image.pad(pr, pr, pc, pc, 255).getbuffer().translate(
+                INVERT_TABLE)
+        return image.pad(pr, pr, pc, pc).getbuffer()
+
+    def _reconstruct(self, J, I, res):
+        pr, pc = _frame_size(self.reconstructionElement)
+        self.stats = _reconstruct_framed(
+            self.reconstructionElement, J, I, res.width, res.height)
+        return _unframe(J, res.width, res.height, pr, pc, res,
+                        INVERT_TABLE if self.inverted else None)
+
+    def _reconstruct_generic(self, image, marker, res):
+        # Binary and run-length images.
+        if self.inverted:
+            image, marker = image.invert(), marker.invert()
+        result, self.stats = ReconstructionByDilation(
+            self.reconstructionElement, image).reconstruct(marker)
+        return _set_pixels(res, result.invert() if self.inverted else result)
+
+
+class ClosingByReconstruction(OpeningByReconstruction):
+    """
+    Closing by reconstruction operator.
+    The dual of the opening by reconstruction: the image is dilated, then
+    reconstructed by erosion over the original, filling the dark details
+    the element does not fit in while keeping the shape of the others.
+    """
+    inverted = True
 
 
 class AreaOpening(MorphologicalOperator):
     """
     Area opening operator.
-    The same as standard morphological opening, but the connected components must have
-    area that is smaller than some initially defined value.
+    The same as standard morphological opening, but instead of a shape the
+    bright connected components must have an area (number of pixels) of at
+    least `area` to survive; smaller ones are flattened to the level of
+    their surroundings. Connectivity is given by the structural element,
+    e.g. 'rhombus' for 4-connectivity and 'octagon' for 8-connectivity.
+
+    Runs the union-find algorithm of `morphlib.components`, in nearly linear
+    time whatever `area` is.
     """
 
-    def __init__(self, structuralElement, area, diffThreshold):
+    def __init__(self, structuralElement, area):
         self.structuralElement = structuralElement
         self.area = area
-        self.diffThreshold = diffThreshold
-        
-    def __call__(self, original):
-        self._check_image(original)
-        image = original.copy()
-
-        opening = Opening(self.structuralElement)
-        opening.apply(original, image)
-        self.__get_difference(original, image)
-        return image
-
-    def __get_difference(self, original, new):
-        """
-        Compute the difference in-place into `new`
-        """
-        assert original.height == new.height, \
-                'The height of the original image does not correspong' + \
-                ' to the height of the new image'
-        assert original.width == new.width, \
-                'The width of the original image does not correspong' + \
-                ' to the width of the new image'
-
-        for i in xrange(original.height):
-            for j in xrange(original.width):
-                diff = abs(original[i][j] - new[i][j])
-                
-                if diff > self.diffThreshold:
-                    new[i][j] = 255
-                else:
-                    new[i][j] = 0
-        return new
-
-    def __computeThreshold(self, value):
-        if value > self.diffThreshold:
-            return value
-        else:
-            return 0
+
+    def apply(self, image, res):
+        return components.area_opening(
+            image, res, self.structuralElement, self.area)
+
+
+class AreaClosing(AreaOpening):
+    """
+    Area closing operator.
+    The dual of the area opening: dark connected components with fewer than
+    `area` pixels are filled.
+    """
+
+    def apply(self, image, res):
+        return components.area_closing(
+            image, res, self.structuralElement, self.area)
+
+
+class RankFilter(MorphologicalOperator):
+    """
+    Rank filter operator.
+    The value of a pixel becomes the `percentile` percentile (from 0 to 100)
+    of its neighbourhood: 0 gives the erosion, 100 the dilation and 50 the
+    median filter, which removes small specks of noise of either polarity
+    without moving the edges much.
+
+    Runs the sliding histogram of `morphlib.rank`, whose cost per pixel grows
+    with the height of the structural element rather than its area.
+    """
+
+    def __init__(self, structuralElement, percentile, border=kernel.CLIP,
+                 border_value=0):
+        if not 0 <= percentile <= 100:
+            raise ValueError('Percentile out of range: %r' % (percentile,))
+        super(RankFilter, self).__init__(structuralElement, border=border,
+                                         border_value=border_value)
+        self.percentile = percentile
+
+    def apply(self, image, res):
+        if self.border != kernel.CLIP:
+            return _apply_padded(
+                [RankFilter(self.structuralElement, self.percentile)], 0,
+                self.border, self.border_value, image, res)
+        return rank.rank_filter(self.structuralElement, self.percentile,
+                                image, res)
+
+    def halo(self):
+        return self.structuralElement.reach
+
+    def counters(self, image):
+        pixels = image.width * image.height
+        return {'pixels': pixels,
+                'lookups': pixels * rank.updates(self.structuralElement)}
 
 
 class CloseHoles(MorphologicalOperator):
     """
     Closes-holes operator.
     As defined in M.A. Luengo-Oroz et al. / Image and Vision Computing 28 (2009) 278-284.
+    The dark regions which cannot be reached from the image border without
+    climbing are raised to the level of their surroundings. Paths to the
+    border follow the 4- (the default) or 8-connectivity given by
+    `connectivity`.
+
+    Runs the border-seeded flood of `morphlib.holes`, visiting every pixel
+    once.
     """
-    def __call__(self, original):
-        # Used as a marker
-        inv = original.invert()
-        border = original.border()
-        reconstruct = ReconstructionByDilation(
-            StructuralElement.predefined('circle'),
-            inv
-        )
-        return reconstruct(border).invert()
+    modes = ('grayscale', 'binary', 'rle')
+
+    def __init__(self, connectivity=DEFAULT_CONNECTIVITY):
+        self.connectivity = connectivity
+        self.structuralElement = _connectivity_element(connectivity)
+
+    def apply(self, image, res):
+        se = self.structuralElement
+        if binary.supports(image, res):
+            return holes.fill_binary(image, res, se)
+        if runs.supports(image, res):
+            return holes.fill_runs(image, res, se)
+        return holes.fill(image, res, se)
+
+
+class Watershed(MorphologicalOperator):
+    """
+    Marker-controlled watershed operator.
+    Floods the relief it is applied to (usually a `Gradient`) from
+    `markers`: a `LabelImage`, whose labels are kept, or an image whose
+    connected regions of non-zero pixels are numbered from 1. Returns a
+    `LabelImage` giving every pixel the label of the basin it falls in.
+    `connectivity` (4, the default, or 8) is the one of the flooding and of
+    the marker regions.
+
+    Runs the hierarchical queue of `morphlib.watershed`, in linear time.
+    """
+
+    def __init__(self, markers, connectivity=DEFAULT_CONNECTIVITY):
+        self.markers = markers
+        self.connectivity = connectivity
+        self.structuralElement = _connectivity_element(connectivity)
+        self.stats = None
+
+    @instrument.traced
+    def __call__(self, relief):
+        if getattr(relief, 'deferred', False):
+            return relief.then(self)
+        self._check_image(relief)
+        if relief.size != self.markers.size:
+            raise ValueError('Markers %r and relief %r differ in size' % (
+                self.markers.size, relief.size))
+        return self.apply(relief, LabelImage(relief.width, relief.height))
+
+    def apply(self, image, res):
+        se = self.structuralElement
+        markers = self.markers
+        if isinstance(markers, LabelImage):
+            labels = watershed.read_labels(markers, se)
+        else:
+            if markers.mode != 'grayscale':
+                markers = markers.to_grayscale()
+            labels, _ = watershed.label_markers(markers, se)
+        self.stats = {'queue_pushes': watershed.flood(image, labels, se)}
+        res.labels = LabelImage.compact(
+            watershed.unframe(labels, image.width, image.height, se))
+        return res
+
+    def counters(self, image):
+        res = {'pixels': image.width * image.height}
+        if self.stats:
+            res['queue_pushes'] = self.stats['queue_pushes']
+        return res
 
 
 class Opening(ComposedMorphologicalOperator):
@@ -213,9 +820,6 @@ class Opening(ComposedMorphologicalOperator):
     #but [Dilation, Erosion] would give morphological closing
     operationsList = [Erosion, Dilation]
 
-    def __init__(self, structuralElement):
-        self.structuralElement = structuralElement 
-
 
 class Closing(ComposedMorphologicalOperator):
     """
@@ -226,8 +830,102 @@ class Closing(ComposedMorphologicalOperator):
     #but [Dilation, Erosion] would give morphological closing
     operationsList = [Dilation, Erosion]
 
-    def __init__(self, structuralElement):
-        self.structuralElement = structuralElement
+
+class Gradient(MorphologicalOperator):
+    """
+    Morphological gradient operator: the dilation minus the erosion, high
+    along the edges of the objects.
+
+    The maximum and the minimum of every neighbourhood are found in the same
+    walk. Rectangles and decomposable elements are cheaper as a separate
+    dilation and erosion, whose difference is taken in place.
+    """
+
+    def apply(self, image, res):
+        se = self.structuralElement
+        if not lines.supports(image, res):
+            return super(Gradient, self).apply(image, res)
+        if self.border != kernel.CLIP:
+            return _apply_padded([Gradient(se, self.exact)], 0, self.border,
+                                 self.border_value, image, res)
+        if se.is_rectangle or len(se.decompose(self.exact)) > 1:
+            spare = image.copy()
+            Dilation(se, self.exact).apply(image, res)
+            Erosion(se, self.exact).apply(image, spare)
+            return _subtract(res, spare, res)
+        if vectorized.supports(image, res):
+            return vectorized.gradient(se, image, res)
+        return self._kernel(image).gradient(image, res)
+
+    def halo(self):
+        return self.structuralElement.reach
+
+    def counters(self, image):
+        pixels = image.width * image.height
+        return {'pixels': pixels,
+                'lookups': pixels * len(self.structuralElement.ones_offsets)}
+
+    def compute_pixel(self, px, original):
+        values = self._kernel(original).values(original, *px)
+        return max(values) - min(values) if values else 0
+
+
+class WhiteTopHat(MorphologicalOperator):
+    """
+    White top-hat operator: the image minus its opening, which keeps the
+    bright details smaller than the structural element on a flat background.
+    """
+    # The operator the image is compared to, and whether it comes first in
+    # the difference.
+    baseOperator = Opening
+    subtractFromImage = True
+
+    def base(self):
+        """
+        Return the opening (or closing) the image is compared to.
+        """
+        return self.baseOperator(self.structuralElement, self.exact,
+                                 self.border, self.border_value)
+
+    def apply(self, image, res):
+        # The opening goes straight into `res`, then the difference is taken
+        # in place.
+        self.base().apply(image, res)
+        if self.subtractFromImage:
+            return _subtract(image, res, res)
+        return _subtract(res, image, res)
+
+    def halo(self):
+        return self.base().halo()
+
+    def counters(self, image):
+        return self.base().counters(image)
+
+
+class BlackTopHat(WhiteTopHat):
+    """
+    Black top-hat operator: the closing of the image minus the image, which
+    keeps the dark details smaller than the structural element.
+    """
+    baseOperator = Closing
+    subtractFromImage = False
+
+
+def _subtract(a, b, res):
+    """
+    Save `a - b` into `res`, negative differences (only found next to empty
+    neighbourhoods) giving 0.
+    """
+    if vectorized.supports(a, b, res):
+        return vectorized.subtract(a, b, res)
+    width = res.width
+    bufa, bufb, out = a.getbuffer(), b.getbuffer(), res.getbuffer()
+    for i in xrange(res.height):
+        ra = bufa[i * a.stride:i * a.stride + width]
+        rb = bufb[i * b.stride:i * b.stride + width]
+        out[i * res.stride:i * res.stride + width] = bytearray(
+            map(int.__sub__, ra, map(min, ra, rb)))
+    return res
 
 
 class StructuralElement(object):
@@ -278,6 +976,17 @@ class StructuralElement(object):
                        [0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0],],
     }
 
+    # Small elements, as offsets, tried as Minkowski factors by `decompose`:
+    # two-point segments (which chain into lines) and the rhombus, which does
+    # not split any further.
+    DECOMPOSITION_FACTORS = [
+        frozenset([(0, 0), v]) for v in
+        [(0, 1), (1, 0), (1, 1), (1, -1), (1, 2), (2, 1), (1, -2), (2, -1)]
+    ] + [frozenset([(0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)])]
+
+    # Largest share of the ones an inexact decomposition is allowed to drop.
+    DECOMPOSITION_TOLERANCE = 0.05
+
     def __init__(self, matrix_list, center=None):
         if not all(x in [0, 1] for row in matrix_list for x in row):
             raise TypeError("Structured element should be initialized with a matrix "
@@ -294,12 +1003,25 @@ class StructuralElement(object):
         self.ones_offsets = set((i - ci, j - cj) for i in xrange(self.height) \
                                 for j in xrange(self.width) \
                                 if self.get(i, j))
+        if self.ones_offsets:
+            rows = [i for i, j in self.ones_offsets]
+            cols = [j for i, j in self.ones_offsets]
+            # Bounding box of the ones as (top, bottom, left, right) offsets.
+            self.extent = (min(rows), max(rows), min(cols), max(cols))
+            top, bottom, left, right = self.extent
+            self.is_rectangle = len(self.ones_offsets) == \
+                    (bottom - top + 1) * (right - left + 1)
+        else:
+            self.extent = None
+            self.is_rectangle = False
         self.offsets = {
             'raster':     frozenset(
                 (i,j) for i,j in self.ones_offsets if i<0 or (i==0 and j<=0)),
             'antiraster': frozenset(
                 (i,j) for i,j in self.ones_offsets if i>0 or (i==0 and j>=0)),
         }
+        self._decompositions = {}
+        self._kernels = {}
 
     @classmethod
     def predefined(cls, key):
@@ -308,6 +1030,116 @@ class StructuralElement(object):
         """
         return cls(cls.PREDEFINED[key])
 
+    @classmethod
+    def from_offsets(cls, offsets):
+        """
+        A factory for structural elements given the offsets of their ones
+        relative to the center.
+        """
+        rows = [i for i, j in offsets] + [0]
+        cols = [j for i, j in offsets] + [0]
+        top, left = min(rows), min(cols)
+        matrix = [[0] * (max(cols) - left + 1)
+                  for _ in xrange(max(rows) - top + 1)]
+        for i, j in offsets:
+            matrix[i - top][j - left] = 1
+        return cls(matrix, center=(-top, -left))
+
+    @property
+    def reach(self):
+        """
+        How far (top, bottom, left, right) the neighbourhoods of the element
+        extend from their pixel.
+        """
+        if self.extent is None:
+            return (0, 0, 0, 0)
+        top, bottom, left, right = self.extent
+        # The neighbours of `p` are `p - o`.
+        return (max(0, bottom), max(0, -top), max(0, right), max(0, -left))
+
+    @property
+    def cost(self):
+        """
+        Rough number of operations per pixel needed to erode or dilate by the
+        element.
+        """
+        if self.is_rectangle:
+            top, bottom, left, right = self.extent
+            return 3 * ((bottom > top) + (right > left)) or 1
+        return len(self.ones_offsets)
+
+    def decompose(self, exact=True):
+        """
+        Return a list of structural elements whose Minkowski sum is this
+        element.
+
+        Eroding (dilating) by the sum is the same as eroding (dilating) by the
+        parts one after the other, which is much cheaper for big elements:
+        the 15x15 `big_circle` splits into 4 rhombi, two knight-move segments
+        and a 3x5 rectangle. With `exact` False the sum may miss up to
+        `DECOMPOSITION_TOLERANCE` of the ones, which lets round elements
+        that have no exact decomposition be approximated.
+
+        Returns `[self]` when no cheaper chain is found. The result is cached.
+        """
+        exact = bool(exact)
+        if exact not in self._decompositions:
+            parts = self._find_decomposition(exact)
+            if sum(p.cost + 1 for p in parts) >= self.cost + 1:
+                parts = [self]
+            self._decompositions[exact] = parts
+        return self._decompositions[exact]
+
+    def _find_decomposition(self, exact):
+        """
+        Greedily peel off the factor leaving the smallest rest, then merge
+        the collected factors into lines and rectangles.
+        """
+        remaining = frozenset(self.ones_offsets)
+        tolerance = 0 if exact else \
+                int(self.DECOMPOSITION_TOLERANCE * len(remaining))
+        factors = []
+        while len(remaining) > 1:
+            best = None
+            for factor in self.DECOMPOSITION_FACTORS:
+                rest = _minkowski_difference(remaining, factor)
+                if not rest:
+                    continue
+                lost = len(remaining) - len(_minkowski_sum(rest, factor))
+                if best is None or (lost, len(rest)) < best[0]:
+                    best = ((lost, len(rest)), factor, rest)
+            if best is None or best[0][0] > tolerance:
+                break
+            tolerance -= best[0][0]
+            factors.append(best[1])
+            remaining = best[2]
+
+        # Segments along the same direction chain into a line, and a
+        # horizontal and a vertical line into a rectangle.
+        segments = {}
+        parts = []
+        for factor in factors:
+            if len(factor) == 2:
+                v, = factor - set([(0, 0)])
+                segments[v] = segments.get(v, 0) + 1
+            else:
+                parts.append(factor)
+        for v, n in sorted(segments.items()):
+            parts.append(frozenset((k * v[0], k * v[1]) for k in xrange(n + 1)))
+        horizontal = frozenset((0, k) for k in xrange(segments.get((0, 1), 0) + 1))
+        vertical = frozenset((k, 0) for k in xrange(segments.get((1, 0), 0) + 1))
+        if len(horizontal) > 1 and len(vertical) > 1:
+            parts.remove(horizontal)
+            parts.remove(vertical)
+            parts.append(_minkowski_sum(horizontal, vertical))
+        # Whatever is left over is either a single translation, folded into
+        # one of the parts, or a part of its own.
+        if len(remaining) == 1 and parts:
+            parts[-1] = _minkowski_sum(parts[-1], remaining)
+        else:
+            parts.append(remaining)
+        return [self.from_offsets(part) for part in parts]
+
     def get(self, i, j):
         return self.matrix[i][j]
 
@@ -316,16 +1148,18 @@ class StructuralElement(object):
         Return the neighbourhood of pixels for a pixel in an image defined by
         the structural element
         """
-        res = []
-        pi, pj = pixel
-        for i, row in enumerate(self.matrix):
-            for j, value in enumerate(row):
-                ci, cj = self.center
-                ni, nj = pi + (ci - i), pj + (cj - j)
-                if value and ni < image.height and nj < image.width:
-                    # In bounds and covered by structural element.
-                    res.append((ni, nj))
-        return res
+        return self.compile(image.width, image.height).neighbourhood(*pixel)
+
+    def compile(self, width, height, stride=None, border=kernel.CLIP, value=0):
+        """
+        Return the element compiled into a `morphlib.kernel.Kernel` for images
+        of the given shape. Kernels are cached.
+        """
+        key = (width, height, stride, border, value)
+        if key not in self._kernels:
+            self._kernels[key] = kernel.Kernel(
+                self, width, height, stride, border, value)
+        return self._kernels[key]
 
     @property
     def height(self):
@@ -336,6 +1170,21 @@ class StructuralElement(object):
         return len(self.matrix[0])
 
 
+def _minkowski_sum(a, b):
+    return frozenset((i + k, j + l) for i, j in a for k, l in b)
+
+
+def _minkowski_difference(a, b):
+    """
+    Return the offsets `o` such that `o + b` lies inside `a`.
+    """
+    res = None
+    for k, l in b:
+        shifted = frozenset((i - k, j - l) for i, j in a)
+        res = shifted if res is None else res & shifted
+    return res
+
+
 class SquaredStructuralElementBuilder(object):
     """
     Used to build squared structural elements of specific size
@@ -353,3 +1202,18 @@ class SquaredStructuralElementBuilder(object):
             structElem.append(row)
 
         return StructuralElement(structElem)
+
+
+class LineStructuralElementBuilder(object):
+    """
+    Used to build horizontal or vertical line structural elements of
+    specific length
+    """
+    def __init__(self, length, vertical=False):
+        self.length = length
+        self.vertical = vertical
+
+    def get_struct_elem(self):
+        if self.vertical:
+            return StructuralElement([[1]] * self.length)
+        return StructuralElement([[1] * self.length])
@@ -0,0 +1,84 @@
+"""
+Tiled parallel execution of morphological operators.
+
+The image is cut into tiles, each one cropped together with a halo of the
+surrounding pixels as wide as the context the operator needs (see
+`MorphologicalOperator.halo`). The tiles are processed in a pool of worker
+processes and their inner parts pasted back, which gives exactly the result
+of running the operator on the whole image.
+"""
+import multiprocessing
+from itertools import imap
+
+from morphlib.operator import MorphologicalOperator
+
+
+class TiledOperator(MorphologicalOperator):
+    """
+    Runs `operator` tile by tile across `workers` processes (one per CPU by
+    default). Tiles are `tile_size` pixels square.
+
+    Works for operators with a bounded context, such as `Erosion`,
+    `Dilation`, `Opening` and `Closing`.
+    """
+
+    def __init__(self, operator, workers=None, tile_size=512):
+        if operator.halo() is None:
+            raise ValueError(
+                '%s cannot be run in tiles' % operator.__class__.__name__)
+        if tile_size < 1:
+            raise ValueError('Invalid tile size: %r' % tile_size)
+        self.operator = operator
+        self.workers = workers or multiprocessing.cpu_count()
+        self.tile_size = tile_size
+
+    def halo(self):
+        return self.operator.halo()
+
+    def apply(self, image, res):
+        if not hasattr(image, 'getbuffer'):
+            return self.operator.apply(image, res)
+        jobs = [(self.operator, image.crop(outer), outer, inner)
+                for outer, inner in self.tiles(image)]
+        if self.workers == 1 or len(jobs) == 1:
+            for box, tile in imap(_run_tile, jobs):
+                res.paste(tile, box)
+            return res
+        pool = multiprocessing.Pool(min(self.workers, len(jobs)))
+        try:
+            for box, tile in pool.imap_unordered(_run_tile, jobs):
+                res.paste(tile, box)
+        finally:
+            pool.terminate()
+            pool.join()
+        return res
+
+    def tiles(self, image):
+        """
+        Yield a (outer, inner) pair per tile of `image`: `outer` is the
+        (left, upper, right, lower) box of the tile with its halo, clipped to
+        the image, and `inner` the box of the tile itself.
+        """
+        top, bottom, left, right = self.halo()
+        size = self.tile_size
+        for y in xrange(0, image.height, size):
+            for x in xrange(0, image.width, size):
+                inner = (x, y, min(x + size, image.width),
+                         min(y + size, image.height))
+                outer = (max(0, x - left), max(0, y - top),
+                         min(inner[2] + right, image.width),
+                         min(inner[3] + bottom, image.height))
+                yield outer, inner
+
+
+def _run_tile(job):
+    """
+    Apply the operator to one tile. Returns the upper left corner of the
+    tile in the image and the inner part of the result.
+    """
+    operator, tile, outer, inner = job
+    res = tile.copy()
+    operator.apply(tile, res)
+    left, upper, right, lower = inner
+    return (left, upper), res.crop((left - outer[0], upper - outer[1],
+                                    right - outer[0], lower - outer[1]))
@@ -0,0 +1,138 @@
+"""
+Execution of chains of operators.
+
+A `Pipeline` applies a list of operators one after the other. Composed
+operators (`Opening`, `Closing`, nested pipelines) are flattened into their
+stages first. Stages run either
+
+- one after the other on whole images, alternating between the result image
+  and a single spare buffer, or
+- fused (`fuse=True`): all stages are erosions or dilations run row by row
+  (see `morphlib.streaming`), each output row of a stage going straight to
+  the next one, so that intermediate images are never stored whole. This
+  uses much less memory but the pure Python row loops are slower than the
+  whole image engines.
+
+After each run `stats` holds whether the stages were fused (`fused`), the
+bytes of the buffers between stages, the spare image or the rows held by
+the fused stages (`buffer_bytes`), and the (name, seconds) spent in each
+stage (`stages`). The temporaries of the engines running the stages are not
+counted: the peak memory of a whole run is measured by
+`benchmarks/benchmark.py`, which runs each case in a fresh process.
+"""
+import time
+
+from morphlib import instrument, streaming
+from morphlib.operator import ComposedMorphologicalOperator, \
+        MorphologicalOperator, _sum_counters, _sum_halos
+
+
+class Pipeline(MorphologicalOperator):
+    """
+    Applies `operators` one after the other.
+    """
+
+    def __init__(self, operators, fuse=False):
+        self.operators = list(operators)
+        self.fuse = fuse
+        self.stats = None
+
+    @instrument.traced
+    def __call__(self, original):
+        if getattr(original, 'deferred', False):
+            return original.then(self)
+        self._check_image(original)
+        res = original.copy()
+        self.apply(original, res)
+        return res
+
+    def operations(self):
+        """
+        Return the stages of the pipeline, composed operators flattened.
+        """
+        res = []
+        for op in self.operators:
+            if isinstance(op, (ComposedMorphologicalOperator, Pipeline)):
+                res.extend(op.operations())
+            else:
+                res.append(op)
+        return res
+
+    def halo(self):
+        return _sum_halos(op.halo() for op in self.operations())
+
+    def counters(self, image):
+        return _sum_counters(op.counters(image) for op in self.operations())
+
+    def apply(self, image, res):
+        ops = self.operations()
+        if self.fuse and hasattr(image, 'getbuffer') \
+                and hasattr(res, 'getbuffer'):
+            try:
+                stages = [streaming.stages(op, image.width) for op in ops]
+            except ValueError:
+                pass
+            else:
+                return self._apply_fused(ops, stages, image, res)
+        return self._apply_staged(ops, image, res)
+
+    def _apply_staged(self, ops, image, res):
+        spare = image.copy() if len(ops) > 1 else None
+        self.stats = {
+            'fused': False,
+            'buffer_bytes': len(spare.getbuffer())
+                            if hasattr(spare, 'getbuffer') else 0,
+            'stages': [],
+        }
+        if not ops:
+            res.paste(image, (0, 0))
+            return res
+        # Stages alternate between `res` and `spare`, starting with whichever
+        # makes the last stage write into `res`.
+        src = image
+        for k, op in enumerate(ops):
+            dst = res if (len(ops) - k) % 2 == 1 else spare
+            start = time.time()
+            instrument.apply_stage(op, src, dst)
+            self.stats['stages'].append(
+                (op.__class__.__name__, time.time() - start))
+            src = dst
+        return res
+
+    def _apply_fused(self, ops, stages, image, res):
+        width, height = image.size
+        # clock[k + 1] is the time spent producing the rows out of stage k,
+        # its upstream stages included; clock[0] is for reading the image.
+        clock = [0.0] * (len(ops) + 1)
+        rows = _timed(streaming.image_rows(image), clock, 0)
+        for k, op_stages in enumerate(stages):
+            for stage in op_stages:
+                rows = stage.run(rows, height)
+            rows = _timed(rows, clock, k + 1)
+
+        buf, stride = res.getbuffer(), res.stride
+        for i, row in enumerate(rows):
+            buf[i * stride:i * stride + width] = row
+
+        self.stats = {
+            'fused': True,
+            'buffer_bytes': sum(stage.memory() for op_stages in stages
+                                for stage in op_stages),
+            'stages': [(op.__class__.__name__, clock[k + 1] - clock[k])
+                       for k, op in enumerate(ops)],
+        }
+        return res
+
+
+def _timed(rows, clock, k):
+    """
+    Yield from `rows`, adding the time spent waiting for them to `clock[k]`.
+    """
+    rows = iter(rows)
+    while True:
+        start = time.time()
+        try:
+            row = next(rows)
+        finally:
+            clock[k] += time.time() - start
+        yield row
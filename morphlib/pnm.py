@@ -0,0 +1,114 @@
+"""
+Native image file formats: binary PGM (P5) and PPM (P6), and a headered raw
+format.
+
+The raw format is a 12 bytes header, the magic (`MGR1` for grayscale, `MGR3`
+for RGB) followed by the width and height as little-endian unsigned 32-bit
+integers, then the pixels row by row. Only 8-bit images (maxval up to 255)
+are supported.
+
+Files are read through a read-only memory map (see `map_file`), so opening
+one costs the same whatever its size, and written with a single write.
+"""
+import mmap
+import struct
+
+GRAYSCALE = 'P5'
+RGB = 'P6'
+RAW_GRAYSCALE = 'MGR1'
+RAW_RGB = 'MGR3'
+
+# Number of bytes per pixel for each magic.
+CHANNELS = {GRAYSCALE: 1, RGB: 3, RAW_GRAYSCALE: 1, RAW_RGB: 3}
+
+_RAW_SIZE = struct.Struct('<II')
+
+
+def sniff(filepath):
+    """
+    Return True if the file at `filepath` is in one of the native formats.
+    """
+    with open(filepath, 'rb') as f:
+        head = f.read(4)
+    return head[:2] in (GRAYSCALE, RGB) and head[2:3].isspace() \
+            or head in (RAW_GRAYSCALE, RAW_RGB)
+
+
+def read_header(f):
+    """
+    Read the header of a native image file from the file object `f`, leaving
+    `f` at the first pixel. Returns (magic, width, height).
+    """
+    magic = f.read(2)
+    if magic in (GRAYSCALE, RGB):
+        return (magic,) + _read_pnm_size(f)
+    magic += f.read(2)
+    if magic in (RAW_GRAYSCALE, RAW_RGB):
+        size = f.read(_RAW_SIZE.size)
+        if len(size) != _RAW_SIZE.size:
+            raise ValueError('Truncated raw image header')
+        return (magic,) + _RAW_SIZE.unpack(size)
+    raise ValueError('Not a binary PGM/PPM or raw image file: %r' % magic)
+
+
+def _read_pnm_size(f):
+    fields = []
+    token = ''
+    while len(fields) < 3:
+        c = f.read(1)
+        if c == '#' and not token:
+            while c not in ('\n', '\r', ''):
+                c = f.read(1)
+        if c == '':
+            raise ValueError('Truncated PNM header')
+        if c.isspace():
+            if token:
+                fields.append(token)
+                token = ''
+        else:
+            token += c
+    try:
+        width, height, maxval = map(int, fields)
+    except ValueError:
+        raise ValueError('Invalid PNM header')
+    if not 0 < maxval <= 255:
+        raise ValueError('Only 8-bit PNM images are supported')
+    return width, height
+
+
+def write_header(f, magic, width, height):
+    """
+    Write the header of a native image file to the file object `f`.
+    """
+    if magic in (RAW_GRAYSCALE, RAW_RGB):
+        f.write(magic + _RAW_SIZE.pack(width, height))
+    else:
+        f.write('%s\n%d %d\n255\n' % (magic, width, height))
+
+
+def map_file(filepath):
+    """
+    Map the native image file at `filepath` read-only. Returns (magic, width,
+    height, pixels), `pixels` being a buffer on the mapped pixel data.
+    """
+    with open(filepath, 'rb') as f:
+        magic, width, height = read_header(f)
+        offset = f.tell()
+        length = width * height * CHANNELS[magic]
+        if not length:
+            return magic, width, height, ''
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(data) < offset + length:
+        raise ValueError('Truncated image file: %s' % filepath)
+    return magic, width, height, buffer(data, offset, length)
+
+
+def write_file(filepath, magic, width, height, pixels):
+    """
+    Write an image file with the flat pixel buffer `pixels`.
+    """
+    if len(pixels) != width * height * CHANNELS[magic]:
+        raise ValueError('Wrong pixel buffer size')
+    with open(filepath, 'wb') as f:
+        write_header(f, magic, width, height)
+        f.write(pixels)
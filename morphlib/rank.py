@@ -0,0 +1,148 @@
+"""
+Rank filters with a sliding histogram.
+
+The value of a pixel becomes the k-th smallest value of its neighbourhood,
+k being given as a percentile: 0 is the erosion, 100 the dilation and 50 the
+median. Following T. Huang et al. (A fast two-dimensional median filtering
+algorithm, IEEE TASSP 27(1), 1979) every row of the image is scanned with a
+256-bin histogram of the neighbourhood. Going from one pixel to the next,
+only the pixels entering the neighbourhood on the leading edge of every row
+of the structural element are added to the histogram, and those leaving on
+the trailing edge removed: two updates per row of a convex element, whatever
+its width. The selected value is tracked along with the number of
+neighbours below it, and moves by a few bins per step on natural images
+instead of the histogram being summed again.
+
+This is the pure Python engine working on the flat pixel buffer of a
+`GrayscaleImage`; neighbours outside the image are ignored (`kernel.CLIP`).
+"""
+
+
+def rank_index(n, percentile):
+    """
+    Return the index in the sorted values of a neighbourhood of `n` pixels
+    of the `percentile` percentile.
+    """
+    return int(round(percentile * (n - 1) / 100.0))
+
+
+def empty_value(percentile):
+    """
+    Return the value of the pixels with no neighbour in the image: 255 for
+    the 0 percentile, as for the erosion, 0 otherwise, as for the dilation.
+    """
+    return 255 if percentile == 0 else 0
+
+
+def edges(structuralElement):
+    """
+    Return the (di, columns, entering, leaving) rows of `structuralElement`:
+    the column offsets dj of row offset di, those whose pixel enters the
+    neighbourhood when moving one pixel right, and those whose pixel leaves
+    it.
+    """
+    columns = {}
+    for i, j in structuralElement.ones_offsets:
+        columns.setdefault(i, set()).add(j)
+    res = []
+    for di in sorted(columns):
+        row = columns[di]
+        # The neighbours of (i, j) are (i - di, j - dj): moving to j + 1
+        # brings in the pixels of the dj with no dj - 1 in the row, and
+        # drops those of the dj with no dj + 1.
+        res.append((di, sorted(row),
+                    sorted(dj for dj in row if dj - 1 not in row),
+                    sorted(dj for dj in row if dj + 1 not in row)))
+    return res
+
+
+def updates(structuralElement):
+    """
+    Return the number of histogram updates per pixel inside the image.
+    """
+    return sum(len(entering) + len(leaving)
+               for _, _, entering, leaving in edges(structuralElement))
+
+
+def rank_filter(structuralElement, percentile, image, res):
+    """
+    Save into `res` the `percentile` percentile of every neighbourhood of
+    `image`.
+    """
+    width, height = image.width, image.height
+    src, stride = image.getbuffer(), image.stride
+    out, out_stride = res.getbuffer(), res.stride
+    rows = edges(structuralElement)
+    ranks = [rank_index(n, percentile)
+             for n in xrange(len(structuralElement.ones_offsets) + 1)]
+    empty = empty_value(percentile)
+    all_columns = [dj for _, columns, _, _ in rows for dj in columns]
+    if not all_columns:
+        for i in xrange(height):
+            out[i * out_stride:i * out_stride + width] = \
+                    chr(empty) * width
+        return res
+    # Steps to the columns in ]lo, hi[ only move pixels inside the row.
+    lo = max(0, max(all_columns))
+    hi = min(width, width + min(all_columns))
+
+    for i in xrange(height):
+        # The element rows landing inside the image, as (offset of the
+        # neighbour row, columns, entering, leaving).
+        active = [((i - di) * stride, columns, entering, leaving)
+                  for di, columns, entering, leaving in rows
+                  if 0 <= i - di < height]
+        hist = [0] * 256
+        n = 0
+        for base, columns, _, _ in active:
+            for dj in columns:
+                if 0 <= -dj < width:
+                    hist[src[base - dj]] += 1
+                    n += 1
+        # The selected value `m`, and how many neighbours are below it.
+        m, below = 0, 0
+        o = i * out_stride
+        enter = [base - dj for base, _, entering, _ in active
+                 for dj in entering]
+        leave = [base - dj - 1 for base, _, _, leaving in active
+                 for dj in leaving]
+        for j in xrange(width):
+            if lo < j < hi:
+                for p in enter:
+                    v = src[p + j]
+                    hist[v] += 1
+                    if v < m:
+                        below += 1
+                for p in leave:
+                    v = src[p + j]
+                    hist[v] -= 1
+                    if v < m:
+                        below -= 1
+            elif j:
+                for base, _, entering, leaving in active:
+                    for dj in entering:
+                        if 0 <= j - dj < width:
+                            v = src[base + j - dj]
+                            hist[v] += 1
+                            n += 1
+                            if v < m:
+                                below += 1
+                    for dj in leaving:
+                        if 0 <= j - 1 - dj < width:
+                            v = src[base + j - 1 - dj]
+                            hist[v] -= 1
+                            n -= 1
+                            if v < m:
+                                below -= 1
+            if not n:
+                out[o + j] = empty
+                continue
+            k = ranks[n]
+            while below > k:
+                m -= 1
+                below -= hist[m]
+            while below + hist[m] <= k:
+                below += hist[m]
+                m += 1
+            out[o + j] = m
+    return res
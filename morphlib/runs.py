@@ -0,0 +1,273 @@
+"""
+Erosion, dilation and reconstruction of `RunLengthImage`s.
+
+The structural element is split by row offset into intervals of column
+offsets. Dilating a run [start, end) of row i by the interval [a, b] of row
+offset di gives the run [start + a, end + b) of row i + di, so a dilation
+costs one run per run of the image and interval of the element, whatever
+the length of the runs.
+
+A pixel p of row i survives the erosion if, for every interval [a, b] of
+row offset di, the pixels p - b to p - a of row i - di are all set or out
+of the image; that is p lies in [start + b, end + a) for a run of row
+i - di, the runs touching the left or right edge of the image being
+extended past it. Rows out of the image do not constrain anything, as with
+the grayscale operators.
+
+The reconstruction propagates runs through a queue, see `reconstruct`.
+"""
+from bisect import bisect_right
+from collections import deque
+
+from morphlib.image import RunLengthImage, complement_runs
+
+# Bounds of the runs extended past the edges of the image.
+_OUTSIDE = 1 << 62
+
+
+def supports(*images):
+    """
+    Return True if all given images are `RunLengthImage`s.
+    """
+    return all(isinstance(i, RunLengthImage) for i in images)
+
+
+def intervals(structuralElement):
+    """
+    Return the sorted (di, [(a, b), ...]) intervals of column offsets of
+    `structuralElement` by row offset.
+    """
+    columns = {}
+    for i, j in structuralElement.ones_offsets:
+        columns.setdefault(i, []).append(j)
+    res = []
+    for i in sorted(columns):
+        spans = []
+        for j in sorted(columns[i]):
+            if spans and spans[-1][1] == j - 1:
+                spans[-1] = (spans[-1][0], j)
+            else:
+                spans.append((j, j))
+        res.append((i, spans))
+    return res
+
+
+def dilate(structuralElement, image, res):
+    """
+    Dilate `image` by `structuralElement` saving the result in `res`.
+    """
+    width, height = image.width, image.height
+    grown = {}
+    for di, spans in intervals(structuralElement):
+        for i, runs in image.rows.iteritems():
+            k = i + di
+            if not 0 <= k < height:
+                continue
+            out = grown.setdefault(k, [])
+            for a, b in spans:
+                for start, end in runs:
+                    start, end = max(start + a, 0), min(end + b, width)
+                    if start < end:
+                        out.append((start, end))
+    res.rows = {}
+    for k, runs in grown.iteritems():
+        runs = merge(runs)
+        if runs:
+            res.rows[k] = runs
+    return res
+
+
+def erode(structuralElement, image, res):
+    """
+    Erode `image` by `structuralElement` saving the result in `res`.
+    """
+    width, height = image.width, image.height
+    spans = intervals(structuralElement)
+    # The pixels allowed by an empty row, for each row offset.
+    empty = dict((di, _eroded_row([], width, row_spans))
+                 for di, row_spans in spans)
+    res.rows = {}
+    for i in xrange(height):
+        allowed = [(0, width)]
+        for di, row_spans in spans:
+            r = i - di
+            if not 0 <= r < height:
+                continue
+            if r in image.rows:
+                allowed = intersect(
+                    allowed, _eroded_row(image.rows[r], width, row_spans))
+            else:
+                allowed = intersect(allowed, empty[di])
+            if not allowed:
+                break
+        if allowed:
+            res.rows[i] = allowed
+    return res
+
+
+def _eroded_row(runs, width, spans):
+    """
+    Return the runs of the pixels p such that p - b to p - a are set in the
+    row `runs` or out of the row, for all (a, b) in `spans`.
+    """
+    extended = merge([(-_OUTSIDE, 0)] + list(runs) + [(width, _OUTSIDE)])
+    res = [(0, width)]
+    for a, b in spans:
+        res = intersect(res, [
+            (max(start + b, 0), min(end + a, width))
+            for start, end in extended
+            if max(start + b, 0) < min(end + a, width)])
+    return res
+
+
+def reconstruct(structuralElement, marker, mask):
+    """
+    Return the reconstruction by dilation of the `RunLengthImage` `marker`
+    under `mask` (all set if None) and a dict of statistics as
+    `ReconstructionByDilation.reconstruct`, the queue holding runs.
+
+    The runs of the marker under the mask are closed along their row (see
+    `_close`) and queued. A run taken from the FIFO queue is dilated by the
+    intervals of the other row offsets into the rows they reach; the parts
+    of the mask rows it reaches which are not yet in the result are closed
+    along their row in turn, added and queued. Every pixel is queued once,
+    in the run it was added with: with the usual elements, which connect
+    neighbouring pixels of a row, each run of the mask is entered once and
+    filled whole.
+    """
+    width, height = marker.width, marker.height
+    if mask is None:
+        limit = dict((i, [(0, width)]) for i in xrange(height))
+    else:
+        limit = mask.rows
+    spans = intervals(structuralElement)
+    along = [(a, b) for di, row_spans in spans if di == 0
+             for a, b in row_spans]
+    across = [(di, row_spans) for di, row_spans in spans if di != 0]
+
+    rows = {}
+    queue = deque()
+    for i, runs in intersect_rows(marker.rows, limit).iteritems():
+        rows[i] = _close(runs, limit[i], along, width)
+        queue.extend((i, run) for run in rows[i])
+    pushes = queue_max = len(queue)
+    while queue:
+        i, (start, end) = queue.popleft()
+        for di, row_spans in across:
+            k = i + di
+            if k not in limit:
+                continue
+            reached = intersect(merge([
+                (max(start + a, 0), min(end + b, width))
+                for a, b in row_spans]), limit[k])
+            added = _subtract(reached, rows.get(k, []), width)
+            if not added:
+                continue
+            added = _subtract(_close(added, limit[k], along, width),
+                              rows.get(k, []), width)
+            rows[k] = merge(rows.get(k, []) + added)
+            queue.extend((k, run) for run in added)
+            pushes += len(added)
+        queue_max = max(queue_max, len(queue))
+    return RunLengthImage(width, height, rows), {
+        'scans': 1,
+        'queue_pushes': pushes,
+        'queue_max': queue_max,
+    }
+
+
+def _close(runs, limit, spans, width):
+    """
+    Return the pixels of the mask row `limit` reached from `runs`, a subset,
+    by steps of the column offsets in the intervals `spans`.
+
+    When these offsets, with 0, are a range from -`down` to `up`, a run
+    reaches the end of the mask run it starts in, then the following mask
+    runs as long as the gaps between them are narrower than `up`; and the
+    same with `down` towards the start of the row. Other offsets are
+    stepped until nothing is added.
+    """
+    offsets = set([0])
+    for a, b in spans:
+        offsets.update(xrange(a, b + 1))
+    down, up = -min(offsets), max(offsets)
+    if len(offsets) != up + down + 1:
+        while True:
+            grown = intersect(merge(runs + [
+                (max(start + a, 0), min(end + b, width))
+                for a, b in spans for start, end in runs]), limit)
+            if grown == runs:
+                return runs
+            runs = grown
+    starts = [start for start, end in limit]
+    res = []
+    for start, end in runs:
+        if up:
+            k = bisect_right(starts, end - 1) - 1
+            end = limit[k][1]
+            while k + 1 < len(limit) and limit[k + 1][0] - end < up:
+                k += 1
+                end = limit[k][1]
+        if down:
+            k = bisect_right(starts, start) - 1
+            start = limit[k][0]
+            while k > 0 and start - limit[k - 1][1] < down:
+                k -= 1
+                start = limit[k][0]
+        res.append((start, end))
+    return intersect(merge(res), limit)
+
+
+def _subtract(runs, other, width):
+    """
+    Return the pixels of the sorted `runs` not in the sorted `other`.
+    """
+    if not other:
+        return runs
+    return intersect(runs, complement_runs(other, width))
+
+
+def merge(runs):
+    """
+    Return the union of `runs`, sorted and with touching runs joined.
+    """
+    res = []
+    for start, end in sorted(runs):
+        if res and start <= res[-1][1]:
+            if end > res[-1][1]:
+                res[-1] = (res[-1][0], end)
+        else:
+            res.append((start, end))
+    return res
+
+
+def intersect(a, b):
+    """
+    Return the intersection of the sorted runs `a` and `b`.
+    """
+    res = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start < end:
+            res.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return res
+
+
+def intersect_rows(rows, mask):
+    """
+    Return the intersection of the runs by row `rows` and `mask`.
+    """
+    res = {}
+    for i, runs in rows.iteritems():
+        if i in mask:
+            runs = intersect(runs, mask[i])
+            if runs:
+                res[i] = runs
+    return res
+
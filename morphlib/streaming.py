@@ -0,0 +1,169 @@
+"""
+Streaming erosion, dilation and their chains, for images larger than memory.
+
+The image goes through the operator as a sequence of rows. Every stage
+(one erosion or dilation) keeps only the rows its structural element reaches
+and hands each output row to the next stage as soon as it is complete, so
+memory stays around `width * element height * number of stages` bytes,
+whatever the height of the image.
+
+    with open('scan.pgm', 'rb') as src, open('out.pgm', 'wb') as dst:
+        stream_file(Opening(se), src, dst)
+
+Results are the same as running the operator on the whole image, border
+modes included.
+"""
+from morphlib import kernel, pnm
+from morphlib.image import GrayscaleImage
+from morphlib.operator import ComposedMorphologicalOperator, Dilation, Erosion
+
+
+def stream(operator, rows, width, height):
+    """
+    Yield the rows of `operator` applied to the `width` x `height` image whose
+    rows (bytearrays or strings) are given by the iterable `rows`.
+    """
+    for stage in stages(operator, width):
+        rows = stage.run(rows, height)
+    return rows
+
+
+def stages(operator, width):
+    """
+    Return the `Stage`s `operator` is made of, for images `width` pixels wide.
+    """
+    if isinstance(operator, Erosion):
+        return [Stage(operator.structuralElement, min, 255, width,
+                      operator.border, operator.border_value)]
+    if isinstance(operator, Dilation) and operator.halo() is not None:
+        return [Stage(operator.structuralElement, max, 0, width,
+                      operator.border, operator.border_value)]
+    if isinstance(operator, ComposedMorphologicalOperator):
+        res = []
+        for op in operator.operations():
+            res.extend(stages(op, width))
+        return res
+    raise ValueError(
+        '%s cannot be streamed' % operator.__class__.__name__)
+
+
+def image_rows(image):
+    """
+    Yield the rows of a `GrayscaleImage`.
+    """
+    buf, stride = image.getbuffer(), image.stride
+    for i in xrange(image.height):
+        yield buf[i * stride:i * stride + image.width]
+
+
+def collect(rows, width, height):
+    """
+    Return the `GrayscaleImage` made of `rows`.
+    """
+    data = bytearray()
+    for row in rows:
+        data += row
+    return GrayscaleImage(width=width, height=height, data=data)
+
+
+def stream_file(operator, src, dst):
+    """
+    Apply `operator` to the grayscale PGM or raw image read from the file
+    object `src`, writing the result in the same format to the file object
+    `dst`.
+    """
+    magic, width, height = pnm.read_header(src)
+    if pnm.CHANNELS[magic] != 1:
+        raise ValueError('Only grayscale images can be streamed')
+
+    def rows():
+        for i in xrange(height):
+            row = src.read(width)
+            if len(row) != width:
+                raise ValueError('Truncated image file')
+            yield row
+
+    pnm.write_header(dst, magic, width, height)
+    for row in stream(operator, rows(), width, height):
+        dst.write(row)
+
+
+class Stage(object):
+    """
+    One erosion or dilation run over a sliding window of rows.
+
+    `reduce` (min or max) combines the neighbours of a pixel; `identity` is
+    the value that leaves it unchanged (255 for min, 0 for max), read by
+    neighbours outside the image in CLIP border mode.
+    """
+
+    def __init__(self, structuralElement, reduce, identity, width,
+                 border=kernel.CLIP, value=0):
+        self.reduce = reduce
+        self.identity = identity
+        self.width = width
+        self.border = border
+        self.value = value
+        # The neighbours of pixel `p` are `p - o` for every offset `o`.
+        self.deltas = sorted((-i, -j) for i, j in structuralElement.ones_offsets)
+        self.above, self.below = structuralElement.reach[:2]
+        self.margin = max([0] + [abs(j) for i, j in self.deltas])
+        fill = value if border == kernel.CONSTANT else identity
+        self.fill = bytearray(chr(fill)) * self.margin
+        self.constant = bytearray(chr(value)) * (width + 2 * self.margin)
+
+    def memory(self):
+        """
+        Return the most bytes of rows the stage holds at once.
+        """
+        return (self.above + self.below + 1) * (self.width + 2 * self.margin)
+
+    def run(self, rows, height):
+        """
+        Yield the output rows for the `height` input `rows`.
+        """
+        rows = iter(rows)
+        window = {}
+        read = 0
+        for i in xrange(height):
+            while read < min(i + self.below + 1, height):
+                window[read] = self.pad(next(rows))
+                read += 1
+            yield self.row(window, i, height)
+            window.pop(i - self.above, None)
+
+    def pad(self, row):
+        """
+        Return `row` with `margin` pixels on both sides as the border mode
+        reads them.
+        """
+        if len(row) != self.width:
+            raise ValueError('Expected a row of %d pixels, got %d' % (
+                self.width, len(row)))
+        if self.border == kernel.REPLICATE and row:
+            return bytearray(row[:1] * self.margin) + row + \
+                    row[-1:] * self.margin
+        return self.fill + row + self.fill
+
+    def row(self, window, i, height):
+        """
+        Return output row `i`, all the input rows it needs being in `window`.
+        """
+        parts = []
+        start, width = self.margin, self.width
+        for di, dj in self.deltas:
+            r = i + di
+            if 0 <= r < height:
+                row = window[r]
+            elif self.border == kernel.REPLICATE:
+                row = window[min(max(r, 0), height - 1)]
+            elif self.border == kernel.CONSTANT:
+                row = self.constant
+            else:
+                continue
+            parts.append(row[start + dj:start + dj + width])
+        if not parts:
+            return bytearray(chr(self.identity)) * width
+        if len(parts) == 1:
+            return parts[0]
+        return bytearray(map(self.reduce, *parts))
@@ -0,0 +1,188 @@
+"""
+Vectorized erosion and dilation on top of NumPy.
+
+Instead of walking the neighbourhood of every pixel, the result is computed
+as the elementwise min (erosion) or max (dilation) of shifted copies of the
+whole image, one shift per offset of the structural element. Pixels outside
+the image are ignored, which for 8-bit images is the same as padding with 255
+for erosion and 0 for dilation.
+
+Elements whose ones fill a rectangle (lines and squares included) are run as
+two 1-D passes of the van Herk/Gil-Werman running min/max instead, see
+`morphlib.lines` for the algorithm.
+
+NumPy is optional. When it is missing (or `ENABLED` is switched off) the
+operators in `morphlib.operator` fall back to their pure Python loops.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ENABLED = numpy is not None
+
+
+def supports(*images):
+    """
+    Return True if the vectorized engine can process all given images.
+    """
+    return ENABLED and all(hasattr(i, 'getbuffer') for i in images)
+
+
+def as_array(image):
+    """
+    Return a (height, width) uint8 array sharing memory with `image`.
+    """
+    a = numpy.frombuffer(image.getbuffer(), dtype=numpy.uint8)
+    return a.reshape(image.height, image.stride)[:, :image.width]
+
+
+def erode(structuralElement, image, res):
+    """
+    Erode `image` by `structuralElement` saving the result in `res`.
+    """
+    as_array(res)[...] = extreme(
+        as_array(image), structuralElement, numpy.minimum, 255)
+    return res
+
+
+def dilate(structuralElement, image, res):
+    """
+    Dilate `image` by `structuralElement` saving the result in `res`.
+    """
+    as_array(res)[...] = extreme(
+        as_array(image), structuralElement, numpy.maximum, 0)
+    return res
+
+
+def gradient(structuralElement, image, res):
+    """
+    Save into `res` the dilation minus the erosion of `image` by
+    `structuralElement`, walking its offsets once.
+    """
+    a = as_array(image)
+    if structuralElement.is_rectangle:
+        high = extreme(a, structuralElement, numpy.maximum, 0)
+        low = extreme(a, structuralElement, numpy.minimum, 255)
+    else:
+        high, low = shifted_extremes(a, structuralElement.ones_offsets)
+    # Empty neighbourhoods (0 - 255) give 0.
+    numpy.minimum(low, high, out=low)
+    numpy.subtract(high, low, out=as_array(res))
+    return res
+
+
+def subtract(a, b, res):
+    """
+    Save `a - b` into `res`, negative differences giving 0.
+    """
+    a, b = as_array(a), as_array(b)
+    numpy.subtract(a, numpy.minimum(a, b), out=as_array(res))
+    return res
+
+
+def extreme(a, structuralElement, reduce, pad_value):
+    """
+    Reduce with `reduce` the neighbourhoods of `a` defined by
+    `structuralElement`, picking the cheapest method for its shape.
+    """
+    if structuralElement.is_rectangle:
+        top, bottom, left, right = structuralElement.extent
+        a = running_extreme(a, 1, right, right - left + 1, reduce, pad_value)
+        return running_extreme(
+            a, 0, bottom, bottom - top + 1, reduce, pad_value)
+    return shifted_extreme(
+        a, structuralElement.ones_offsets, reduce, pad_value)
+
+
+def clip(res, mask):
+    """
+    Clip `res` in-place to be pointwise smaller than or equal to `mask`.
+    """
+    a = as_array(res)
+    numpy.minimum(a, as_array(mask)[:a.shape[0], :a.shape[1]], out=a)
+    return res
+
+
+def shifted_extreme(a, offsets, reduce, pad_value):
+    """
+    Reduce with `reduce` the copies of `a` shifted by every offset.
+
+    The pixel at `p` of the result combines the pixels at `p - o` for each
+    offset `o`, as `StructuralElement.get_neighbourhood` does. Pixels outside
+    `a` read as `pad_value`.
+    """
+    height, width = a.shape
+    out = numpy.empty_like(a)
+    out.fill(pad_value)
+    if not offsets:
+        return out
+    top = max(0, max(di for di, dj in offsets))
+    bottom = max(0, -min(di for di, dj in offsets))
+    left = max(0, max(dj for di, dj in offsets))
+    right = max(0, -min(dj for di, dj in offsets))
+    padded = numpy.empty((height + top + bottom, width + left + right),
+                         dtype=a.dtype)
+    padded.fill(pad_value)
+    padded[top:top + height, left:left + width] = a
+    for di, dj in offsets:
+        i, j = top - di, left - dj
+        reduce(out, padded[i:i + height, j:j + width], out=out)
+    return out
+
+
+def shifted_extremes(a, offsets):
+    """
+    Return the maximum and the minimum of the copies of `a` shifted by every
+    offset (see `shifted_extreme`), computed in the same loop.
+    """
+    high = numpy.zeros_like(a)
+    low = numpy.empty_like(a)
+    low.fill(255)
+    if not offsets:
+        return high, low
+    height, width = a.shape
+    top = max(0, max(di for di, dj in offsets))
+    bottom = max(0, -min(di for di, dj in offsets))
+    left = max(0, max(dj for di, dj in offsets))
+    right = max(0, -min(dj for di, dj in offsets))
+    # Pixels outside `a` are ignored: 0 for the maximum, 255 for the
+    # minimum.
+    padded_high = numpy.zeros((height + top + bottom, width + left + right),
+                              dtype=a.dtype)
+    padded_high[top:top + height, left:left + width] = a
+    padded_low = padded_high.copy()
+    padded_low[:top] = padded_low[top + height:] = 255
+    padded_low[:, :left] = padded_low[:, left + width:] = 255
+    for di, dj in offsets:
+        i, j = top - di, left - dj
+        numpy.maximum(high, padded_high[i:i + height, j:j + width], out=high)
+        numpy.minimum(low, padded_low[i:i + height, j:j + width], out=low)
+    return high, low
+
+
+def running_extreme(a, axis, shift, k, reduce, pad_value):
+    """
+    Reduce with `reduce` the windows of `k` values of `a` along `axis`.
+
+    The value at `x` of the result combines `a[x - shift:x - shift + k]`,
+    values outside `a` reading as `pad_value`. Uses the van Herk/Gil-Werman
+    block prefix/suffix scheme, so the cost does not depend on `k`.
+    """
+    if k == 1 and shift == 0:
+        return a.copy()
+    a = numpy.swapaxes(a, axis, -1)
+    rows, n = a.shape
+    length = n + k - 1
+    length += -length % k
+    q = numpy.empty((rows, length), dtype=a.dtype)
+    q.fill(pad_value)
+    lo, hi = max(0, shift), min(length, shift + n)
+    if lo < hi:
+        q[:, lo:hi] = a[:, lo - shift:hi - shift]
+    blocks = q.reshape(rows, length // k, k)
+    prefix = reduce.accumulate(blocks, axis=2).reshape(rows, length)
+    suffix = reduce.accumulate(blocks[:, :, ::-1], axis=2)[:, :, ::-1]
+    suffix = suffix.reshape(rows, length)
+    out = reduce(suffix[:, :n], prefix[:, k - 1:k - 1 + n])
+    return numpy.swapaxes(out, axis, -1)
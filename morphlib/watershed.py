@@ -0,0 +1,118 @@
+"""
+Marker-controlled watershed segmentation.
+
+The relief (usually a gradient) is flooded from the markers, following
+F. Meyer (Topographic distance and watershed lines, Signal Processing 38,
+1994), with a hierarchical queue of one FIFO per gray level: the marker
+pixels are queued at their level, and the lowest queued pixel then gives
+its label to its unlabelled neighbours, which are queued at their own
+level, or at the current level if they are lower. Every pixel is queued
+once, so the flooding is linear in the number of pixels; the FIFO order
+splits plateaus between the basins flooding them at mid-distance.
+
+Every pixel ends in a basin, no watershed line is drawn. Pixels not
+connected to any marker keep the label 0. Connectivity is given by a
+structural element, as in `morphlib.components`.
+"""
+from array import array
+
+from morphlib import components
+
+# The label of the frame around the flat buffers, which stops the flood
+# with no bounds checks.
+_FRAME = -1
+
+
+def label_markers(markers, structuralElement):
+    """
+    Return the framed labels of the connected components of the non-zero
+    pixels of the `GrayscaleImage` `markers`, numbered from 1 in raster
+    order, and the number of components.
+    """
+    m, frame = components.read(markers, structuralElement)
+    labels = _framed_labels(frame)
+    offsets = frame.offsets
+    count = 0
+    for p in frame.pixels():
+        if not m[p] or labels[p]:
+            continue
+        count += 1
+        labels[p] = count
+        stack = [p]
+        while stack:
+            q = stack.pop()
+            for o in offsets:
+                r = q + o
+                if m[r] and not labels[r]:
+                    labels[r] = count
+                    stack.append(r)
+    return labels, count
+
+
+def read_labels(image, structuralElement):
+    """
+    Return the labels of the `LabelImage` `image` in a framed buffer.
+    """
+    frame = components.Frame(image.width, image.height, structuralElement)
+    labels = _framed_labels(frame)
+    width = image.width
+    for i in xrange(image.height):
+        start = (i + frame.rows) * frame.stride + frame.cols
+        labels[start:start + width] = array(
+            'i', image.labels[i * width:(i + 1) * width])
+    return labels
+
+
+def flood(relief, labels, structuralElement):
+    """
+    Flood the `GrayscaleImage` `relief` from the framed `labels` (see
+    `label_markers`), in place. Returns the number of pixels queued.
+    """
+    f, frame = components.read(relief, structuralElement)
+    offsets = frame.offsets
+    queues = [[] for _ in xrange(256)]
+    # Queued pixels are labelled already, so a non-zero label means done.
+    pushes = 0
+    for p in frame.pixels():
+        if labels[p] > 0:
+            queues[f[p]].append(p)
+            pushes += 1
+    for level in xrange(256):
+        queue = queues[level]
+        # The FIFO is read by index, and grows while it is read.
+        k = 0
+        while k < len(queue):
+            p = queue[k]
+            k += 1
+            label = labels[p]
+            for o in offsets:
+                q = p + o
+                if not labels[q]:
+                    labels[q] = label
+                    v = f[q]
+                    queues[v if v > level else level].append(q)
+                    pushes += 1
+        queues[level] = None
+    return pushes
+
+
+def unframe(labels, width, height, structuralElement):
+    """
+    Return the labels of the image part of the framed `labels` as a compact
+    array, row by row.
+    """
+    frame = components.Frame(width, height, structuralElement)
+    res = array('i')
+    for i in xrange(height):
+        start = (i + frame.rows) * frame.stride + frame.cols
+        res.extend(labels[start:start + width])
+    return res
+
+
+def _framed_labels(frame):
+    labels = array('i', [_FRAME]) * frame.size
+    zeros = array('i', [0]) * frame.width
+    for i in xrange(frame.height):
+        start = (i + frame.rows) * frame.stride + frame.cols
+        labels[start:start + frame.width] = zeros
+    return labels
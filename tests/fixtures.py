@@ -0,0 +1,36 @@
+"""
+Fixtures shared by the test suites comparing operators on random images.
+"""
+import random
+
+from morphlib.image import GrayscaleImage
+from morphlib.operator import SquaredStructuralElementBuilder, \
+        StructuralElement
+
+
+def random_image(seed, width, height, values=None):
+    """
+    Return a `width` x `height` GrayscaleImage of pixels drawn from `values`,
+    or from all the gray levels if None.
+    """
+    rnd = random.Random(seed)
+    if values is None:
+        pixels = (rnd.randrange(256) for _ in xrange(width * height))
+    else:
+        pixels = (rnd.choice(values) for _ in xrange(width * height))
+    return GrayscaleImage(width=width, height=height,
+                          data=bytearray(pixels))
+
+
+def structural_elements(square=5):
+    """
+    Return the predefined circle and octagon, a `square` x `square` square
+    and an irregular element spread over several rows.
+    """
+    return [
+        StructuralElement.predefined('circle'),
+        StructuralElement.predefined('octagon'),
+        SquaredStructuralElementBuilder(square).get_struct_elem(),
+        StructuralElement.from_offsets(
+            [(0, 0), (-2, 0), (0, 3), (1, -1), (1, 1)]),
+    ]
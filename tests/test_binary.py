@@ -0,0 +1,125 @@
+import unittest
+
+from morphlib import kernel
+from morphlib.image import BinaryImage, GrayscaleImage
+from morphlib.operator import CloseHoles, Closing, Dilation, Erosion, \
+        GeodesicDilation, Opening, ReconstructionByDilation, StructuralElement
+
+from fixtures import random_image, structural_elements
+
+class MaskImageTests(object):
+    """
+    Tests shared by the images of 0 and 1 pixels, which should give the same
+    results as the operators on the matching grayscale images.
+    """
+    # The image class, and the values the random grayscale pixels are drawn
+    # from.
+    image_class = None
+    values = (0, 255)
+    seed = 3
+
+    def setUp(self):
+        self.gray = random_image(self.seed, 23, 17, self.values)
+        self.image = self.image_class.from_grayscale(self.gray)
+        self.elements = structural_elements() + [
+            # A rectangle away from the origin.
+            StructuralElement.from_offsets(
+                [(i, j) for i in (1, 2) for j in (-4, -3, -2)]),
+        ]
+
+    def test_pixels(self):
+        self.assertEquals(self.image.to_grayscale(), self.gray)
+        self.assertEquals(self.image[3][4], 1 if self.gray[3][4] else 0)
+        self.assertEquals(self.image.count(),
+                          sum(1 for px in self.gray.getdata() if px))
+        self.assertEquals(self.image.invert().invert(), self.image)
+        self.assertRaises(TypeError, self.image[0].__setitem__, 0, 255)
+
+    def test_matches_grayscale(self):
+        for se in self.elements:
+            for cls in (Erosion, Dilation, Opening, Closing):
+                result = cls(se)(self.image)
+                self.assertEquals(result.mode, self.image_class.mode)
+                self.assertEquals(result.to_grayscale(), cls(se)(self.gray))
+
+    def test_border_modes(self):
+        se = self.elements[3]
+        for cls in (Erosion, Dilation):
+            for border in kernel.BORDER_MODES:
+                op = cls(se, border=border, border_value=255)
+                self.assertEquals(op(self.image).to_grayscale(),
+                                  op(self.gray))
+
+    def test_reconstruction(self):
+        se = StructuralElement.predefined('circle')
+        marker = Erosion(self.elements[2])(self.gray)
+        expected = ReconstructionByDilation(se, self.gray)(marker)
+        op = ReconstructionByDilation(se, self.image)
+        result = op(self.image_class.from_grayscale(marker))
+        self.assertEquals(result.to_grayscale(), expected)
+        self.assertEquals(
+            GeodesicDilation(se, self.image)(
+                self.image_class.from_grayscale(marker)).to_grayscale(),
+            GeodesicDilation(se, self.gray)(marker))
+
+    def test_reconstruction_elements(self):
+        marker = self.gray.border()
+        for se in self.elements + [
+                StructuralElement.from_offsets([(0, -2), (0, 1), (1, 0)])]:
+            # Geodesic dilations iterated until nothing changes.
+            expected = marker
+            while True:
+                grown = GeodesicDilation(se, self.gray)(expected)
+                grown = GrayscaleImage(
+                    width=grown.width, height=grown.height,
+                    data=bytearray(map(max, grown.getbuffer(),
+                                       expected.getbuffer())))
+                if grown == expected:
+                    break
+                expected = grown
+            op = ReconstructionByDilation(se, self.image)
+            self.assertEquals(
+                op(self.image_class.from_grayscale(marker)).to_grayscale(),
+                expected)
+
+    def maze(self, n):
+        """
+        Return a `n` x `n` serpentine corridor, whose reconstruction from
+        its top left corner takes about n * n / 2 geodesic dilations.
+        """
+        gray = GrayscaleImage(width=n, height=n, data=bytearray(
+            0 if i % 4 == 1 and j != n - 1 or i % 4 == 3 and j != 0 else 255
+            for i in xrange(n) for j in xrange(n)))
+        marker = GrayscaleImage(width=n, height=n, data=bytearray(n * n))
+        marker[0][0] = 255
+        return (self.image_class.from_grayscale(gray),
+                self.image_class.from_grayscale(marker))
+
+    def test_maze_reconstruction(self):
+        mask, marker = self.maze(61)
+        op = ReconstructionByDilation(StructuralElement.predefined('rhombus'),
+                                      mask)
+        self.assertEquals(op(marker), mask)
+        return op
+
+    def test_close_holes(self):
+        self.assertEquals(CloseHoles()(self.image).to_grayscale(),
+                          CloseHoles()(self.gray))
+
+
+class BinaryImageTest(MaskImageTests, unittest.TestCase):
+    image_class = BinaryImage
+
+    def test_rows(self):
+        image = BinaryImage(4, 3)
+        image[1][2] = 1
+        image[2] = [1, 0, 0, 1]
+        self.assertEquals(image.getdata(), [0, 0, 0, 0, 0, 0, 1, 0, 1, 0, 0, 1])
+        self.assertEquals(image.rows, [0, 4, 9])
+        self.assertEquals(BinaryImage(4, 3, [0, 4, 25]), image)
+        self.assertRaises(ValueError, BinaryImage, 4, 2, [0, 4, 9])
+
+    def test_maze_reconstruction(self):
+        op = super(BinaryImageTest, self).test_maze_reconstruction()
+        # Each row is reached once, from the row above.
+        self.assertEquals(op.stats['queue_pushes'], 61)
@@ -0,0 +1,93 @@
+import random
+import shutil
+import tempfile
+import unittest
+
+from morphlib.cache import CachedOperator, ResultCache, operator_key
+from morphlib.image import GrayscaleImage, LabelImage
+from morphlib.operator import Closing, GeodesicDilation, Opening, \
+        StructuralElement, Watershed
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(14)
+        self.image = GrayscaleImage(width=12, height=10, data=bytearray(
+            rnd.randrange(256) for _ in xrange(12 * 10)))
+        self.se = StructuralElement.predefined('rhombus')
+
+    def test_keys(self):
+        padded = StructuralElement([[0, 0, 0, 0, 0],
+                                    [0, 0, 1, 0, 0],
+                                    [0, 1, 1, 1, 0],
+                                    [0, 0, 1, 0, 0],
+                                    [0, 0, 0, 0, 0]])
+        self.assertEquals(operator_key(Opening(self.se)),
+                          operator_key(Opening(padded)))
+        self.assertNotEquals(operator_key(Opening(self.se)),
+                             operator_key(Closing(self.se)))
+        self.assertNotEquals(operator_key(Opening(self.se)),
+                             operator_key(Opening(self.se, border='replicate')))
+        mask = self.image.copy()
+        key = operator_key(GeodesicDilation(self.se, mask))
+        mask[0][0] = 255 - mask[0][0]
+        self.assertNotEquals(operator_key(GeodesicDilation(self.se, mask)), key)
+
+    def test_memory_tier(self):
+        cache = ResultCache(max_bytes=2 * 12 * 10)
+        opening = CachedOperator(Opening(self.se), cache)
+        expected = Opening(self.se)(self.image)
+        res = opening(self.image)
+        self.assertEquals(res, expected)
+        res[0][0] = 255 - res[0][0]
+        self.assertEquals(opening(self.image), expected)
+        self.assertEquals((cache.hits, cache.misses), (1, 1))
+
+        other = self.image.invert()
+        CachedOperator(Closing(self.se), cache)(self.image)
+        opening(self.image)
+        opening(other)
+        # The closing was the least recently used result.
+        self.assertEquals(len(cache), 2)
+        self.assertEquals(cache.size, 2 * 12 * 10)
+        self.assertEquals(cache.misses, 3)
+        CachedOperator(Closing(self.se), cache)(self.image)
+        self.assertEquals(cache.misses, 4)
+
+    def test_disk_tier(self):
+        directory = tempfile.mkdtemp()
+        try:
+            opening = CachedOperator(Opening(self.se), ResultCache(
+                max_bytes=0, directory=directory))
+            expected = opening(self.image)
+            opening = CachedOperator(Opening(self.se), ResultCache(
+                directory=directory))
+            self.assertEquals(opening(self.image), expected)
+            self.assertEquals(opening.cache.hits, 1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_labels(self):
+        # Labels above 255 survive both tiers.
+        labels = [0] * (12 * 10)
+        labels[0] = 300
+        labels[-1] = 7
+        markers = LabelImage(12, 10, labels)
+        directory = tempfile.mkdtemp()
+        try:
+            cache = ResultCache(directory=directory)
+            watershed = CachedOperator(Watershed(markers), cache)
+            expected = Watershed(markers)(self.image)
+            self.assertEquals(watershed(self.image), expected)
+            self.assertEquals(cache.size, 2 * 12 * 10)
+            res = watershed(self.image)
+            self.assertTrue(isinstance(res, LabelImage))
+            self.assertEquals(res, expected)
+            cache.clear()
+            res = watershed(self.image)
+            self.assertTrue(isinstance(res, LabelImage))
+            self.assertEquals(res.labels.typecode, 'H')
+            self.assertEquals(res, expected)
+            self.assertEquals((cache.hits, cache.misses), (2, 1))
+        finally:
+            shutil.rmtree(directory)
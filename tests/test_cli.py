@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import abspath, dirname, exists, join
+from StringIO import StringIO
+
+from morphlib.cli import find_inputs, main, parse_pipeline, run
+from morphlib.image import GrayscaleImage
+from morphlib.operator import AreaOpening, CloseHoles, Gradient, Opening, \
+        StructuralElement, WhiteTopHat
+
+class CliTest(unittest.TestCase):
+    TEST_IMAGES = join(dirname(abspath(__file__)), 'images')
+
+    def setUp(self):
+        self.out = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.out)
+
+    def test_parse_pipeline(self):
+        ops = parse_pipeline('opening:circle, close-holes,area-opening:30:rhombus')
+        self.assertEquals([op.__class__ for op in ops],
+                          [Opening, CloseHoles, AreaOpening])
+        self.assertEquals(ops[0].structuralElement.ones_offsets,
+                          StructuralElement.predefined('circle').ones_offsets)
+        self.assertEquals(ops[2].area, 30)
+        self.assertEquals(len(parse_pipeline('erosion:square5')[0]
+                              .structuralElement.ones_offsets), 25)
+        self.assertEquals(
+            [op.__class__ for op in parse_pipeline('gradient,white-tophat')],
+            [Gradient, WhiteTopHat])
+        self.assertEquals(parse_pipeline('close-holes:8')[0].connectivity, 8)
+        self.assertEquals(
+            parse_pipeline('reconstruction-opening:square5')[0]
+            .__class__.__name__, 'OpeningByReconstruction')
+        for spec in ('opening:nope', 'foo', 'close-holes:3', 'area-opening'):
+            self.assertRaises(ValueError, parse_pipeline, spec)
+
+    def test_run(self):
+        self.assertEquals(len(find_inputs([self.TEST_IMAGES])),
+                          len(os.listdir(self.TEST_IMAGES)))
+        self.assertRaises(ValueError, run, 'erosion',
+                          find_inputs([self.TEST_IMAGES]), self.out,
+                          format='pgm')
+        inputs = find_inputs([join(self.TEST_IMAGES, '*.png')])
+        self.assertEquals(len(inputs), 3)
+        log = StringIO()
+        self.assertEquals(
+            run('erosion:rhombus', inputs, self.out, workers=2, format='pgm',
+                out=log), 0)
+        self.assertEquals(len(log.getvalue().splitlines()), len(inputs) + 1)
+        for path in inputs:
+            name = os.path.splitext(os.path.basename(path))[0]
+            res = GrayscaleImage.load(join(self.out, name + '.pgm'))
+            self.assertEquals(res, parse_pipeline('erosion:rhombus')[0](
+                GrayscaleImage.load(path)))
+
+    def test_main(self):
+        src = join(self.TEST_IMAGES, 'pict.png')
+        self.assertEquals(main(['dilation', src, '-o', self.out, '-j', '1']), 0)
+        self.assertTrue(exists(join(self.out, 'pict.png')))
@@ -0,0 +1,61 @@
+import pickle
+import random
+import unittest
+
+from morphlib.components import MaxTree
+from morphlib.image import GrayscaleImage
+from morphlib.operator import AreaOpening, StructuralElement
+
+class MaxTreeTest(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(6)
+        self.image = GrayscaleImage(width=15, height=11, data=bytearray(
+            rnd.choice([0, 40, 90, 90, 160, 250]) for _ in xrange(15 * 11)))
+        self.se = StructuralElement.predefined('octagon')
+        self.tree = MaxTree(self.image, self.se)
+
+    def test_structure(self):
+        tree = self.tree
+        self.assertEquals(tree.area[0], 15 * 11)
+        self.assertEquals(tree.level[0], min(self.image.getdata()))
+        self.assertEquals(
+            (tree.top[0], tree.left[0], tree.bottom[0], tree.right[0]),
+            (0, 0, 10, 14))
+        self.assertEquals(tree.height[0], 250 - tree.level[0])
+        for k in xrange(1, len(tree)):
+            p = tree.parent[k]
+            self.assertTrue(p < k)
+            self.assertTrue(tree.level[p] < tree.level[k])
+            self.assertTrue(tree.area[p] > tree.area[k])
+
+    def test_no_filtering(self):
+        self.assertEquals(self.tree.filter([True] * len(self.tree)), self.image)
+
+    def test_area_opening(self):
+        for area in (1, 2, 5, 30, 1000):
+            self.assertEquals(self.tree.area_opening(area),
+                              AreaOpening(self.se, area)(self.image))
+
+    def test_height_opening(self):
+        res = self.tree.height_opening(256)
+        self.assertEquals(res.getdata(), [min(self.image.getdata())] * 15 * 11)
+
+    def test_pickle(self):
+        tree = pickle.loads(pickle.dumps(self.tree, pickle.HIGHEST_PROTOCOL))
+        self.assertEquals(tree.area_opening(5), self.tree.area_opening(5))
+        self.assertEquals(tree.bbox_opening(3, 2), self.tree.bbox_opening(3, 2))
+
+    def test_disconnecting_element(self):
+        # The diagonal element splits the image into several components, each
+        # one being the root of its own tree.
+        se = StructuralElement.predefined('diagonal')
+        image = GrayscaleImage(width=2, height=2,
+                               data=bytearray([10, 50, 50, 200]))
+        tree = MaxTree(image, se)
+        self.assertEquals(sorted(tree.area[k] for k in xrange(len(tree))
+                                 if tree.parent[k] == k), [1, 1, 2])
+        self.assertEquals(tree.area_opening(3), AreaOpening(se, 3)(image))
+        for area in (1, 2, 5, 30):
+            self.assertEquals(MaxTree(self.image, se).area_opening(area),
+                              AreaOpening(se, area)(self.image))
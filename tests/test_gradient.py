@@ -0,0 +1,46 @@
+import unittest
+
+from morphlib import kernel, vectorized
+from morphlib.operator import BlackTopHat, Closing, Dilation, Erosion, \
+        Gradient, Opening, StructuralElement, WhiteTopHat
+
+from fixtures import random_image, structural_elements
+
+class GradientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.image = random_image(11, 21, 15)
+        self.elements = structural_elements(square=9) + [
+            # No origin: some border pixels have no neighbour at all.
+            StructuralElement.from_offsets([(0, 4), (3, 0)]),
+        ]
+        self.enabled = vectorized.ENABLED
+
+    def tearDown(self):
+        vectorized.ENABLED = self.enabled
+
+    def difference(self, a, b):
+        return [max(x - y, 0) for x, y in zip(a.getdata(), b.getdata())]
+
+    def check(self, **kwargs):
+        image = self.image
+        for se in self.elements:
+            self.assertEquals(
+                Gradient(se, **kwargs)(image).getdata(),
+                self.difference(Dilation(se, **kwargs)(image),
+                                Erosion(se, **kwargs)(image)))
+            self.assertEquals(
+                WhiteTopHat(se, **kwargs)(image).getdata(),
+                self.difference(image, Opening(se, **kwargs)(image)))
+            self.assertEquals(
+                BlackTopHat(se, **kwargs)(image).getdata(),
+                self.difference(Closing(se, **kwargs)(image), image))
+
+    def test_engines(self):
+        for enabled in set([False, self.enabled]):
+            vectorized.ENABLED = enabled
+            self.check()
+
+    def test_border_modes(self):
+        for border in (kernel.REPLICATE, kernel.CONSTANT):
+            self.check(border=border, border_value=40)
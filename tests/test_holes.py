@@ -0,0 +1,91 @@
+import random
+import unittest
+
+from morphlib.image import BinaryImage, GrayscaleImage, RunLengthImage
+from morphlib.operator import CloseHoles, ReconstructionByDilation, \
+        StructuralElement
+
+class CloseHolesTest(unittest.TestCase):
+
+    def setUp(self):
+        # A ring closed under 4-connectivity, with a gap on a diagonal only,
+        # around a dark hole with a darker pit.
+        rows = ['.........',
+                '.#######.',
+                '.#.....#.',
+                '.#.....#.',
+                '.#.....#.',
+                '.#.....#.',
+                '.######..',
+                '.........']
+        self.image = GrayscaleImage(width=9, height=8, data=bytearray(
+            200 if c == '#' else 30 for row in rows for c in row))
+        self.image[3][4] = 10
+
+    def test_fill(self):
+        res = CloseHoles()(self.image)
+        self.assertEquals(res[3][4], 200)
+        self.assertEquals(res[4][2], 200)
+        self.assertEquals(res[0][0], 30)
+        # The hole leaks through the diagonal gap, only the pit is filled.
+        res = CloseHoles(8)(self.image)
+        self.assertEquals(res[3][4], 30)
+        self.assertEquals(res[4][2], 30)
+        self.assertRaises(ValueError, CloseHoles, 6)
+
+    def test_matches_reconstruction(self):
+        rnd = random.Random(2)
+        image = GrayscaleImage(width=23, height=17, data=bytearray(
+            rnd.randrange(256) for _ in xrange(23 * 17)))
+        for connectivity, name in ((4, 'rhombus'), (8, 'octagon')):
+            inv = image.invert()
+            expected = ReconstructionByDilation(
+                StructuralElement.predefined(name), inv)(inv.border()).invert()
+            self.assertEquals(CloseHoles(connectivity)(image), expected)
+
+    def test_binary(self):
+        rnd = random.Random(4)
+        image = GrayscaleImage(width=23, height=17, data=bytearray(
+            rnd.choice((0, 255, 255)) for _ in xrange(23 * 17)))
+        for connectivity in (4, 8):
+            expected = CloseHoles(connectivity)(image)
+            for cls in (BinaryImage, RunLengthImage):
+                res = CloseHoles(connectivity)(cls.from_grayscale(image))
+                self.assertEquals(res.to_grayscale(), expected)
+
+    def test_degenerate_shapes(self):
+        # Every pixel is on the border, so there are no holes.
+        for width, height in ((5, 1), (1, 5), (5, 2), (1, 1)):
+            image = GrayscaleImage(width=width, height=height, data=bytearray(
+                255 if k % 2 == 0 else 0 for k in xrange(width * height)))
+            for connectivity in (4, 8):
+                op = CloseHoles(connectivity)
+                self.assertEquals(op(image), image)
+                for cls in (BinaryImage, RunLengthImage):
+                    res = op(cls.from_grayscale(image))
+                    self.assertEquals(res.to_grayscale(), image)
+
+    def test_maze(self):
+        # A serpentine corridor inside a wall, open to the outside at its
+        # top left corner, and the same one sealed.
+        n = 101
+        def wall(i, j):
+            if i in (0, n - 1) or j in (0, n - 1):
+                return False
+            if i in (1, n - 2) or j in (1, n - 2):
+                return True
+            return i % 4 == 0 and j != n - 3 or i % 4 == 2 and j != 2
+        maze = GrayscaleImage(width=n, height=n, data=bytearray(
+            255 if wall(i, j) else 0 for i in xrange(n) for j in xrange(n)))
+        maze[1][2] = 0
+        sealed = maze.copy()
+        sealed[1][2] = 255
+        # Everything inside the outer wall is raised.
+        filled = sealed.copy()
+        for i in xrange(2, n - 2):
+            filled[i] = [0] + [255] * (n - 2) + [0]
+        for image, expected in ((maze, maze), (sealed, filled)):
+            self.assertEquals(CloseHoles()(image), expected)
+            for cls in (BinaryImage, RunLengthImage):
+                res = CloseHoles()(cls.from_grayscale(image))
+                self.assertEquals(res.to_grayscale(), expected)
@@ -114,3 +114,73 @@ class ImageObjectTest(unittest.TestCase):
         self.assertEquals(b[3][3], 0)
         self.assertNotEquals(b[2][2], i[2][2])
         self.assertEquals(b[-1][-1], i[-1][-1])
+
+    def test_GrayscaleImage_flat_storage(self):
+        i = GrayscaleImage(width=3, height=2, data=[[1, 2, 3], [4, 5, 6]])
+        self.assertEquals(i.getbuffer(), bytearray([1, 2, 3, 4, 5, 6]))
+        self.assertEquals(i[1][2], 6)
+        self.assertEquals(i[-1][-3], 4)
+        self.assertRaises(IndexError, i[0].__getitem__, 3)
+        i[1][0] = 40
+        self.assertEquals(i.getdata(), [1, 2, 3, 40, 5, 6])
+        i[0] = [7, 8, 9]
+        self.assertEquals(list(i[0]), [7, 8, 9])
+        self.assertRaises(TypeError, i[0].__setitem__, 0, 256)
+        self.assertRaises(TypeError, i.__setitem__, 0, [0, 1, 300])
+        self.assertRaises(ValueError, i.__setitem__, 0, [0, 1])
+        self.assertRaises(ValueError, GrayscaleImage, 3, 2, bytearray(5))
+
+    def test_GrayscaleImage_copy(self):
+        i = GrayscaleImage.load(filepath=self.TEST_IMAGE['path'])
+        c = i.copy()
+        self.assertEquals(c, i)
+        c[0][0] = 255 - i[0][0]
+        self.assertNotEquals(c[0][0], i[0][0])
+        self.assertFalse(c == i)
+
+    def test_native_formats(self):
+        import pickle
+        from morphlib import pnm
+        gray = GrayscaleImage.load(filepath=self.TEST_IMAGE['path'])
+        name, ext = os.path.splitext(self.TEST_IMAGE['path'])
+        for image in (gray, self.i):
+            for ext in image.NATIVE_FORMATS:
+                test_out = '%s%s%s' % (name, '_native', ext)
+                try:
+                    image.save(test_out)
+                    self.assertTrue(pnm.sniff(test_out))
+                    i = image.__class__.load(filepath=test_out)
+                    self.assertEquals(i.size, image.size)
+                    self.assertEquals(i, image)
+                    if i.mode == 'grayscale':
+                        # Saving and copying leave the file mapped.
+                        mapped = GrayscaleImage.load(filepath=test_out)
+                        mapped.save(test_out + '.raw')
+                        os.unlink(test_out + '.raw')
+                        self.assertEquals(mapped.copy(), image)
+                        self.assertTrue(mapped._buf is None)
+                        self.assertTrue(mapped.materialize() is mapped)
+                        self.assertEquals(mapped.getbuffer(),
+                                          image.getbuffer())
+                        # Writes never reach the mapped file.
+                        i[0][0] = 255 - image[0][0]
+                        self.assertEquals(
+                            GrayscaleImage.load(filepath=test_out), image)
+                        self.assertEquals(pickle.loads(pickle.dumps(
+                            GrayscaleImage.load(filepath=test_out))), image)
+                finally:
+                    os.unlink(test_out)
+        # PGM files go through PIL when loaded as RGB.
+        test_out = name + '_native.pgm'
+        try:
+            gray.save(test_out)
+            self.assertEquals(Image.load(filepath=test_out)[0][0],
+                              (gray[0][0],) * 3)
+        finally:
+            os.unlink(test_out)
+
+    def test_load_without_conversion(self):
+        i = Image.load(filepath=self.TEST_IMAGE['path'], convert=False)
+        self.assertEquals(i, self.i)
+        self.assertRaises(ValueError, GrayscaleImage.load,
+                          filepath=self.TEST_IMAGE['path'], convert=False)
@@ -0,0 +1,70 @@
+import unittest
+
+from morphlib import instrument
+from morphlib.image import GrayscaleImage
+from morphlib.operator import CloseHoles, GeodesicDilation, Opening, \
+        ReconstructionByDilation, StructuralElement
+
+class InstrumentTest(unittest.TestCase):
+
+    def setUp(self):
+        self.image = GrayscaleImage(width=8, height=6, data=bytearray(
+            (i * 37) % 256 for i in xrange(8 * 6)))
+        self.se = StructuralElement.predefined('rhombus')
+        self.recorder = instrument.Recorder()
+        instrument.add_listener(self.recorder)
+
+    def tearDown(self):
+        instrument.remove_listener(self.recorder)
+
+    def test_events(self):
+        started = []
+        class Listener(object):
+            def start(self, event):
+                started.append((event.kind, event.name, event.depth))
+        listener = Listener()
+        instrument.add_listener(listener)
+        try:
+            Opening(self.se)(self.image)
+        finally:
+            instrument.remove_listener(listener)
+        self.assertEquals(started, [('operator', 'Opening', 0),
+                                    ('stage', 'Erosion', 1),
+                                    ('stage', 'Dilation', 1)])
+        opening = self.recorder.events[-1]
+        self.assertEquals(opening.counters, {'pixels': 96, 'lookups': 480})
+        self.assertTrue(opening.wall >= 0 and opening.cpu >= 0)
+        self.assertTrue(all(e.parent is opening
+                            for e in self.recorder.events[:-1]))
+
+    def test_summary(self):
+        GeodesicDilation(self.se, self.image)(self.image)
+        CloseHoles()(self.image)
+        ReconstructionByDilation(self.se, self.image)(self.image.border())
+        summary = self.recorder.summary()
+        self.assertEquals(summary[('operator', 'GeodesicDilation')]['runs'], 1)
+        self.assertEquals(summary[('operator', 'CloseHoles')]['pixels'], 48)
+        reconstruction = summary[('operator', 'ReconstructionByDilation')]
+        self.assertEquals(reconstruction['iterations'], 2)
+        self.assertTrue('queue_pushes' in reconstruction)
+
+    def test_failure(self):
+        ended = []
+        class Listener(object):
+            def end(self, event):
+                ended.append((event.name, event.failed))
+        listener = Listener()
+        instrument.add_listener(listener)
+        try:
+            # The mask is too small for the image.
+            op = GeodesicDilation(self.se, self.image.crop((0, 0, 4, 4)))
+            self.assertRaises(ValueError, op, self.image)
+        finally:
+            instrument.remove_listener(listener)
+        self.assertEquals(ended, [('GeodesicDilation', True)])
+        summary = self.recorder.summary()
+        self.assertEquals(summary[('operator', 'GeodesicDilation')]['failed'],
+                          1)
+        self.assertEquals(instrument._stack, [])
+        Opening(self.se)(self.image)
+        self.assertEquals(self.recorder.events[-1].depth, 0)
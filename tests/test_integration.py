@@ -138,7 +138,7 @@ class ImageObjectTest(unittest.TestCase):
             structElemBuilder = SquaredStructuralElementBuilder(15)
             structElem = structElemBuilder.get_struct_elem()
             
-            areaOpening = AreaOpening(StructuralElement.predefined('diagonal5'), 529, 109)
+            areaOpening = AreaOpening(StructuralElement.predefined('diagonal5'), 529)
             i = areaOpening(self.i)
             i.save(test_out)
         finally:
@@ -0,0 +1,45 @@
+import random
+import unittest
+
+from morphlib import lazy
+from morphlib.image import GrayscaleImage
+from morphlib.operator import Closing, CloseHoles, Dilation, Erosion, \
+        Opening, StructuralElement
+
+class LazyTest(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(15)
+        self.image = GrayscaleImage(width=14, height=11, data=bytearray(
+            rnd.randrange(256) for _ in xrange(14 * 11)))
+        self.se = StructuralElement.predefined('rhombus')
+
+    def test_deferred_nodes(self):
+        node = Erosion(self.se)(lazy.source(self.image))
+        self.assertTrue(isinstance(node, lazy.Node))
+        self.assertEquals(node.compute(), Erosion(self.se)(self.image))
+        node = CloseHoles()(Dilation(self.se)(lazy.source(self.image)))
+        self.assertEquals(node.compute(),
+                          CloseHoles()(Dilation(self.se)(self.image)))
+
+    def test_common_subexpressions(self):
+        evaluated = []
+        evaluate = lazy.Apply.evaluate
+        def counting(node, inputs):
+            evaluated.append(node.operator.__class__.__name__)
+            return evaluate(node, inputs)
+        lazy.Apply.evaluate = counting
+        try:
+            src = lazy.source(self.image)
+            rhombus = StructuralElement([[0, 1, 0], [1, 1, 1], [0, 1, 0]])
+            nodes = [Opening(self.se)(src), Closing(self.se)(src),
+                     Erosion(rhombus)(src),
+                     Dilation(self.se)(Erosion(self.se)(src))]
+            results = lazy.compute(*nodes)
+        finally:
+            lazy.Apply.evaluate = evaluate
+        self.assertEquals(sorted(evaluated),
+                          ['Dilation', 'Dilation', 'Erosion', 'Erosion'])
+        self.assertEquals(results, [
+            Opening(self.se)(self.image), Closing(self.se)(self.image),
+            Erosion(self.se)(self.image), Opening(self.se)(self.image)])
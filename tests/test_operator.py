@@ -133,6 +133,204 @@ class OperatorObjectTest(unittest.TestCase):
         # A very basic assert that we've "reconstructed" the first pixel
         self.assertEquals(res[0][0], 250)
 
+    def test_vectorized_matches_pure_python(self):
+        """ Test the NumPy engine against the per-pixel loop """
+        import random
+        from morphlib import vectorized
+        from morphlib.image import GrayscaleImage
+        from morphlib.operator import Erosion, Dilation, StructuralElement
+        if not vectorized.ENABLED:
+            return
+        rnd = random.Random(0)
+        image = GrayscaleImage(width=13, height=9, data=bytearray(
+            rnd.randrange(256) for _ in xrange(13 * 9)))
+        se = StructuralElement([[1, 1, 0, 0],
+                                [0, 1, 0, 1],
+                                [0, 0, 0, 1]])
+        for operator in (Erosion(se), Dilation(se)):
+            fast = operator(image)
+            vectorized.ENABLED = False
+            try:
+                slow = operator(image)
+            finally:
+                vectorized.ENABLED = True
+            self.assertEquals(fast, slow)
+
+    def test_rectangles_match_pure_python(self):
+        """ Test the van Herk/Gil-Werman engines against the per-pixel loop """
+        import random
+        from morphlib import vectorized
+        from morphlib.image import GrayscaleImage
+        from morphlib.operator import Erosion, Dilation, StructuralElement, \
+                MorphologicalOperator, LineStructuralElementBuilder, \
+                SquaredStructuralElementBuilder
+        rnd = random.Random(1)
+        image = GrayscaleImage(width=17, height=11, data=bytearray(
+            rnd.randrange(256) for _ in xrange(17 * 11)))
+        elements = [
+            SquaredStructuralElementBuilder(4).get_struct_elem(),
+            LineStructuralElementBuilder(7).get_struct_elem(),
+            LineStructuralElementBuilder(5, vertical=True).get_struct_elem(),
+            StructuralElement([[1, 1, 1], [1, 1, 1]], center=(0, 2)),
+        ]
+        for se in elements:
+            self.assertTrue(se.is_rectangle)
+            for operator in (Erosion(se), Dilation(se)):
+                expected = image.copy()
+                MorphologicalOperator.apply(operator, image, expected)
+                self.assertEquals(operator(image), expected)
+                enabled, vectorized.ENABLED = vectorized.ENABLED, False
+                try:
+                    self.assertEquals(operator(image), expected)
+                finally:
+                    vectorized.ENABLED = enabled
+
+    def test_decomposition(self):
+        """ Test structural element decomposition """
+        import random
+        from morphlib import vectorized
+        from morphlib.image import GrayscaleImage
+        from morphlib.operator import Erosion, Dilation, StructuralElement, \
+                MorphologicalOperator
+        for name in ('circle', 'big_circle'):
+            se = StructuralElement.predefined(name)
+            parts = se.decompose()
+            self.assertTrue(len(parts) > 1)
+            self.assertTrue(sum(p.cost for p in parts) < se.cost)
+            total = set([(0, 0)])
+            for p in parts:
+                total = set((i + k, j + l) for i, j in total
+                            for k, l in p.ones_offsets)
+            self.assertEquals(total, se.ones_offsets)
+
+        rnd = random.Random(2)
+        image = GrayscaleImage(width=23, height=19, data=bytearray(
+            rnd.randrange(256) for _ in xrange(23 * 19)))
+        se = StructuralElement.predefined('big_circle')
+        for operator in (Erosion(se), Dilation(se)):
+            expected = image.copy()
+            MorphologicalOperator.apply(operator, image, expected)
+            self.assertEquals(operator(image), expected)
+            enabled, vectorized.ENABLED = vectorized.ENABLED, False
+            try:
+                self.assertEquals(operator(image), expected)
+            finally:
+                vectorized.ENABLED = enabled
+
+        # An approximate decomposition only drops ones, so erosion can only
+        # give higher values.
+        disk = StructuralElement([[int(i * i + j * j <= 81)
+                                   for j in xrange(-9, 10)]
+                                  for i in xrange(-9, 10)])
+        approximate = Erosion(disk, exact=False)(image)
+        exact = Erosion(disk)(image)
+        self.assertTrue(all(a >= e for a, e in zip(approximate.getdata(),
+                                                   exact.getdata())))
+
+    def test_border_modes(self):
+        """ Test that all engines agree on the border modes """
+        import random
+        from morphlib import kernel, vectorized
+        from morphlib.image import GrayscaleImage
+        from morphlib.operator import Erosion, Dilation, StructuralElement, \
+                MorphologicalOperator, SquaredStructuralElementBuilder
+        rnd = random.Random(3)
+        image = GrayscaleImage(width=12, height=10, data=bytearray(
+            rnd.randrange(1, 255) for _ in xrange(12 * 10)))
+        elements = [
+            StructuralElement([[1, 0, 1, 1],
+                               [0, 1, 0, 0],
+                               [1, 1, 0, 1]]),
+            SquaredStructuralElementBuilder(3).get_struct_elem(),
+            StructuralElement.predefined('big_circle'),
+        ]
+        for se in elements:
+            for border in kernel.BORDER_MODES:
+                for cls in (Erosion, Dilation):
+                    operator = cls(se, border=border, border_value=128)
+                    expected = image.copy()
+                    MorphologicalOperator.apply(operator, image, expected)
+                    self.assertEquals(operator(image), expected)
+                    enabled, vectorized.ENABLED = vectorized.ENABLED, False
+                    try:
+                        self.assertEquals(operator(image), expected)
+                    finally:
+                        vectorized.ENABLED = enabled
+
+        se = StructuralElement.predefined('rhombus')
+        res = Erosion(se, border=kernel.CONSTANT, border_value=0)(image)
+        self.assertEquals(list(res[0]), [0] * image.width)
+        self.assertEquals(res[5][0], 0)
+        self.assertRaises(ValueError, Erosion, se, border='wrap')
+
+    def test_reconstruction_by_dilation_is_exact(self):
+        """ Test reconstruction against iterated geodesic dilations """
+        import random
+        from morphlib.image import GrayscaleImage
+        from morphlib.operator import ReconstructionByDilation, \
+                GeodesicDilation, StructuralElement
+        rnd = random.Random(4)
+        mask = GrayscaleImage(width=40, height=30, data=bytearray(
+            rnd.randrange(256) for _ in xrange(40 * 30)))
+        marker = GrayscaleImage(width=40, height=30, data=bytearray(40 * 30))
+        marker[15][20] = mask[15][20]
+        for name in ('rhombus', 'octagon'):
+            se = StructuralElement.predefined(name)
+            reconstruct = ReconstructionByDilation(se, mask=mask)
+            res = reconstruct(marker)
+            self.assertEquals(reconstruct.stats['scans'], 2)
+            dilate = GeodesicDilation(se, mask=mask)
+            expected, previous = dilate(marker), marker
+            while expected != previous:
+                previous, expected = expected, dilate(expected)
+            self.assertEquals(res, expected)
+
+    def test_area_opening(self):
+        """ Test area opening/closing against threshold decomposition """
+        import random
+        from morphlib.image import GrayscaleImage
+        from morphlib.operator import AreaOpening, AreaClosing, \
+                StructuralElement
+
+        def reference(image, area, neighbours):
+            # Stack the binary area openings of every threshold set.
+            res = [[0] * image.width for _ in xrange(image.height)]
+            for t in xrange(1, 256):
+                seen = set()
+                for i in xrange(image.height):
+                    for j in xrange(image.width):
+                        if image[i][j] < t or (i, j) in seen:
+                            continue
+                        component, todo = [], [(i, j)]
+                        seen.add((i, j))
+                        while todo:
+                            p, q = todo.pop()
+                            component.append((p, q))
+                            for di, dj in neighbours:
+                                n = (p + di, q + dj)
+                                if 0 <= n[0] < image.height and \
+                                   0 <= n[1] < image.width and \
+                                   n not in seen and image[n[0]][n[1]] >= t:
+                                    seen.add(n)
+                                    todo.append(n)
+                        if len(component) >= area:
+                            for p, q in component:
+                                res[p][q] = t
+            return res
+
+        rnd = random.Random(5)
+        image = GrayscaleImage(width=9, height=7, data=bytearray(
+            rnd.choice([10, 60, 120, 200]) for _ in xrange(9 * 7)))
+        se = StructuralElement.predefined('rhombus')
+        neighbours = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        for area in (1, 3, 6, 20):
+            res = AreaOpening(se, area)(image)
+            self.assertEquals([list(r) for r in (res[i] for i in xrange(7))],
+                              reference(image, area, neighbours))
+            res = AreaClosing(se, area)(image.invert()).invert()
+            self.assertEquals([list(r) for r in (res[i] for i in xrange(7))],
+                              reference(image, area, neighbours))
+
     def test_opening(self):
         """ TBD """
 
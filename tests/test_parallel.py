@@ -0,0 +1,30 @@
+import random
+import unittest
+
+from morphlib.image import GrayscaleImage
+from morphlib.operator import Closing, Erosion, GeodesicDilation, Opening, \
+        StructuralElement
+from morphlib.parallel import TiledOperator
+
+class TiledOperatorTest(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(9)
+        self.image = GrayscaleImage(width=23, height=17, data=bytearray(
+            rnd.randrange(256) for _ in xrange(23 * 17)))
+        self.se = StructuralElement.from_offsets(
+            [(0, 0), (-1, 0), (0, 2), (2, -1), (1, 1)])
+
+    def test_matches_whole_image(self):
+        for operator in (Erosion(self.se), Opening(self.se),
+                         Closing(StructuralElement.predefined('octagon'))):
+            expected = operator(self.image)
+            for workers in (1, 2):
+                for tile_size in (1, 5, 100):
+                    tiled = TiledOperator(operator, workers=workers,
+                                          tile_size=tile_size)
+                    self.assertEquals(tiled(self.image), expected)
+
+    def test_unbounded_context(self):
+        self.assertRaises(ValueError, TiledOperator,
+                          GeodesicDilation(self.se, self.image))
@@ -0,0 +1,69 @@
+import random
+import unittest
+
+from morphlib.image import GrayscaleImage
+from morphlib.operator import AreaOpening, Closing, Dilation, Erosion, \
+        Opening, ReconstructionByDilation, StructuralElement
+from morphlib.pipeline import Pipeline
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(13)
+        self.image = GrayscaleImage(width=21, height=16, data=bytearray(
+            rnd.randrange(256) for _ in xrange(21 * 16)))
+        self.se = StructuralElement.from_offsets(
+            [(0, 0), (-1, 0), (0, 2), (2, -1), (1, 1)])
+        self.octagon = StructuralElement.predefined('octagon')
+
+    def test_opening_and_closing(self):
+        eroded = Erosion(self.se)(self.image)
+        self.assertEquals(Opening(self.se)(self.image),
+                          Dilation(self.se)(eroded))
+        dilated = Dilation(self.se)(self.image)
+        self.assertEquals(Closing(self.se)(self.image),
+                          Erosion(self.se)(dilated))
+
+    def test_chain(self):
+        expected = self.image
+        for op in (Erosion(self.se), Erosion(self.octagon),
+                   Dilation(self.octagon), Dilation(self.se),
+                   Erosion(self.se)):
+            expected = op(expected)
+        for fuse in (False, True):
+            pipeline = Pipeline([Erosion(self.se), Opening(self.octagon),
+                                 Pipeline([Dilation(self.se)]),
+                                 Erosion(self.se)], fuse=fuse)
+            self.assertEquals(pipeline(self.image), expected)
+            self.assertEquals(pipeline.stats['fused'], fuse)
+            self.assertEquals(
+                [name for name, seconds in pipeline.stats['stages']],
+                ['Erosion', 'Erosion', 'Dilation', 'Dilation', 'Erosion'])
+            self.assertTrue(pipeline.stats['buffer_bytes'] > 0)
+
+    def test_fused_memory(self):
+        image = GrayscaleImage(width=50, height=400, data=bytearray(50 * 400))
+        pipeline = Pipeline([Opening(self.se), Closing(self.octagon)],
+                            fuse=True)
+        pipeline(image)
+        self.assertTrue(pipeline.stats['buffer_bytes'] < 50 * 400 / 4)
+
+    def test_unfusable_stages(self):
+        pipeline = Pipeline([Erosion(self.se), AreaOpening(self.se, 5)],
+                            fuse=True)
+        self.assertEquals(pipeline(self.image),
+                          AreaOpening(self.se, 5)(Erosion(self.se)(self.image)))
+        self.assertFalse(pipeline.stats['fused'])
+
+    def test_reconstruction_stage(self):
+        mask = GrayscaleImage(width=8, height=1, data=bytearray([200] * 8))
+        marker = GrayscaleImage(width=8, height=1, data=bytearray(8))
+        marker[0][0] = 200
+        reconstruction = ReconstructionByDilation(self.octagon, mask)
+        self.assertEquals(reconstruction(marker), mask)
+        self.assertEquals(Pipeline([reconstruction])(marker), mask)
+        reconstruction = ReconstructionByDilation(self.octagon, self.image)
+        eroded = Erosion(self.octagon)(self.image)
+        self.assertEquals(
+            Pipeline([Erosion(self.octagon), reconstruction])(self.image),
+            reconstruction(eroded))
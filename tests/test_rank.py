@@ -0,0 +1,61 @@
+import unittest
+
+from morphlib import kernel
+from morphlib.image import GrayscaleImage
+from morphlib.operator import Dilation, Erosion, RankFilter, \
+        StructuralElement
+
+from fixtures import random_image, structural_elements
+
+class RankFilterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.image = random_image(7, 21, 15)
+        self.elements = structural_elements() + [
+            # An even number of neighbours, the median falling between two.
+            StructuralElement.from_offsets(
+                [(0, 0), (-2, 0), (0, 3), (0, 5), (1, -1), (1, 1)]),
+        ]
+
+    def sorted_neighbourhoods(self, se):
+        image = self.image
+        for i in xrange(image.height):
+            for j in xrange(image.width):
+                yield sorted(image[i - di][j - dj]
+                             for di, dj in se.ones_offsets
+                             if 0 <= i - di < image.height
+                             and 0 <= j - dj < image.width)
+
+    def test_matches_sorting(self):
+        for se in self.elements:
+            for percentile in (10, 50, 75):
+                expected = [
+                    values[int(round(percentile * (len(values) - 1) / 100.0))]
+                    for values in self.sorted_neighbourhoods(se)]
+                self.assertEquals(
+                    RankFilter(se, percentile)(self.image).getdata(),
+                    expected)
+
+    def test_extremes(self):
+        for se in self.elements:
+            self.assertEquals(RankFilter(se, 0)(self.image),
+                              Erosion(se)(self.image))
+            self.assertEquals(RankFilter(se, 100)(self.image),
+                              Dilation(se)(self.image))
+
+    def test_border_modes(self):
+        se = self.elements[2]
+        for border in (kernel.REPLICATE, kernel.CONSTANT):
+            for percentile, cls in ((0, Erosion), (100, Dilation)):
+                self.assertEquals(
+                    RankFilter(se, percentile, border=border,
+                               border_value=90)(self.image),
+                    cls(se, border=border, border_value=90)(self.image))
+
+    def test_median_removes_noise(self):
+        image = GrayscaleImage(width=9, height=9, data=bytearray([100] * 81))
+        image[4][4] = 255
+        image[2][6] = 0
+        se = StructuralElement.predefined('octagon')
+        self.assertEquals(RankFilter(se, 50)(image).getdata(), [100] * 81)
+        self.assertRaises(ValueError, RankFilter, se, 101)
@@ -0,0 +1,76 @@
+import random
+import unittest
+
+from morphlib.image import BinaryImage, GrayscaleImage, RunLengthImage
+from morphlib.operator import ClosingByReconstruction, Dilation, Erosion, \
+        OpeningByReconstruction, ReconstructionByDilation, \
+        SquaredStructuralElementBuilder, StructuralElement
+
+class ReconstructionTest(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(9)
+        self.image = GrayscaleImage(width=23, height=17, data=bytearray(
+            rnd.choice((0, 60, 200, 255)) for _ in xrange(23 * 17)))
+        self.se = SquaredStructuralElementBuilder(3).get_struct_elem()
+
+    def expected_opening(self, image, se, connectivity=4):
+        element = StructuralElement.predefined(
+            {4: 'rhombus', 8: 'octagon'}[connectivity])
+        return ReconstructionByDilation(element, image)(Erosion(se)(image))
+
+    def expected_closing(self, image, se, connectivity=4):
+        return self.expected_opening(
+            image.invert(), se, connectivity).invert()
+
+    def test_opening(self):
+        for connectivity in (4, 8):
+            for se in (self.se, StructuralElement.predefined('circle')):
+                op = OpeningByReconstruction(se, connectivity)
+                self.assertEquals(op(self.image),
+                                  self.expected_opening(self.image, se,
+                                                        connectivity))
+                self.assertEquals(op.stats['scans'], 2)
+
+    def test_closing(self):
+        for connectivity in (4, 8):
+            se = StructuralElement.from_offsets([(0, 0), (0, 1), (1, 2)])
+            self.assertEquals(
+                ClosingByReconstruction(se, connectivity)(self.image),
+                self.expected_closing(self.image, se, connectivity))
+
+    def test_shape_preserved(self):
+        image = GrayscaleImage(width=12, height=8, data=bytearray(96))
+        # An L shaped object the square fits in, and a speck it does not.
+        for i in xrange(1, 6):
+            for j in xrange(1, 4):
+                image[i][j] = 200
+        for j in xrange(4, 8):
+            image[5][j] = 200
+        image[2][9] = 200
+        res = OpeningByReconstruction(self.se)(image)
+        expected = image.copy()
+        expected[2][9] = 0
+        self.assertEquals(res, expected)
+
+    def test_marker_reuse(self):
+        op = OpeningByReconstruction(self.se)
+        results = list(op.sweep(self.image, 3))
+        marker = self.image
+        for res in results:
+            marker = Erosion(self.se)(marker)
+            self.assertEquals(res, ReconstructionByDilation(
+                StructuralElement.predefined('rhombus'), self.image)(marker))
+        closing = ClosingByReconstruction(self.se)
+        marker = Dilation(self.se)(self.image)
+        self.assertEquals(closing.from_marker(self.image, marker),
+                          closing(self.image))
+
+    def test_binary(self):
+        gray = GrayscaleImage(width=23, height=17, data=bytearray(
+            random.Random(1).choice((0, 255, 255)) for _ in xrange(23 * 17)))
+        for cls in (OpeningByReconstruction, ClosingByReconstruction):
+            expected = cls(self.se)(gray)
+            for image_cls in (BinaryImage, RunLengthImage):
+                res = cls(self.se)(image_cls.from_grayscale(gray))
+                self.assertEquals(res.to_grayscale(), expected)
@@ -0,0 +1,39 @@
+import unittest
+
+from morphlib.image import RunLengthImage
+from morphlib.operator import Dilation, Erosion, \
+        SquaredStructuralElementBuilder
+
+from test_binary import MaskImageTests
+
+class RunLengthImageTest(MaskImageTests, unittest.TestCase):
+    image_class = RunLengthImage
+    # Sparser than the binary images.
+    values = (0, 0, 255)
+    seed = 5
+
+    def test_rows(self):
+        image = RunLengthImage(6, 3)
+        image[1][2] = 1
+        image[2] = [1, 1, 0, 0, 1, 1]
+        image[2][1] = 0
+        self.assertEquals(image.rows, {1: [(2, 3)], 2: [(0, 1), (4, 6)]})
+        self.assertEquals(image.invert().invert(), image)
+
+    def test_sparse(self):
+        # A 100 megapixel mask with a handful of runs.
+        image = RunLengthImage(10000, 10000, {
+            10: [(5, 20)],
+            5000: [(100, 9000)],
+            9999: [(9990, 10000)],
+        })
+        se = SquaredStructuralElementBuilder(3).get_struct_elem()
+        dilated = Dilation(se)(image)
+        self.assertEquals(dilated.runs(), 8)
+        self.assertEquals(dilated.rows[9998], [(9989, 10000)])
+        self.assertEquals(Erosion(se)(dilated), image)
+
+    def test_maze_reconstruction(self):
+        op = super(RunLengthImageTest, self).test_maze_reconstruction()
+        # Each run of the corridor is entered once.
+        self.assertEquals(op.stats['queue_pushes'], 61)
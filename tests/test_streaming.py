@@ -0,0 +1,51 @@
+import random
+import unittest
+from StringIO import StringIO
+
+from morphlib import kernel, pnm
+from morphlib.image import GrayscaleImage
+from morphlib.operator import Closing, Dilation, Erosion, GeodesicDilation, \
+        StructuralElement
+from morphlib.streaming import collect, image_rows, stream, stream_file
+
+class StreamingTest(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(10)
+        self.image = GrayscaleImage(width=19, height=13, data=bytearray(
+            rnd.randrange(256) for _ in xrange(19 * 13)))
+        self.se = StructuralElement.from_offsets(
+            [(0, 0), (-2, 0), (0, 3), (1, -1), (1, 1)])
+
+    def streamed(self, operator):
+        width, height = self.image.size
+        return collect(stream(operator, image_rows(self.image), width, height),
+                       width, height)
+
+    def test_matches_whole_image(self):
+        for border in kernel.BORDER_MODES:
+            for cls in (Erosion, Dilation):
+                operator = cls(self.se, border=border, border_value=77)
+                self.assertEquals(self.streamed(operator),
+                                  operator(self.image))
+
+    def test_chain(self):
+        se = StructuralElement.predefined('octagon')
+        expected = Erosion(se)(Dilation(se)(self.image))
+        self.assertEquals(self.streamed(Closing(se)), expected)
+
+    def test_file(self):
+        src = StringIO()
+        pnm.write_header(src, pnm.GRAYSCALE, *self.image.size)
+        src.write(str(self.image.getbuffer()))
+        src.seek(0)
+        dst = StringIO()
+        stream_file(Erosion(self.se), src, dst)
+        dst.seek(0)
+        self.assertEquals(pnm.read_header(dst), ('P5', 19, 13))
+        self.assertEquals(bytearray(dst.read()),
+                          Erosion(self.se)(self.image).getbuffer())
+
+    def test_unbounded_context(self):
+        self.assertRaises(ValueError, stream,
+                          GeodesicDilation(self.se, self.image), [], 0, 0)
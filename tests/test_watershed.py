@@ -0,0 +1,87 @@
+from array import array
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from morphlib.image import BinaryImage, GrayscaleImage, LabelImage
+from morphlib.operator import Gradient, StructuralElement, Watershed
+
+class WatershedTest(unittest.TestCase):
+
+    def setUp(self):
+        # Two valleys separated by a ridge on column 4.
+        self.relief = GrayscaleImage(width=9, height=5, data=bytearray(
+            [10, 5, 0, 5, 90, 5, 0, 5, 10] * 5))
+        self.markers = GrayscaleImage(width=9, height=5, data=bytearray(45))
+        self.markers[2][2] = 255
+        self.markers[2][6] = 255
+
+    def test_two_basins(self):
+        res = Watershed(self.markers)(self.relief)
+        self.assertTrue(isinstance(res, LabelImage))
+        self.assertEquals(res.labels.typecode, 'B')
+        self.assertEquals(res.label_count(), 2)
+        for i in xrange(5):
+            self.assertEquals(list(res[i][:4]), [1] * 4)
+            self.assertEquals(list(res[i][5:]), [2] * 4)
+        self.assertTrue(res[2][4] in (1, 2))
+
+    def test_label_markers(self):
+        labels = [0] * 45
+        labels[2 * 9 + 2] = 300
+        labels[2 * 9 + 6] = 7
+        markers = LabelImage(9, 5, labels)
+        res = Watershed(markers, connectivity=8)(self.relief)
+        self.assertEquals(res.labels.typecode, 'H')
+        self.assertEquals(res[0][0], 300)
+        self.assertEquals(res[4][8], 7)
+        labels[2 * 9 + 6] = 2 ** 31 - 1
+        res = Watershed(LabelImage(9, 5, labels))(self.relief)
+        self.assertEquals(res[4][8], 2 ** 31 - 1)
+        labels[2 * 9 + 6] = 2 ** 31
+        self.assertRaises(ValueError, LabelImage, 9, 5, labels)
+        self.assertRaises(ValueError, LabelImage, 9, 5, array('L', labels))
+        binary = BinaryImage.from_grayscale(self.markers)
+        self.assertEquals(Watershed(binary)(self.relief),
+                          Watershed(self.markers)(self.relief))
+
+    def test_every_pixel_labelled(self):
+        rnd = random.Random(6)
+        image = GrayscaleImage(width=31, height=23, data=bytearray(
+            rnd.randrange(256) for _ in xrange(31 * 23)))
+        relief = Gradient(StructuralElement.predefined('octagon'))(image)
+        markers = GrayscaleImage(width=31, height=23, data=bytearray(31 * 23))
+        for _ in xrange(5):
+            markers[rnd.randrange(23)][rnd.randrange(31)] = 1
+        op = Watershed(markers)
+        res = op(relief)
+        self.assertTrue(all(res.labels))
+        self.assertEquals(op.stats['queue_pushes'], 31 * 23)
+        self.assertRaises(ValueError, Watershed(markers), self.relief)
+
+    def test_label_rows(self):
+        image = LabelImage(4, 3)
+        image[1][2] = 5
+        image[-1] = [1, 0, 0, 2]
+        self.assertEquals(list(image.labels), [0] * 6 + [5, 0, 1, 0, 0, 2])
+        self.assertEquals(image[1], [0, 0, 5, 0])
+        # The labels are widened as needed.
+        row = image[0]
+        row[3] = 70000
+        self.assertEquals(image.labels.typecode, 'I')
+        self.assertEquals(image[0][3], 70000)
+        self.assertRaises(TypeError, row.__setitem__, 0, -1)
+        self.assertRaises(ValueError, row.__setitem__, 0, 2 ** 31)
+
+    def test_save_load(self):
+        directory = tempfile.mkdtemp()
+        try:
+            labels = Watershed(self.markers)(self.relief)
+            for name in ('labels.pgm', 'labels.raw', 'labels.png'):
+                path = os.path.join(directory, name)
+                labels.save(path)
+                self.assertEquals(LabelImage.load(path), labels)
+        finally:
+            shutil.rmtree(directory)